@@ -1,31 +1,45 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import json
 import random
-import requests
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 from datetime import datetime
 from dotenv import load_dotenv
 from auth import AuthManager, require_auth
-from user_manager import UserDataManager
+from user_manager import user_data_manager
 from engine import (
     get_recommendations, 
     flag_recommendation_set, 
+    record_assessment_questions,
+    get_assessment_question,
     fetch_all_topics, 
-    add_new_topic
+    add_new_topic,
+    import_topics,
+    SELECTION_MODES
 )
+from json_stream import iter_json_array, iter_ndjson
+from filters import apply_filters
+from llm_client import llm_client, LLMAPIError
+from circuit_breaker import llm_breaker, CircuitOpenError
+from llm_dispatch import LLMDispatcher, LLMOverloadedError, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+from question_bank import question_bank
+from code_grader import code_grader, format_verification, INCONCLUSIVE
+from verification_cache import verification_cache
+from question_parser import parse_question, fallback_question, answer_key
 
 # Load environment variables from .env file
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app, origins=['http://localhost:3000', 'http://localhost'], 
+CORS_ORIGINS = ['http://localhost:3000', 'http://localhost']
+CORS(app, origins=CORS_ORIGINS, 
      allow_headers=['Content-Type', 'Authorization'],
      methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
 
 # Initialize managers
 auth_manager = AuthManager()
-user_data_manager = UserDataManager()
 
 # OpenRouter API Configuration
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', 'your-api-key-here')
@@ -34,16 +48,39 @@ API_MODEL = os.getenv('API_MODEL', 'deepseek/deepseek-chat-v3.1:free')
 # OpenRouter API URL (we only support OpenRouter)
 OPENAI_API_URL = "https://openrouter.ai/api/v1/chat/completions"
 
+# Completion length requested for every LLM call
+LLM_MAX_TOKENS = 1000
+
 # Question types
 QUESTION_TYPES = ['mcq', 'code', 'blank']
 
-def call_openai_api(prompt, temperature=0.7):
-    """Call OpenRouter API with the given prompt"""
-    # Check if API key is available
-    if OPENAI_API_KEY == 'your-api-key-here' or not OPENAI_API_KEY:
-        # Return mock responses for testing
-        return get_mock_response(prompt)
-    
+# Question generation calls in flight at once, shared by all requests
+LLM_CONCURRENCY = max(1, int(os.getenv('LLM_CONCURRENCY', '8')))
+generation_executor = ThreadPoolExecutor(max_workers=LLM_CONCURRENCY, thread_name_prefix='question-gen')
+
+def completion_content(response):
+    """Message content of a chat completion response (requests or httpx); raises LLMAPIError on failure"""
+    if response.status_code != 200:
+        print(f"API Error: {response.status_code} - {response.text}")
+        raise LLMAPIError(f"API Error: {response.status_code}")
+    try:
+        content = response.json()['choices'][0]['message']['content']
+    except (ValueError, KeyError, IndexError, TypeError):
+        raise LLMAPIError("API Error: unexpected response body")
+    if not content:
+        raise LLMAPIError("API Error: empty completion")
+    return content
+
+def request_completion(data, headers):
+    """POST one chat completion request and return the message content; raises LLMAPIError on failure"""
+    return completion_content(llm_client.post(OPENAI_API_URL, json=data, headers=headers))
+
+def llm_api_configured():
+    """Whether an API key is set; without one mock responses are served for testing"""
+    return bool(OPENAI_API_KEY) and OPENAI_API_KEY != 'your-api-key-here'
+
+def completion_request(prompt, temperature):
+    """Return the (body, headers) of a chat completion request for the prompt"""
     headers = {
         'Authorization': f'Bearer {OPENAI_API_KEY}',
         'Content-Type': 'application/json',
@@ -55,48 +92,60 @@ def call_openai_api(prompt, temperature=0.7):
         'model': API_MODEL,
         'messages': [{'role': 'user', 'content': prompt}],
         'temperature': temperature,
-        'max_tokens': 1000
+        'max_tokens': LLM_MAX_TOKENS
     }
+    return data, headers
+
+def call_openai_api(prompt, temperature=0.7):
+    """Call OpenRouter API with the given prompt
     
-    try:
-        response = requests.post(OPENAI_API_URL, headers=headers, json=data)
-        if response.status_code == 200:
-            return response.json()['choices'][0]['message']['content']
-        else:
-            print(f"API Error: {response.status_code} - {response.text}")
-            return f"API Error: {response.status_code} - {response.text}"
-    except Exception as e:
-        print(f"Error calling API: {str(e)}")
-        return f"Error calling API: {str(e)}"
+    Failures raise instead of returning an error string, so they can never be
+    shown as a question. Calls go through the circuit breaker, which raises
+    CircuitOpenError without calling upstream while the API keeps failing.
+    """
+    # Check if API key is available
+    if not llm_api_configured():
+        # Return mock responses for testing
+        return get_mock_response(prompt)
+    
+    return llm_breaker.call(request_completion, *completion_request(prompt, temperature))
 
-def get_mock_response(prompt):
-    """Generate mock responses for testing when API key is not available"""
-    if "multiple choice" in prompt.lower() or "mcq" in prompt.lower():
-        topic = extract_topic_from_prompt(prompt)
-        category = extract_category_from_prompt(prompt)
-        return f"""QUESTION: What is the time complexity of {topic} in {category}?
+# Single-flight, rate-limited, prioritized access to call_openai_api
+llm_dispatcher = LLMDispatcher(call_openai_api, LLM_MAX_TOKENS)
+
+# Template questions for mock responses, also served as degraded-mode questions while the LLM API is down
+MOCK_QUESTION_TEMPLATES = {
+    'mcq': """QUESTION: What is the time complexity of {topic} in {category}?
 A) O(1)
 B) O(log n)
 C) O(n)
 D) O(n²)
 ANSWER: B
-EXPLANATION: {topic} typically has O(log n) time complexity due to its divide-and-conquer approach."""
-    
-    elif "C++ coding" in prompt or "implement" in prompt.lower():
-        topic = extract_topic_from_prompt(prompt)
-        category = extract_category_from_prompt(prompt)
-        return f"""QUESTION: Implement {topic} in C++ for {category}
+EXPLANATION: {topic} typically has O(log n) time complexity due to its divide-and-conquer approach.""",
+    'code': """QUESTION: Implement {topic} in C++ for {category}
 REQUIREMENTS: Create a function that implements {topic} algorithm
 FUNCTION_SIGNATURE: int search(vector<int>& arr, int target)
 EXAMPLE_INPUT: [1,2,3,4,5], target = 3
-EXAMPLE_OUTPUT: 2"""
-    
-    elif "fill-in-the-blank" in prompt.lower():
-        topic = extract_topic_from_prompt(prompt)
-        category = extract_category_from_prompt(prompt)
-        return f"""QUESTION: {topic} in {category} has a time complexity of _____ in the average case.
+EXAMPLE_OUTPUT: 2""",
+    'blank': """QUESTION: {topic} in {category} has a time complexity of _____ in the average case.
 ANSWERS: O(log n)|logarithmic|log n
 EXPLANATION: {topic} divides the search space in half with each operation."""
+}
+
+def mock_question_text(question_type, topic, category):
+    """Fill in the template question of the given type"""
+    return MOCK_QUESTION_TEMPLATES[question_type].format(topic=topic, category=category)
+
+def get_mock_response(prompt):
+    """Generate mock responses for testing when API key is not available"""
+    if "multiple choice" in prompt.lower() or "mcq" in prompt.lower():
+        return mock_question_text('mcq', extract_topic_from_prompt(prompt), extract_category_from_prompt(prompt))
+    
+    elif "C++ coding" in prompt or "implement" in prompt.lower():
+        return mock_question_text('code', extract_topic_from_prompt(prompt), extract_category_from_prompt(prompt))
+    
+    elif "fill-in-the-blank" in prompt.lower():
+        return mock_question_text('blank', extract_topic_from_prompt(prompt), extract_category_from_prompt(prompt))
     
     elif "analyze" in prompt.lower() and "code" in prompt.lower():
         return """RESULT: YES
@@ -144,6 +193,35 @@ def extract_category_from_prompt(prompt):
     else:
         return "Programming"
 
+# ======================== Request-scoped user data ========================
+
+@app.after_request
+def flush_user_data(response):
+    """Write the user's pending changes before responding and report the storage operations
+    
+    Streamed responses keep writing while they are sent, so they are flushed at teardown instead.
+    """
+    unit = user_data_manager.current_unit_of_work()
+    if unit is None or response.is_streamed:
+        return response
+    try:
+        unit.flush()
+    except Exception as e:
+        print(f"Error saving user data: {e}")
+        response = jsonify({'error': f'Failed to save changes: {str(e)}'})
+        response.status_code = 500
+    response.headers['X-Storage-Loads'] = str(unit.loads)
+    response.headers['X-Storage-Writes'] = str(unit.writes)
+    return response
+
+@app.teardown_request
+def end_user_data(exc):
+    """Flush whatever is still pending (streamed responses); changes of a request that crashed are dropped"""
+    try:
+        user_data_manager.end_unit_of_work(flush=exc is None)
+    except Exception as e:
+        print(f"Error saving user data: {e}")
+
 # ======================== Authentication Endpoints ========================
 
 @app.route('/api/auth/google', methods=['POST'])
@@ -204,7 +282,8 @@ def verify_token():
 @app.route('/api/auth/logout', methods=['POST'])
 @require_auth
 def logout():
-    """Logout user (client should remove token)"""
+    """Logout user: the token is revoked, so it stops working even if the client keeps it"""
+    AuthManager.revoke_jwt_token(AuthManager.get_request_token())
     return jsonify({'message': 'Logged out successfully'})
 
 # ======================== User Profile Endpoints ========================
@@ -246,9 +325,9 @@ def update_profile():
     except Exception as e:
         return jsonify({'error': f'Failed to update profile: {str(e)}'}), 500
 
-def generate_mcq_question(topic_name, category, difficulty):
-    """Generate MCQ question for a topic"""
-    prompt = f"""Generate a multiple choice question about {topic_name} in the {category} category. 
+def mcq_prompt(topic_name, category, difficulty):
+    """Prompt for an MCQ question about a topic"""
+    return f"""Generate a multiple choice question about {topic_name} in the {category} category. 
     
 Difficulty level: {difficulty:.2f} (0.0 = very easy, 1.0 = very hard)
 Since this is an MCQ question, make it HARD regardless of the difficulty level. Focus on advanced concepts, edge cases, or subtle distinctions.
@@ -265,12 +344,10 @@ ANSWER: [A/B/C/D]
 EXPLANATION: [Brief explanation]
 
 Make sure the question tests deep understanding of {topic_name} concept in {category}."""
-    
-    return call_openai_api(prompt)
 
-def generate_code_question(topic_name, category, difficulty):
-    """Generate code implementation question for a topic"""
-    prompt = f"""Generate a C++ coding question about {topic_name} in the {category} category.
+def code_prompt(topic_name, category, difficulty):
+    """Prompt for a code implementation question about a topic"""
+    return f"""Generate a C++ coding question about {topic_name} in the {category} category.
     
 Difficulty level: {difficulty:.2f} (0.0 = very easy, 1.0 = very hard)
 Since this is a coding question, keep it SIMPLE regardless of the difficulty level. Focus on clear, implementable problems that test understanding without being overly complex.
@@ -285,12 +362,10 @@ EXAMPLE_INPUT: [Example input]
 EXAMPLE_OUTPUT: [Expected output]
 
 The question should test practical implementation of {topic_name} in {category} using C++."""
-    
-    return call_openai_api(prompt)
 
-def generate_blank_question(topic_name, category, difficulty):
-    """Generate fill-in-the-blank question for a topic"""
-    prompt = f"""Generate a fill-in-the-blank question about {topic_name} in the {category} category.
+def blank_prompt(topic_name, category, difficulty):
+    """Prompt for a fill-in-the-blank question about a topic"""
+    return f"""Generate a fill-in-the-blank question about {topic_name} in the {category} category.
     
 Difficulty level: {difficulty:.2f} (0.0 = very easy, 1.0 = very hard)
 Since this is a fill-in-the-blank question, make it HARD regardless of the difficulty level. Focus on specific details, precise terminology, or advanced concepts.
@@ -303,12 +378,246 @@ ANSWERS: [answer1|answer2|answer3] (multiple valid answers separated by |, case
 EXPLANATION: [Brief explanation]
 
 The question should test key concepts of {topic_name} in {category}."""
+
+QUESTION_PROMPTS = {
+    'mcq': mcq_prompt,
+    'code': code_prompt,
+    'blank': blank_prompt
+}
+
+def generate_question_text(question_type, topic_name, category, difficulty, priority=PRIORITY_INTERACTIVE):
+    """Generate one question; raises when the LLM API is unavailable"""
+    # Don't queue calls the breaker would reject anyway
+    if llm_breaker.is_open():
+        raise CircuitOpenError("The LLM API is failing; calls are paused for a few seconds")
+    prompt = QUESTION_PROMPTS[question_type](topic_name, category, difficulty)
+    return llm_dispatcher.submit(prompt, priority=priority)
+
+def degraded_question(question_type, topic_name, category, difficulty):
+    """Question served when generation fails: a banked one for the same key if any, else a template
+    
+    Returns (question_text, parsed question) with the parsed question marked degraded.
+    """
+    llm_breaker.record_fallback()
+    banked = question_bank.any_question(topic_name, category, question_type, difficulty)
+    if banked is not None and banked[1] is not None:
+        question_text, parsed = banked
+    else:
+        question_text = mock_question_text(question_type, topic_name, category)
+        parsed = parse_question(question_type, question_text)
+    return question_text, dict(parsed, degraded=True)
+
+def generate_and_bank_question(user_id, question_type, topic_name, category, difficulty):
+    """Generate a question live, parse it once and keep it in the question bank as already served to this user
     
-    return call_openai_api(prompt)
+    Falls back to degraded_question (never banked) when the LLM fails or returns
+    something that doesn't parse, so one failure can't sink the set.
+    Returns (question_text, parsed question).
+    """
+    try:
+        question_text = generate_question_text(question_type, topic_name, category, difficulty)
+    except Exception as e:
+        print(f"Error generating {question_type} question for {topic_name}: {str(e)}")
+        return degraded_question(question_type, topic_name, category, difficulty)
+    return bank_generated_question(user_id, question_type, topic_name, category, difficulty, question_text)
 
-def verify_code_solution(question, user_code):
-    """Verify if the user's code solution is correct"""
-    prompt = f"""Question: {question}
+def bank_generated_question(user_id, question_type, topic_name, category, difficulty, question_text):
+    """Parse freshly generated text and bank it as served to the user, or degrade if it doesn't parse"""
+    parsed = parse_question(question_type, question_text)
+    if parsed is None:
+        print(f"Unusable {question_type} question generated for {topic_name}")
+        return degraded_question(question_type, topic_name, category, difficulty)
+    question_bank.add(topic_name, category, question_type, difficulty, question_text, parsed=parsed, served_to=user_id)
+    return question_text, parsed
+
+def finish_question(question_data, question_text, parsed):
+    """Fill in the structured question sent to the client and return what is kept server-side
+    
+    The returned record (raw text and answer key) is stored with the current
+    assessment by record_assessment_questions. Degraded questions get no
+    answer key and don't move the topic's score when the assessment is submitted.
+    """
+    question_data['question'] = parsed or fallback_question(question_text)
+    degraded = bool(parsed and parsed.get('degraded'))
+    return {
+        'rec_no': question_data['rec_no'],
+        'question_type': question_data['question_type'],
+        'question_text': question_text,
+        'answer_key': None if degraded else answer_key(question_data['question_type'], parsed),
+        'degraded': degraded
+    }
+
+# Keep the question bank topped up in the background, behind interactive generation
+question_bank.start_refill(partial(generate_question_text, priority=PRIORITY_BACKGROUND))
+
+def submit_generation(user_id, question_type, topic_name, category, difficulty):
+    """Start generating a question on the shared pool and return its Future"""
+    return generation_executor.submit(
+        generate_and_bank_question, user_id, question_type, topic_name, category, difficulty
+    )
+
+def start_assessment_questions(user_id, recommendations, extra_fields=None, submit=submit_generation):
+    """Create the question for every recommendation and start generating the ones the bank can't serve
+    
+    Returns the questions in rec_no order, per question what submit returned
+    (a generation Future by default, None when it came from the question
+    bank), and the finish_question records of the banked ones. extra_fields
+    maps additional recommendation keys to copy into each question to their
+    defaults.
+    """
+    questions = []
+    futures = []
+    records = []
+    for rec_json in recommendations:
+        rec = json.loads(rec_json)
+        topic_name = rec['topic_name']
+        category = rec['category']
+        base_score = rec.get('base_score', 50)  # Default to 50 if not present
+        
+        # Calculate difficulty as (100-base_score)/100
+        difficulty = (100 - base_score) / 100
+        
+        # Randomly choose question type
+        question_type = random.choice(QUESTION_TYPES)
+        
+        # Serve from the bank, otherwise start generation now; live calls run in parallel on the shared pool
+        banked = question_bank.take(user_id, topic_name, category, question_type, difficulty)
+        if banked is not None:
+            futures.append(None)
+        else:
+            futures.append(submit(user_id, question_type, topic_name, category, difficulty))
+        
+        question_data = {
+            'rec_id': rec['rec_id'],
+            'set_id': rec['set_id'],
+            'rec_no': rec['rec_no'],
+            'topic_id': rec['topic_id'],
+            'topic_name': topic_name,
+            'category': category,
+            'question_type': question_type,
+            'question': None,
+            'user_answer': None,
+            'is_correct': None,
+            'difficulty_rating': None
+        }
+        for field, default in (extra_fields or {}).items():
+            question_data[field] = rec.get(field, default)
+        if banked is not None:
+            records.append(finish_question(question_data, *banked))
+        questions.append(question_data)
+    
+    order = sorted(range(len(questions)), key=lambda i: questions[i]['rec_no'])
+    return [questions[i] for i in order], [futures[i] for i in order], records
+
+def build_assessment_questions(user_id, recommendations, extra_fields=None):
+    """Build a question for every recommendation, waiting for all generation, in rec_no order
+    
+    The raw text and answer keys are stored with the current assessment.
+    """
+    questions, futures, records = start_assessment_questions(user_id, recommendations, extra_fields)
+    # Don't hold the user's storage lock while waiting on the LLM
+    user_data_manager.commit_unit_of_work()
+    for question_data, future in zip(questions, futures):
+        if future is not None:
+            records.append(finish_question(question_data, *future.result()))
+    record_assessment_questions(user_id, questions[0]['set_id'], records)
+    return questions
+
+def parse_assessment_request(data):
+    """Return (count, filters, selection_mode) from a generate-assessment body; raises ValueError with a message"""
+    count = data.get('count', 3)
+    
+    # Extract filters from request
+    filters = {}
+    
+    if 'added_in_last_days' in data and data['added_in_last_days'] is not None:
+        try:
+            filters['added_in_last_days'] = int(data['added_in_last_days'])
+        except (ValueError, TypeError):
+            raise ValueError('added_in_last_days must be a valid number')
+    
+    if 'not_asked_in_last_days' in data and data['not_asked_in_last_days'] is not None:
+        try:
+            filters['not_asked_in_last_days'] = int(data['not_asked_in_last_days'])
+        except (ValueError, TypeError):
+            raise ValueError('not_asked_in_last_days must be a valid number')
+    
+    if 'min_base_score' in data and data['min_base_score'] is not None:
+        try:
+            min_score = int(data['min_base_score'])
+        except (ValueError, TypeError):
+            raise ValueError('min_base_score must be a valid number')
+        if not (1 <= min_score <= 100):
+            raise ValueError('min_base_score must be between 1 and 100')
+        filters['min_base_score'] = min_score
+    
+    if 'categories' in data and data['categories']:
+        if isinstance(data['categories'], list):
+            # Filter out empty strings and None values
+            categories = [cat.strip() for cat in data['categories'] if cat and cat.strip()]
+            if categories:
+                filters['categories'] = categories
+        else:
+            raise ValueError('categories must be a list of strings')
+    
+    selection_mode = data.get('selection_mode', 'ranked')
+    if selection_mode not in SELECTION_MODES:
+        raise ValueError(f'selection_mode must be one of: {", ".join(SELECTION_MODES)}')
+    
+    return count, filters, selection_mode
+
+def parse_advanced_assessment_request(data):
+    """Return (count, sort_by, sort_order) from an advanced-assessment body; raises ValueError with a message"""
+    count = data.get('count', 3)
+    sort_by = data.get('sort_by', 'success_rate')
+    sort_order = data.get('sort_order', 'top')
+    
+    # Validate sort_by parameter
+    valid_sort_options = ['success_rate', 'attempt_count', 'base_score', 'last_seen', 'date_added']
+    if sort_by not in valid_sort_options:
+        raise ValueError(f'sort_by must be one of: {", ".join(valid_sort_options)}')
+    
+    # Validate sort_order parameter
+    if sort_order not in ['top', 'bottom']:
+        raise ValueError('sort_order must be either "top" or "bottom"')
+    
+    # Validate count
+    try:
+        count = int(count)
+    except (ValueError, TypeError):
+        raise ValueError('count must be a valid number')
+    if count <= 0:
+        raise ValueError('count must be a positive integer')
+    
+    return count, sort_by, sort_order
+
+def sort_info(count, sort_by, sort_order):
+    """Describe an advanced assessment's selection for the client"""
+    return {
+        'sort_by': sort_by,
+        'sort_order': sort_order,
+        'description': f"{'Top' if sort_order == 'top' else 'Bottom'} {count} topics by {sort_by.replace('_', ' ')}"
+    }
+
+# Error bodies of the 503 responses, shared with the async routes in asgi.py
+OVERLOADED_MESSAGE = 'Question generation is busy right now, please try again shortly'
+LLM_UNAVAILABLE_MESSAGE = 'The AI reviewer is unavailable right now, please try again shortly'
+
+def overloaded_response():
+    """503 returned when the LLM dispatch queue is too full to take new work"""
+    response = jsonify({'error': OVERLOADED_MESSAGE})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+def llm_unavailable_response():
+    """503 returned when a call that has no fallback fails because the LLM API is down"""
+    response = jsonify({'error': LLM_UNAVAILABLE_MESSAGE})
+    response.headers['Retry-After'] = str(int(llm_breaker.retry_after()) + 1)
+    return response, 503
+
+def verify_code_prompt(question, user_code):
+    """Prompt asking the LLM to review a code solution"""
+    return f"""Question: {question}
 
 User's C++ Code:
 {user_code}
@@ -323,8 +632,25 @@ Respond EXACTLY in this format:
 RESULT: [YES/NO]
 FEEDBACK: [Brief explanation of what's correct/incorrect]
 SUGGESTIONS: [Specific suggestions for improvement if any]"""
+
+def grade_code_locally(question, user_code):
+    """Compile and run the example locally; that settles most submissions without the LLM
     
-    return call_openai_api(prompt, temperature=0.3)
+    Returns (result, grade); result is None when only an LLM review can decide.
+    """
+    grade = code_grader.grade(question, user_code)
+    if grade is not None and grade['status'] != INCONCLUSIVE:
+        return {'verification': format_verification(grade), 'grading': grade}, grade
+    return None, grade
+
+def cache_verification(cache_key, result):
+    # Don't cache API error messages, only well-formed verdicts
+    if 'RESULT:' in result['verification']:
+        verification_cache.put(cache_key, result)
+
+def verify_code_solution(question, user_code):
+    """Verify if the user's code solution is correct"""
+    return llm_dispatcher.submit(verify_code_prompt(question, user_code), temperature=0.3)
 
 # ======================== Topic Management Endpoints ========================
 
@@ -364,12 +690,8 @@ def get_topics():
             except ValueError:
                 pass
         
-        # Fetch topics
-        topics = fetch_all_topics(user_id)
-        
-        # Apply filters manually since fetch_all_topics doesn't support them
-        if category_filter:
-            topics = [t for t in topics if t.get('category', '').lower() == category_filter.lower()]
+        # Fetch topics and apply every filter in one indexed pass
+        topics = apply_filters(fetch_all_topics(user_id), filters)
         
         # Apply sorting
         if sort_by == 'topic_name':
@@ -454,6 +776,30 @@ def add_topic():
     except Exception as e:
         return jsonify({'error': f'Failed to add topic: {str(e)}'}), 500
 
+@app.route('/api/topics/import', methods=['POST'])
+@require_auth
+def import_topics_bulk():
+    """Import many topics at once from a JSON array or NDJSON body"""
+    user_id = request.user_id
+    
+    # Parse the body as a stream so large syllabi never sit in memory as one document
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        rows = iter_ndjson(request.stream)
+    else:
+        rows = iter_json_array(request.stream)
+    
+    try:
+        results = import_topics(user_id, rows)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid import body: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'error': f'Failed to import topics: {str(e)}'}), 500
+    
+    summary = {status: 0 for status in ('added', 'duplicate', 'invalid')}
+    for result in results:
+        summary[result['status']] += 1
+    return jsonify({'summary': summary, 'results': results})
+
 @app.route('/api/categories', methods=['GET'])
 @require_auth
 def get_categories():
@@ -475,88 +821,26 @@ def generate_assessment():
     """Generate assessment questions based on filters for the authenticated user"""
     user_id = request.user_id
     data = request.get_json()
-    count = data.get('count', 3)
-    
-    # Extract filters from request
-    filters = {}
-    
-    if 'added_in_last_days' in data and data['added_in_last_days'] is not None:
-        try:
-            filters['added_in_last_days'] = int(data['added_in_last_days'])
-        except (ValueError, TypeError):
-            return jsonify({'error': 'added_in_last_days must be a valid number'}), 400
     
-    if 'not_asked_in_last_days' in data and data['not_asked_in_last_days'] is not None:
-        try:
-            filters['not_asked_in_last_days'] = int(data['not_asked_in_last_days'])
-        except (ValueError, TypeError):
-            return jsonify({'error': 'not_asked_in_last_days must be a valid number'}), 400
-    
-    if 'min_base_score' in data and data['min_base_score'] is not None:
-        try:
-            min_score = int(data['min_base_score'])
-            if not (1 <= min_score <= 100):
-                return jsonify({'error': 'min_base_score must be between 1 and 100'}), 400
-            filters['min_base_score'] = min_score
-        except (ValueError, TypeError):
-            return jsonify({'error': 'min_base_score must be a valid number'}), 400
+    try:
+        count, filters, selection_mode = parse_assessment_request(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    if 'categories' in data and data['categories']:
-        if isinstance(data['categories'], list):
-            # Filter out empty strings and None values
-            categories = [cat.strip() for cat in data['categories'] if cat and cat.strip()]
-            if categories:
-                filters['categories'] = categories
-        else:
-            return jsonify({'error': 'categories must be a list of strings'}), 400
+    if not llm_dispatcher.accepting():
+        return overloaded_response()
     
     # Get recommendations from engine with filters
     try:
-        recommendations = get_recommendations(user_id, count, filters if filters else None)
+        recommendations = get_recommendations(user_id, count, filters if filters else None, selection_mode)
         if not recommendations:
             if filters:
                 return jsonify({'error': 'No topics match the specified filters'}), 400
             else:
                 return jsonify({'error': 'No topics available for assessment'}), 400
         
-        # Parse recommendations and generate questions
-        assessment_questions = []
-        
-        for rec_json in recommendations:
-            rec = json.loads(rec_json)
-            topic_name = rec['topic_name']
-            category = rec['category']
-            base_score = rec.get('base_score', 50)  # Default to 50 if not present
-            
-            # Calculate difficulty as (100-base_score)/100
-            difficulty = (100 - base_score) / 100
-            
-            # Randomly choose question type
-            question_type = random.choice(QUESTION_TYPES)
-            
-            # Generate question based on type, including difficulty and category
-            if question_type == 'mcq':
-                question_text = generate_mcq_question(topic_name, category, difficulty)
-            elif question_type == 'code':
-                question_text = generate_code_question(topic_name, category, difficulty)
-            else:  # blank
-                question_text = generate_blank_question(topic_name, category, difficulty)
-            
-            question_data = {
-                'rec_id': rec['rec_id'],
-                'set_id': rec['set_id'],
-                'rec_no': rec['rec_no'],
-                'topic_id': rec['topic_id'],
-                'topic_name': topic_name,
-                'category': rec['category'],
-                'question_type': question_type,
-                'question_text': question_text,
-                'user_answer': None,
-                'is_correct': None,
-                'difficulty_rating': None
-            }
-            
-            assessment_questions.append(question_data)
+        # Generate questions for all recommendations concurrently
+        assessment_questions = build_assessment_questions(user_id, recommendations)
         
         return jsonify({
             'set_id': json.loads(recommendations[0])['set_id'],
@@ -566,30 +850,91 @@ def generate_assessment():
     except Exception as e:
         return jsonify({'error': f'Failed to generate assessment: {str(e)}'}), 500
 
+# Streamed responses must reach the client as they are produced, not after proxy buffering
+STREAM_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+def wants_event_stream(accept_mimetypes):
+    """Whether the client's Accept header prefers Server-Sent Events over newline-delimited JSON"""
+    return accept_mimetypes.best_match(['application/x-ndjson', 'text/event-stream']) == 'text/event-stream'
+
+def stream_mimetype(use_sse):
+    return 'text/event-stream' if use_sse else 'application/x-ndjson'
+
+def encode_stream_event(event, use_sse):
+    """One assessment stream event as an SSE message or an NDJSON line"""
+    payload = json.dumps(event, default=str)
+    return f"event: {event['type']}\ndata: {payload}\n\n" if use_sse else payload + "\n"
+
+@app.route('/api/generate-assessment/stream', methods=['POST'])
+@require_auth
+def generate_assessment_stream():
+    """Stream an assessment: the set metadata first, then each question as soon as it is ready
+    
+    Sends newline-delimited JSON, or Server-Sent Events when the client accepts text/event-stream.
+    Events: {"type": "set"} with every question (question is null until generated),
+    one {"type": "question"} per generated question in completion order, and a final {"type": "done"}.
+    """
+    user_id = request.user_id
+    data = request.get_json()
+    
+    try:
+        count, filters, selection_mode = parse_assessment_request(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if not llm_dispatcher.accepting():
+        return overloaded_response()
+    
+    try:
+        recommendations = get_recommendations(user_id, count, filters if filters else None, selection_mode)
+        if not recommendations:
+            if filters:
+                return jsonify({'error': 'No topics match the specified filters'}), 400
+            else:
+                return jsonify({'error': 'No topics available for assessment'}), 400
+        questions, futures, records = start_assessment_questions(user_id, recommendations)
+        record_assessment_questions(user_id, questions[0]['set_id'], records)
+        # Don't hold the user's storage lock while the questions are generated
+        user_data_manager.commit_unit_of_work()
+    except Exception as e:
+        return jsonify({'error': f'Failed to generate assessment: {str(e)}'}), 500
+    
+    use_sse = wants_event_stream(request.accept_mimetypes)
+    encode = partial(encode_stream_event, use_sse=use_sse)
+    
+    def events():
+        # Banked questions are already filled in; generated ones follow in completion order
+        yield encode({
+            'type': 'set',
+            'set_id': questions[0]['set_id'],
+            'questions': questions
+        })
+        pending = {future: question_data for question_data, future in zip(questions, futures) if future is not None}
+        for future in as_completed(pending):
+            question_data = pending[future]
+            # Stored before it is sent, so verify-code can look it up by set_id/rec_no mid-stream
+            record = finish_question(question_data, *future.result())
+            record_assessment_questions(user_id, questions[0]['set_id'], [record])
+            user_data_manager.commit_unit_of_work()
+            yield encode(dict(question_data, type='question'))
+        yield encode({'type': 'done', 'set_id': questions[0]['set_id']})
+    
+    return Response(stream_with_context(events()), mimetype=stream_mimetype(use_sse), headers=STREAM_HEADERS)
+
 @app.route('/api/generate-assessment-advanced', methods=['POST'])
+@require_auth
 def generate_assessment_advanced():
     """Generate assessment questions based on advanced sorting criteria"""
+    user_id = request.user_id
     data = request.get_json()
-    count = data.get('count', 3)
-    sort_by = data.get('sort_by', 'success_rate')
-    sort_order = data.get('sort_order', 'top')
-    
-    # Validate sort_by parameter
-    valid_sort_options = ['success_rate', 'attempt_count', 'base_score', 'last_seen', 'date_added']
-    if sort_by not in valid_sort_options:
-        return jsonify({'error': f'sort_by must be one of: {", ".join(valid_sort_options)}'}), 400
     
-    # Validate sort_order parameter
-    if sort_order not in ['top', 'bottom']:
-        return jsonify({'error': 'sort_order must be either "top" or "bottom"'}), 400
-    
-    # Validate count
     try:
-        count = int(count)
-        if count <= 0:
-            return jsonify({'error': 'count must be a positive integer'}), 400
-    except (ValueError, TypeError):
-        return jsonify({'error': 'count must be a valid number'}), 400
+        count, sort_by, sort_order = parse_advanced_assessment_request(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if not llm_dispatcher.accepting():
+        return overloaded_response()
     
     # Get sorted recommendations from engine
     try:
@@ -599,55 +944,15 @@ def generate_assessment_advanced():
         if not recommendations:
             return jsonify({'error': 'No topics available for assessment'}), 400
         
-        # Parse recommendations and generate questions
-        assessment_questions = []
-        
-        for rec_json in recommendations:
-            rec = json.loads(rec_json)
-            topic_name = rec['topic_name']
-            category = rec['category']
-            base_score = rec.get('base_score', 50)
-            
-            # Calculate difficulty as (100-base_score)/100
-            difficulty = (100 - base_score) / 100
-            
-            # Randomly choose question type
-            question_type = random.choice(QUESTION_TYPES)
-            
-            # Generate question based on type, including difficulty and category
-            if question_type == 'mcq':
-                question_text = generate_mcq_question(topic_name, category, difficulty)
-            elif question_type == 'code':
-                question_text = generate_code_question(topic_name, category, difficulty)
-            else:  # blank
-                question_text = generate_blank_question(topic_name, category, difficulty)
-            
-            question_data = {
-                'rec_id': rec['rec_id'],
-                'set_id': rec['set_id'],
-                'rec_no': rec['rec_no'],
-                'topic_id': rec['topic_id'],
-                'topic_name': topic_name,
-                'category': rec['category'],
-                'question_type': question_type,
-                'question_text': question_text,
-                'user_answer': None,
-                'is_correct': None,
-                'difficulty_rating': None,
-                'sort_criteria': rec.get('sort_criteria', ''),
-                'sort_value': rec.get('sort_value', 0)
-            }
-            
-            assessment_questions.append(question_data)
+        # Generate questions for all recommendations concurrently
+        assessment_questions = build_assessment_questions(
+            user_id, recommendations, extra_fields={'sort_criteria': '', 'sort_value': 0}
+        )
         
         return jsonify({
             'set_id': json.loads(recommendations[0])['set_id'],
             'questions': assessment_questions,
-            'sort_info': {
-                'sort_by': sort_by,
-                'sort_order': sort_order,
-                'description': f"{'Top' if sort_order == 'top' else 'Bottom'} {count} topics by {sort_by.replace('_', ' ')}"
-            }
+            'sort_info': sort_info(count, sort_by, sort_order)
         })
         
     except Exception as e:
@@ -662,12 +967,34 @@ def verify_code():
     question = data.get('question', '')
     user_code = data.get('code', '')
     
+    # Clients can refer to a question of the current assessment instead of sending its text
+    if not question and data.get('set_id') and data.get('rec_no') is not None:
+        stored_question = get_assessment_question(user_id, data['set_id'], data['rec_no'])
+        question = stored_question['question_text'] if stored_question else ''
+    
     if not question or not user_code:
         return jsonify({'error': 'Question and code are required'}), 400
     
+    # Grading and the LLM review are slow; don't hold the user's storage lock through them
+    user_data_manager.commit_unit_of_work()
+    
+    # Resubmissions of the same code (up to whitespace) for the same question are answered from the cache
+    cache_key = verification_cache.key(question, user_code)
+    cached = verification_cache.get(cache_key)
+    if cached is not None:
+        return jsonify(dict(cached, cached=True))
+    
     try:
-        verification_result = verify_code_solution(question, user_code)
-        return jsonify({'verification': verification_result})
+        result, grade = grade_code_locally(question, user_code)
+        if result is None:
+            # The example couldn't be run (or no compiler): ask the LLM for a qualitative review
+            result = {'verification': verify_code_solution(question, user_code), 'grading': grade}
+        cache_verification(cache_key, result)
+        return jsonify(dict(result, cached=False))
+    except LLMOverloadedError:
+        return overloaded_response()
+    except (LLMAPIError, CircuitOpenError):
+        return llm_unavailable_response()
     except Exception as e:
         return jsonify({'error': f'Failed to verify code: {str(e)}'}), 500
 
@@ -689,7 +1016,8 @@ def submit_assessment():
         feedback.append({
             'rec_no': result['rec_no'],
             'difficulty': result['difficulty_rating'],  # easy/medium/hard
-            'solved': result['is_correct']
+            'solved': result['is_correct'],
+            'answer': result.get('user_answer')  # graded against the stored key for MCQ/blank
         })
     
     try:
@@ -698,6 +1026,19 @@ def submit_assessment():
     except Exception as e:
         return jsonify({'error': f'Failed to submit assessment: {str(e)}'}), 500
 
+@app.route('/api/llm/stats', methods=['GET'])
+@require_auth
+def get_llm_stats():
+    """Get connection reuse, retry, dispatch queue, circuit breaker and verification cache counters for the LLM API"""
+    return jsonify(dict(llm_client.stats(), dispatch=llm_dispatcher.stats(), code_grader=code_grader.stats(),
+                        verification_cache=verification_cache.stats(), breaker=llm_breaker.stats()))
+
+@app.route('/api/question-bank/stats', methods=['GET'])
+@require_auth
+def get_question_bank_stats():
+    """Get size, hit rate and eviction counters for the question bank"""
+    return jsonify(question_bank.stats())
+
 @app.route('/api/stats', methods=['GET'])
 @require_auth
 def get_stats():
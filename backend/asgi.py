@@ -0,0 +1,369 @@
+"""ASGI entry point, what the Docker image serves: gunicorn -k uvicorn_worker.UvicornWorker asgi:application
+
+The LLM-bound routes (assessment generation, including the streamed
+variant, and code verification) are served by async handlers, so a request
+waiting on the LLM API holds a coroutine instead of a thread and one
+process can keep hundreds of generations in flight. Every other route is
+the Flask app, run on a thread pool through a2wsgi. The handlers reuse
+app.py's prompts, parsing, question bank and circuit breaker. Blocking
+work never runs on the event loop: question bank (SQLite) calls run on the
+thread pool, and user storage in a short unit of work of its own there, so
+no user lock is held while the LLM is awaited.
+"""
+import asyncio
+import contextlib
+import json
+import os
+from functools import wraps
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+from app import (
+    app as flask_app,
+    CORS_ORIGINS,
+    OPENAI_API_URL,
+    QUESTION_PROMPTS,
+    OVERLOADED_MESSAGE,
+    LLM_UNAVAILABLE_MESSAGE,
+    llm_dispatcher,
+    llm_api_configured,
+    completion_request,
+    completion_content,
+    get_mock_response,
+    degraded_question,
+    bank_generated_question,
+    finish_question,
+    start_assessment_questions,
+    parse_assessment_request,
+    parse_advanced_assessment_request,
+    sort_info,
+    STREAM_HEADERS,
+    wants_event_stream,
+    stream_mimetype,
+    encode_stream_event,
+    grade_code_locally,
+    cache_verification,
+    verify_code_prompt
+)
+from async_llm import AsyncLLMClient, AsyncLLMDispatcher
+from auth import AuthManager
+from circuit_breaker import llm_breaker, CircuitOpenError
+from engine import get_recommendations, get_sorted_recommendations, record_assessment_questions, get_assessment_question
+from llm_client import LLMAPIError
+from llm_dispatch import LLMOverloadedError
+from user_manager import user_data_manager
+from verification_cache import verification_cache
+
+# Threads running the Flask routes
+ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', 16))
+
+async_llm_client = AsyncLLMClient()
+
+async def request_completion(data, headers):
+    """POST one chat completion request and return the message content; raises LLMAPIError on failure"""
+    return completion_content(await async_llm_client.post(OPENAI_API_URL, json=data, headers=headers))
+
+async def call_openai_api(prompt, temperature=0.7):
+    """Async call_openai_api: mock responses without an API key, otherwise through the circuit breaker"""
+    if not llm_api_configured():
+        return get_mock_response(prompt)
+    return await llm_breaker.call_async(request_completion, *completion_request(prompt, temperature))
+
+# Coalesced calls within the same rate budget as the sync dispatcher
+async_dispatcher = AsyncLLMDispatcher(call_openai_api, llm_dispatcher)
+
+# ======================== Helpers ========================
+
+def run_in_unit_of_work(user_id, func, *args):
+    """Run a storage function in its own unit of work for the user, writing its changes if it succeeds"""
+    user_data_manager.begin_unit_of_work(user_id)
+    try:
+        result = func(*args)
+    except BaseException:
+        user_data_manager.end_unit_of_work(flush=False)
+        raise
+    user_data_manager.end_unit_of_work()
+    return result
+
+async def user_storage(user_id, func, *args):
+    return await run_in_threadpool(run_in_unit_of_work, user_id, func, *args)
+
+def error_response(message, status_code):
+    return JSONResponse({'error': message}, status_code=status_code)
+
+def overloaded_response():
+    """503 returned when the LLM budget queue is too full to take new work"""
+    return JSONResponse({'error': OVERLOADED_MESSAGE}, status_code=503, headers={'Retry-After': '5'})
+
+def llm_unavailable_response():
+    """503 returned when a call that has no fallback fails because the LLM API is down"""
+    return JSONResponse({'error': LLM_UNAVAILABLE_MESSAGE}, status_code=503,
+                        headers={'Retry-After': str(int(llm_breaker.retry_after()) + 1)})
+
+def accepting():
+    return llm_dispatcher.accepting() and async_dispatcher.accepting()
+
+def require_auth(handler):
+    """Async counterpart of auth.require_auth; only bearer tokens are accepted, not the Flask session"""
+    @wraps(handler)
+    async def decorated_handler(request):
+        header = request.headers.get('Authorization', '')
+        user_id = AuthManager.verify_jwt_token(header.split(' ')[1]) if header.startswith('Bearer ') else None
+        if not user_id:
+            return error_response('Authentication required', 401)
+        request.state.user_id = user_id
+        return await handler(request)
+
+    return decorated_handler
+
+async def request_json(request):
+    """The request's JSON object body; raises ValueError when it isn't one"""
+    try:
+        data = await request.json()
+    except json.JSONDecodeError:
+        raise ValueError('Request body must be valid JSON')
+    if not isinstance(data, dict):
+        raise ValueError('Request body must be a JSON object')
+    return data
+
+# ======================== Question generation ========================
+
+async def generate_question_text(question_type, topic_name, category, difficulty):
+    """Generate one question; raises when the LLM API is unavailable"""
+    # Don't wait for budget on calls the breaker would reject anyway
+    if llm_breaker.is_open():
+        raise CircuitOpenError("The LLM API is failing; calls are paused for a few seconds")
+    prompt = QUESTION_PROMPTS[question_type](topic_name, category, difficulty)
+    return await async_dispatcher.submit(prompt)
+
+async def generate_and_bank_question(user_id, question_type, topic_name, category, difficulty):
+    """Async app.generate_and_bank_question: returns (question_text, parsed question), degraded on failure"""
+    try:
+        question_text = await generate_question_text(question_type, topic_name, category, difficulty)
+    except Exception as e:
+        print(f"Error generating {question_type} question for {topic_name}: {str(e)}")
+        return await run_in_threadpool(degraded_question, question_type, topic_name, category, difficulty)
+    # The question bank is SQLite: keep its reads and writes off the event loop
+    return await run_in_threadpool(bank_generated_question, user_id, question_type, topic_name, category,
+                                   difficulty, question_text)
+
+def defer_generation(*job):
+    """submit for start_assessment_questions that hands the job back to run on the event loop"""
+    return job
+
+async def build_assessment_questions(user_id, recommendations, extra_fields=None):
+    """Build a question for every recommendation, generating the missing ones concurrently, in rec_no order
+
+    The raw text and answer keys are stored with the current assessment.
+    """
+    questions, jobs, records = await run_in_threadpool(start_assessment_questions, user_id, recommendations,
+                                                       extra_fields, submit=defer_generation)
+    pending = [(question_data, job) for question_data, job in zip(questions, jobs) if job is not None]
+    generated = await asyncio.gather(*(generate_and_bank_question(*job) for _, job in pending))
+    for (question_data, _), (question_text, parsed) in zip(pending, generated):
+        records.append(finish_question(question_data, question_text, parsed))
+    await user_storage(user_id, record_assessment_questions, user_id, questions[0]['set_id'], records)
+    return questions
+
+async def generate_pending_question(question_data, job):
+    """generate_and_bank_question for one streamed question, returned with the question it belongs to"""
+    return question_data, await generate_and_bank_question(*job)
+
+# ======================== Assessment Endpoints ========================
+
+@require_auth
+async def generate_assessment(request):
+    """Generate assessment questions based on filters for the authenticated user"""
+    user_id = request.state.user_id
+    try:
+        count, filters, selection_mode = parse_assessment_request(await request_json(request))
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    if not accepting():
+        return overloaded_response()
+
+    try:
+        recommendations = await user_storage(
+            user_id, get_recommendations, user_id, count, filters if filters else None, selection_mode
+        )
+        if not recommendations:
+            if filters:
+                return error_response('No topics match the specified filters', 400)
+            return error_response('No topics available for assessment', 400)
+
+        assessment_questions = await build_assessment_questions(user_id, recommendations)
+
+        return JSONResponse({
+            'set_id': json.loads(recommendations[0])['set_id'],
+            'questions': assessment_questions
+        })
+    except Exception as e:
+        return error_response(f'Failed to generate assessment: {str(e)}', 500)
+
+@require_auth
+async def generate_assessment_stream(request):
+    """Stream an assessment: the set metadata first, then each question as soon as it is ready
+
+    Same events as the Flask route: NDJSON, or Server-Sent Events when the client accepts text/event-stream.
+    """
+    user_id = request.state.user_id
+    try:
+        count, filters, selection_mode = parse_assessment_request(await request_json(request))
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    if not accepting():
+        return overloaded_response()
+
+    try:
+        recommendations = await user_storage(
+            user_id, get_recommendations, user_id, count, filters if filters else None, selection_mode
+        )
+        if not recommendations:
+            if filters:
+                return error_response('No topics match the specified filters', 400)
+            return error_response('No topics available for assessment', 400)
+        questions, jobs, records = await run_in_threadpool(start_assessment_questions, user_id, recommendations,
+                                                           submit=defer_generation)
+        set_id = questions[0]['set_id']
+        await user_storage(user_id, record_assessment_questions, user_id, set_id, records)
+    except Exception as e:
+        return error_response(f'Failed to generate assessment: {str(e)}', 500)
+
+    use_sse = wants_event_stream(parse_accept_header(request.headers.get('accept'), MIMEAccept))
+
+    async def events():
+        # Banked questions are already filled in; generated ones follow in completion order
+        yield encode_stream_event({'type': 'set', 'set_id': set_id, 'questions': questions}, use_sse)
+        tasks = [asyncio.ensure_future(generate_pending_question(question_data, job))
+                 for question_data, job in zip(questions, jobs) if job is not None]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                question_data, (question_text, parsed) = await next_done
+                # Stored before it is sent, so verify-code can look it up by set_id/rec_no mid-stream
+                record = finish_question(question_data, question_text, parsed)
+                await user_storage(user_id, record_assessment_questions, user_id, set_id, [record])
+                yield encode_stream_event(dict(question_data, type='question'), use_sse)
+            yield encode_stream_event({'type': 'done', 'set_id': set_id}, use_sse)
+        finally:
+            # The client went away: don't keep generating questions nobody will see
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(events(), media_type=stream_mimetype(use_sse), headers=STREAM_HEADERS)
+
+@require_auth
+async def generate_assessment_advanced(request):
+    """Generate assessment questions based on advanced sorting criteria"""
+    user_id = request.state.user_id
+    try:
+        count, sort_by, sort_order = parse_advanced_assessment_request(await request_json(request))
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    if not accepting():
+        return overloaded_response()
+
+    try:
+        recommendations = await user_storage(
+            user_id, get_sorted_recommendations, user_id, count, sort_by, sort_order
+        )
+        if not recommendations:
+            return error_response('No topics available for assessment', 400)
+
+        assessment_questions = await build_assessment_questions(
+            user_id, recommendations, extra_fields={'sort_criteria': '', 'sort_value': 0}
+        )
+
+        return JSONResponse({
+            'set_id': json.loads(recommendations[0])['set_id'],
+            'questions': assessment_questions,
+            'sort_info': sort_info(count, sort_by, sort_order)
+        })
+    except Exception as e:
+        return error_response(f'Failed to generate advanced assessment: {str(e)}', 500)
+
+@require_auth
+async def verify_code(request):
+    """Verify user's code solution"""
+    user_id = request.state.user_id
+    try:
+        data = await request_json(request)
+    except ValueError as e:
+        return error_response(str(e), 400)
+    question = data.get('question', '')
+    user_code = data.get('code', '')
+
+    # Clients can refer to a question of the current assessment instead of sending its text
+    if not question and data.get('set_id') and data.get('rec_no') is not None:
+        stored_question = await user_storage(user_id, get_assessment_question, user_id, data['set_id'], data['rec_no'])
+        question = stored_question['question_text'] if stored_question else ''
+
+    if not question or not user_code:
+        return error_response('Question and code are required', 400)
+
+    cache_key = verification_cache.key(question, user_code)
+    cached = await run_in_threadpool(verification_cache.get, cache_key)
+    if cached is not None:
+        return JSONResponse(dict(cached, cached=True))
+
+    try:
+        result, grade = await run_in_threadpool(grade_code_locally, question, user_code)
+        if result is None:
+            review = await async_dispatcher.submit(verify_code_prompt(question, user_code), temperature=0.3)
+            result = {'verification': review, 'grading': grade}
+        await run_in_threadpool(cache_verification, cache_key, result)
+        return JSONResponse(dict(result, cached=False))
+    except LLMOverloadedError:
+        return overloaded_response()
+    except (LLMAPIError, CircuitOpenError):
+        return llm_unavailable_response()
+    except Exception as e:
+        return error_response(f'Failed to verify code: {str(e)}', 500)
+
+@require_auth
+async def get_async_llm_stats(request):
+    """Get the async client and dispatcher counters of this process"""
+    return JSONResponse({'client': async_llm_client.stats(), 'dispatch': async_dispatcher.stats()})
+
+# ======================== Application ========================
+
+@contextlib.asynccontextmanager
+async def lifespan(_):
+    yield
+    await async_llm_client.aclose()
+
+async_app = Starlette(
+    routes=[
+        Route('/api/generate-assessment', generate_assessment, methods=['POST']),
+        Route('/api/generate-assessment/stream', generate_assessment_stream, methods=['POST']),
+        Route('/api/generate-assessment-advanced', generate_assessment_advanced, methods=['POST']),
+        Route('/api/verify-code', verify_code, methods=['POST']),
+        Route('/api/llm/async-stats', get_async_llm_stats, methods=['GET'])
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=CORS_ORIGINS,
+                   allow_headers=['Content-Type', 'Authorization'],
+                   allow_methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
+    ],
+    lifespan=lifespan
+)
+ASYNC_PATHS = {route.path for route in async_app.routes}
+
+wsgi_app = WSGIMiddleware(flask_app, workers=ASGI_WSGI_THREADS)
+
+async def application(scope, receive, send):
+    """Send the async routes and lifespan events to Starlette and everything else to Flask"""
+    if scope['type'] == 'lifespan' or scope.get('path') in ASYNC_PATHS:
+        await async_app(scope, receive, send)
+    else:
+        await wsgi_app(scope, receive, send)
@@ -0,0 +1,186 @@
+import asyncio
+import os
+import random
+from functools import partial
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+import httpx
+
+from llm_client import (
+    LLM_CONNECT_TIMEOUT, LLM_MAX_RETRIES, LLM_READ_TIMEOUT, LLM_RETRY_BACKOFF, LLM_RETRY_BACKOFF_MAX,
+    RETRY_STATUS_CODES
+)
+from llm_dispatch import LLMDispatcher, LLMOverloadedError, PRIORITY_INTERACTIVE
+
+# Keep-alive connections of the async client; one event loop can have many calls in flight
+LLM_ASYNC_POOL_SIZE = int(os.getenv('LLM_ASYNC_POOL_SIZE', 100))
+# Async calls running upstream at once per process (waiting for budget doesn't count)
+LLM_ASYNC_CONCURRENCY = int(os.getenv('LLM_ASYNC_CONCURRENCY', 256))
+
+
+class AsyncLLMClient:
+    """asyncio counterpart of LLMClient, built on httpx.AsyncClient.
+
+    Same timeouts and retry policy: 429/5xx responses and connection errors
+    are retried with full-jitter exponential backoff (Retry-After is
+    honoured), read timeouts are not. A waiting call holds no thread, only
+    a coroutine.
+    """
+
+    def __init__(self, pool_size: int = LLM_ASYNC_POOL_SIZE,
+                 connect_timeout: float = LLM_CONNECT_TIMEOUT, read_timeout: float = LLM_READ_TIMEOUT,
+                 max_retries: int = LLM_MAX_RETRIES, backoff: float = LLM_RETRY_BACKOFF,
+                 backoff_max: float = LLM_RETRY_BACKOFF_MAX):
+        self.pool_size = pool_size
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.max_retries = max(0, max_retries)
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self._client: Optional[httpx.AsyncClient] = None
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created on first use so it belongs to the server's event loop
+        if self._client is None:
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=limits)
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt)))
+
+    async def post(self, url: str, json: Dict, headers: Optional[Dict] = None) -> httpx.Response:
+        """POST json to url, retrying transient failures; raises the last error if every attempt fails"""
+        attempt = 0
+        while True:
+            self.requests += 1
+            response = None
+            try:
+                response = await self.client.post(url, json=json, headers=headers)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    return response
+                if attempt >= self.max_retries:
+                    self.failures += 1
+                    return response
+            except httpx.ReadTimeout:
+                self.failures += 1
+                raise
+            except httpx.TransportError:
+                if attempt >= self.max_retries:
+                    self.failures += 1
+                    raise
+            self.retries += 1
+            await asyncio.sleep(self._retry_delay(attempt, response))
+            attempt += 1
+
+    def stats(self) -> Dict:
+        return {
+            'requests': self.requests,
+            'retries': self.retries,
+            'failures': self.failures,
+            'pool_size': self.pool_size
+        }
+
+
+class AsyncLLMDispatcher:
+    """asyncio counterpart of LLMDispatcher for the ASGI routes.
+
+    Identical in-flight calls are coalesced into one upstream request. Each
+    call waits in the process's LLMDispatcher priority queue (reserve()), so
+    sync and async calls share one budget and one queue: interactive calls
+    go before background refills, and a call is rejected with
+    LLMOverloadedError when it would be shed. The wait is an awaited future
+    the dispatcher thread resolves, so it holds no thread.
+    """
+
+    def __init__(self, call: Callable[[str, float], Awaitable[str]], budget: LLMDispatcher,
+                 concurrency: int = LLM_ASYNC_CONCURRENCY):
+        self.call = call
+        self.budget = budget
+        self.concurrency = max(1, concurrency)
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.waiting = 0
+        self.running = 0
+        self.coalesced = 0
+        self.shed = 0
+
+    def accepting(self, priority: int = PRIORITY_INTERACTIVE) -> bool:
+        """Whether a new call would wait for budget rather than be shed"""
+        return self.budget.accepting(priority)
+
+    async def submit(self, prompt: str, temperature: float = 0.7, priority: int = PRIORITY_INTERACTIVE) -> str:
+        key = (prompt, temperature)
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            loop = asyncio.get_running_loop()
+            ready = loop.create_future()
+            try:
+                reservation = self.budget.reserve(self.budget.estimate_tokens(prompt),
+                                                  partial(_grant_threadsafe, loop, ready), priority)
+            except LLMOverloadedError:
+                self.shed += 1
+                raise
+            task = asyncio.ensure_future(self._run(prompt, temperature, ready))
+            self._inflight[key] = task
+            task.add_done_callback(partial(self._finished, key, reservation))
+        # One caller going away must not cancel the call for everyone sharing it
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, reservation, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if task.cancelled():
+            # Don't leave a dead call holding a place in the queue
+            self.budget.cancel(reservation)
+
+    async def _run(self, prompt: str, temperature: float, ready: asyncio.Future) -> str:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        self.waiting += 1
+        try:
+            await ready
+        finally:
+            self.waiting -= 1
+        async with self._slots:
+            self.running += 1
+            result = None
+            try:
+                result = await self.call(prompt, temperature)
+                return result
+            finally:
+                self.running -= 1
+                self.budget.release(result)
+
+    def stats(self) -> Dict:
+        return {
+            'waiting': self.waiting,
+            'in_flight': self.running,
+            'concurrency': self.concurrency,
+            'coalesced': self.coalesced,
+            'shed': self.shed
+        }
+
+
+def _grant_threadsafe(loop: asyncio.AbstractEventLoop, ready: asyncio.Future):
+    """Resolve a reservation's future from the dispatcher thread"""
+    def grant():
+        if not ready.done():
+            ready.set_result(None)
+    try:
+        loop.call_soon_threadsafe(grant)
+    except RuntimeError:
+        pass  # The event loop was closed while the call waited
@@ -1,11 +1,12 @@
 import os
 import jwt
-import requests
 from datetime import datetime, timedelta
 from typing import Dict, Optional
 from functools import wraps
 from flask import request, jsonify, session
 from user_manager import user_data_manager
+import google_tokens
+from token_cache import token_cache, token_digest
 
 # OAuth Configuration
 GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
@@ -19,18 +20,9 @@ class AuthManager:
     def verify_google_token(token: str) -> Optional[Dict]:
         """Verify Google OAuth ID token and return user info"""
         try:
-            # Verify the ID token with Google
-            response = requests.get(
-                f'https://oauth2.googleapis.com/tokeninfo?id_token={token}'
-            )
-            
-            if response.status_code != 200:
-                return None
-            
-            token_info = response.json()
-            
-            # Verify the audience (client ID)
-            if token_info.get('aud') != GOOGLE_CLIENT_ID:
+            # Signature, audience, issuer and expiry are checked locally against Google's cached signing keys
+            token_info = google_tokens.google_token_verifier.verify(token)
+            if token_info is None:
                 return None
             
             # Return user information
@@ -64,25 +56,51 @@ class AuthManager:
     @staticmethod
     def verify_jwt_token(token: str) -> Optional[str]:
         """Verify JWT token and return user_id"""
+        # Tokens verified before are trusted until they expire or are revoked
+        digest = token_digest(token)
+        user_id = token_cache.get(digest)
+        if user_id is not None:
+            return user_id
+        if token_cache.is_revoked(digest):
+            return None
+        
         try:
             payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=['HS256'])
-            return payload.get('user_id')
         except jwt.ExpiredSignatureError:
             return None
         except jwt.InvalidTokenError:
             return None
+        user_id = payload.get('user_id')
+        if user_id is not None and 'exp' in payload:
+            token_cache.put(digest, user_id, payload['exp'])
+        return user_id
     
     @staticmethod
-    def get_current_user() -> Optional[str]:
-        """Get current user ID from request"""
+    def revoke_jwt_token(token: str):
+        """Invalidate a token before it expires (logout)"""
+        try:
+            payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=['HS256'])
+        except jwt.InvalidTokenError:
+            return
+        # Our tokens always carry exp; the revocation only has to outlive it
+        if 'exp' in payload:
+            token_cache.revoke(token_digest(token), payload['exp'])
+    
+    @staticmethod
+    def get_request_token() -> Optional[str]:
+        """The JWT sent with the current request, if any"""
         # Try to get token from Authorization header
         auth_header = request.headers.get('Authorization')
         if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header.split(' ')[1]
-            return AuthManager.verify_jwt_token(token)
+            return auth_header.split(' ')[1]
         
         # Try to get token from session (for web interface)
-        token = session.get('jwt_token')
+        return session.get('jwt_token')
+    
+    @staticmethod
+    def get_current_user() -> Optional[str]:
+        """Get current user ID from request"""
+        token = AuthManager.get_request_token()
         if token:
             return AuthManager.verify_jwt_token(token)
         
@@ -95,7 +113,8 @@ class AuthManager:
         if not user_info:
             return None
         
-        user_id = user_info['id']
+        user_id = user_info['sub']
+        user_data_manager.begin_unit_of_work(user_id)
         
         # Update or create user profile
         profile = user_data_manager.load_user_profile(user_id)
@@ -132,6 +151,8 @@ def require_auth(f):
         # Add user_id to request context for compatibility
         request.user_id = user_id
         request.current_user_id = user_id
+        # The user's documents are loaded at most once and written once when the request ends
+        user_data_manager.begin_unit_of_work(user_id)
         return f(*args, **kwargs)
     
     return decorated_function
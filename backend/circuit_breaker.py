@@ -0,0 +1,188 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List
+
+# Outcomes of the most recent calls the breaker judges the upstream by
+LLM_BREAKER_WINDOW = int(os.getenv('LLM_BREAKER_WINDOW', 20))
+LLM_BREAKER_MIN_CALLS = int(os.getenv('LLM_BREAKER_MIN_CALLS', 5))
+# Trip when this share of the window failed, or when its p95 latency reaches LLM_BREAKER_SLOW_SECONDS (0 disables)
+LLM_BREAKER_ERROR_RATE = float(os.getenv('LLM_BREAKER_ERROR_RATE', 0.5))
+LLM_BREAKER_SLOW_SECONDS = float(os.getenv('LLM_BREAKER_SLOW_SECONDS', 30))
+# Seconds the breaker stays open before letting a probe call through
+LLM_BREAKER_OPEN_SECONDS = float(os.getenv('LLM_BREAKER_OPEN_SECONDS', 30))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the breaker is open"""
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(fraction * len(sorted_values))
+    return sorted_values[min(len(sorted_values), max(1, rank)) - 1]
+
+
+class CircuitBreaker:
+    """Circuit breaker around calls to an unreliable upstream.
+
+    Closed: calls go through and their outcome and latency are recorded in a
+    rolling window. Once the window holds min_calls outcomes and the error
+    rate or the p95 latency crosses its threshold, the breaker opens.
+    Open: calls are rejected with CircuitOpenError without touching upstream.
+    After open_seconds one probe call is let through (half-open); it closes
+    the breaker if it succeeds in time and reopens it otherwise.
+    """
+
+    def __init__(self, window: int = LLM_BREAKER_WINDOW, min_calls: int = LLM_BREAKER_MIN_CALLS,
+                 error_rate: float = LLM_BREAKER_ERROR_RATE, slow_seconds: float = LLM_BREAKER_SLOW_SECONDS,
+                 open_seconds: float = LLM_BREAKER_OPEN_SECONDS):
+        self.min_calls = max(1, min_calls)
+        self.error_rate = error_rate
+        self.slow_seconds = slow_seconds
+        self.open_seconds = open_seconds
+        self._lock = threading.Lock()
+        self._window = deque(maxlen=max(self.min_calls, window))  # (succeeded, latency seconds)
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self.trips = 0
+        self.fallbacks = 0
+
+    def _is_slow(self, latency: float) -> bool:
+        return self.slow_seconds > 0 and latency >= self.slow_seconds
+
+    def _should_trip(self) -> bool:
+        if len(self._window) < self.min_calls:
+            return False
+        failed = sum(1 for succeeded, _ in self._window if not succeeded)
+        if failed / len(self._window) >= self.error_rate:
+            return True
+        latencies = sorted(latency for _, latency in self._window)
+        return self._is_slow(percentile(latencies, 0.95))
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._probing = False
+        self.trips += 1
+
+    def retry_after(self) -> float:
+        """Seconds until the next probe is allowed (0 unless open)"""
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def is_open(self) -> bool:
+        """Whether calls would be rejected right now; lets callers skip straight to their fallback"""
+        with self._lock:
+            if self.state == OPEN:
+                return time.monotonic() < self._opened_at + self.open_seconds
+            return self.state == HALF_OPEN and self._probing
+
+    def _acquire(self) -> bool:
+        with self._lock:
+            if self.state == OPEN and time.monotonic() >= self._opened_at + self.open_seconds:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def _record(self, succeeded: bool, latency: float):
+        with self._lock:
+            self.calls += 1
+            if not succeeded:
+                self.failures += 1
+            if self.state == HALF_OPEN:
+                if succeeded and not self._is_slow(latency):
+                    self.state = CLOSED
+                    self._window.clear()
+                    self._probing = False
+                else:
+                    self._open()
+                return
+            self._window.append((succeeded, latency))
+            if self.state == CLOSED and self._should_trip():
+                self._open()
+
+    def _abandon(self):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+
+    def call(self, func: Callable, *args, **kwargs):
+        """Run func through the breaker; any exception it raises counts as a failure and is re-raised"""
+        if not self._acquire():
+            raise CircuitOpenError("The LLM API is failing; calls are paused for a few seconds")
+        start = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self._record(False, time.monotonic() - start)
+            raise
+        self._record(True, time.monotonic() - start)
+        return result
+
+    async def call_async(self, func: Callable, *args, **kwargs):
+        """call() for a coroutine function"""
+        if not self._acquire():
+            raise CircuitOpenError("The LLM API is failing; calls are paused for a few seconds")
+        start = time.monotonic()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception:
+            self._record(False, time.monotonic() - start)
+            raise
+        except BaseException:
+            # Cancelled (client went away): no verdict, but a half-open breaker must allow another probe
+            self._abandon()
+            raise
+        self._record(True, time.monotonic() - start)
+        return result
+
+    def record_fallback(self):
+        """Count a response served from a fallback instead of upstream"""
+        with self._lock:
+            self.fallbacks += 1
+
+    def stats(self) -> Dict:
+        retry_after = self.retry_after()
+        with self._lock:
+            latencies = sorted(latency for _, latency in self._window)
+            failed = sum(1 for succeeded, _ in self._window if not succeeded)
+            return {
+                'state': self.state,
+                'retry_after': round(retry_after, 2),
+                'window': len(self._window),
+                'error_rate': round(failed / len(self._window), 4) if self._window else 0.0,
+                'latency': {
+                    'p50': round(percentile(latencies, 0.50), 3),
+                    'p95': round(percentile(latencies, 0.95), 3),
+                    'p99': round(percentile(latencies, 0.99), 3)
+                },
+                'calls': self.calls,
+                'failures': self.failures,
+                'rejected': self.rejected,
+                'trips': self.trips,
+                'fallbacks': self.fallbacks
+            }
+
+
+# Global breaker for the LLM API
+llm_breaker = CircuitBreaker()
@@ -0,0 +1,419 @@
+"""Local compile-and-run grading of C++ answers to generated coding questions.
+
+The question's FUNCTION_SIGNATURE and EXAMPLE_INPUT are turned into a small
+harness that calls the user's function and prints the result, which is then
+compared with EXAMPLE_OUTPUT. Compilation and execution run in a worker pool,
+each inside the sandbox from sandbox.py (bubblewrap namespaces, seccomp and
+CPU, memory, file size, process and wall-clock limits), and compiled binaries
+are cached by a hash of their source. Without a working sandbox the grader
+is unavailable and answers go to the LLM review instead.
+
+In Docker the sandbox runs in a separate grader container (grader_service.py)
+and the backend reaches it through RemoteCodeGrader, so only that container
+needs the namespace and mount permissions bubblewrap asks for.
+"""
+import hashlib
+import os
+import re
+import shutil
+import signal
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+
+from sandbox import Sandbox, SANDBOX_WORKDIR
+
+CODE_GRADER_ENABLED = os.getenv('CODE_GRADER_ENABLED', 'true').lower() == 'true'
+CODE_GRADER_COMPILER = os.getenv('CODE_GRADER_COMPILER', 'g++')
+CODE_GRADER_WORKERS = int(os.getenv('CODE_GRADER_WORKERS', 2))
+CODE_GRADER_CACHE_DIR = os.getenv('CODE_GRADER_CACHE_DIR', os.path.join('data', 'grader_cache'))
+CODE_GRADER_CACHE_SIZE = int(os.getenv('CODE_GRADER_CACHE_SIZE', 200))
+CODE_GRADER_RUN_TIMEOUT = float(os.getenv('CODE_GRADER_RUN_TIMEOUT', 2))
+CODE_GRADER_MEMORY_MB = int(os.getenv('CODE_GRADER_MEMORY_MB', 256))
+# Grader service to send code to instead of grading in this process (see grader_service.py)
+CODE_GRADER_URL = os.getenv('CODE_GRADER_URL', '')
+
+COMPILE_FLAGS = ['-std=c++17', '-O1', '-w']
+COMPILE_TIMEOUT_SECONDS = 30
+COMPILE_MEMORY_MB = 1536
+COMPILE_FILE_BYTES = 256 * 1024 * 1024
+MAX_OUTPUT_BYTES = 1024 * 1024
+# Process limits: the compiler driver spawns cc1plus, as and ld; graded programs may start a few threads
+COMPILE_PROCESSES = 32
+RUN_PROCESSES = 8
+# Compiler and run output returned to the user is trimmed to this many characters
+MAX_MESSAGE_CHARS = 1500
+# Remote grading: seconds to wait for the service, and between checks of whether it is up
+REMOTE_GRADE_TIMEOUT = COMPILE_TIMEOUT_SECONDS + 30
+REMOTE_HEALTH_SECONDS = 30
+
+# Grading outcomes; everything except INCONCLUSIVE is a definite verdict
+PASSED = 'passed'
+FAILED = 'failed'
+COMPILE_ERROR = 'compile_error'
+RUNTIME_ERROR = 'runtime_error'
+TIMEOUT = 'timeout'
+INCONCLUSIVE = 'inconclusive'
+
+HARNESS_PRELUDE = '''#include <bits/stdc++.h>
+#define main garudaco_user_main
+'''
+
+HARNESS_PRINTER = '''
+#undef main
+namespace garudaco_print {
+template <typename T> void print(std::ostream& os, const T& value);
+inline void print_one(std::ostream& os, bool value) { os << (value ? "true" : "false"); }
+inline void print_one(std::ostream& os, char value) { os << value; }
+inline void print_one(std::ostream& os, const std::string& value) { os << value; }
+inline void print_one(std::ostream& os, const char* value) { os << value; }
+template <typename T>
+auto print_one(std::ostream& os, const T& value) -> decltype(os << value, void()) { os << value; }
+template <typename A, typename B>
+void print_one(std::ostream& os, const std::pair<A, B>& value) {
+    os << "["; print(os, value.first); os << ","; print(os, value.second); os << "]";
+}
+template <typename T>
+void print_one(std::ostream& os, const std::vector<T>& values) {
+    os << "[";
+    for (size_t i = 0; i < values.size(); ++i) { if (i) os << ","; print(os, values[i]); }
+    os << "]";
+}
+template <typename T> void print(std::ostream& os, const T& value) { print_one(os, value); }
+}
+'''
+
+SIGNATURE_PATTERN = re.compile(r'^(?P<ret>[\w:<>,\s\*&]+?)\s*\b(?P<name>[A-Za-z_]\w*)\s*\((?P<params>.*)\)\s*(const)?\s*[;{]?\s*$')
+
+
+def extract_field(question: str, field: str) -> Optional[str]:
+    """Return the text after `FIELD:` in a generated question, up to the next field"""
+    match = re.search(rf'^\s*{field}:\s*(.*?)(?=^\s*[A-Z_]+:|\Z)', question, re.MULTILINE | re.DOTALL)
+    if not match:
+        return None
+    value = match.group(1).strip().strip('`').strip()
+    return value or None
+
+
+def split_top_level(text: str, separator: str = ',') -> List[str]:
+    """Split on separator outside of brackets, braces, angle brackets and quotes"""
+    parts, depth, quote, current = [], 0, None, ''
+    for char in text:
+        if quote:
+            current += char
+            if char == quote:
+                quote = None
+            continue
+        if char in '"\'':
+            quote = char
+        elif char in '([{<':
+            depth += 1
+        elif char in ')]}>':
+            depth -= 1
+        elif char == separator and depth == 0:
+            parts.append(current.strip())
+            current = ''
+            continue
+        current += char
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def parse_signature(signature: str) -> Optional[Dict]:
+    match = SIGNATURE_PATTERN.match(signature.strip())
+    if not match:
+        return None
+    params = []
+    for param in split_top_level(match.group('params')):
+        param = param.split('=')[0].strip()
+        if not param or param == 'void':
+            continue
+        name_match = re.search(r'([A-Za-z_]\w*)\s*(\[\s*\])?$', param)
+        if not name_match:
+            return None
+        param_type = param[:name_match.start()].strip()
+        if not param_type:
+            return None
+        params.append(param_type)
+    return {'return_type': match.group('ret').strip(), 'name': match.group('name'), 'params': params}
+
+
+def parse_arguments(example_input: str) -> List[str]:
+    """Turn `[1,2,3], target = 3` into C++ initializers like `{1,2,3}` and `3`"""
+    arguments = []
+    for part in split_top_level(example_input.splitlines()[0] if example_input else ''):
+        part = re.sub(r'^[A-Za-z_]\w*\s*=\s*', '', part)
+        arguments.append(part.replace('[', '{').replace(']', '}'))
+    return arguments
+
+
+def build_harness(question: str, code: str) -> Optional[str]:
+    """Return harness source that prints the user's result for the example input, or None"""
+    signature = extract_field(question, 'FUNCTION_SIGNATURE')
+    example_input = extract_field(question, 'EXAMPLE_INPUT')
+    if not signature or example_input is None or extract_field(question, 'EXAMPLE_OUTPUT') is None:
+        return None
+    parsed = parse_signature(signature)
+    if parsed is None or parsed['return_type'] == 'void':
+        return None
+    arguments = parse_arguments(example_input)
+    if len(arguments) != len(parsed['params']):
+        return None
+
+    lines = ['int main() {', '    using namespace std;']
+    for index, (param_type, argument) in enumerate(zip(parsed['params'], arguments)):
+        lines.append(f'    std::decay_t<{param_type}> arg{index} = {argument};')
+    call_args = ', '.join(f'arg{index}' for index in range(len(arguments)))
+    lines.append(f'    auto result = {parsed["name"]}({call_args});')
+    lines.append('    std::cout << std::setprecision(10);')
+    lines.append('    garudaco_print::print(std::cout, result);')
+    lines.append('    std::cout << std::endl;')
+    lines.append('    return 0;')
+    lines.append('}')
+    return HARNESS_PRELUDE + code + '\n' + HARNESS_PRINTER + '\n'.join(lines) + '\n'
+
+
+def normalize_output(text: str) -> str:
+    text = text.strip().strip('`').lower()
+    text = text.replace('{', '[').replace('}', ']').replace('(', '[').replace(')', ']')
+    return re.sub(r'[\s"\']', '', text)
+
+
+def is_plain_value(expected: str) -> bool:
+    """Whether EXAMPLE_OUTPUT is just a value rather than a value with an explanation"""
+    words = re.findall(r'[A-Za-z]+', expected)
+    return len(expected.split()) == 1 or all(word.lower() in ('true', 'false') for word in words)
+
+
+def outputs_match(actual: str, expected: str) -> bool:
+    actual, expected = normalize_output(actual), normalize_output(expected)
+    if actual == expected:
+        return True
+    try:
+        return abs(float(actual) - float(expected)) <= 1e-6 * max(1.0, abs(float(expected)))
+    except ValueError:
+        return False
+
+
+def _describe_exit(exit_code: int) -> str:
+    if exit_code == -signal.SIGXFSZ:
+        return f'The program printed more than {MAX_OUTPUT_BYTES // 1024} KB of output'
+    if exit_code < 0:
+        try:
+            return f'The program was killed by {signal.Signals(-exit_code).name}'
+        except ValueError:
+            pass
+    return f'The program exited with code {exit_code}'
+
+
+def _trim(text: str) -> str:
+    text = text.strip()
+    return text if len(text) <= MAX_MESSAGE_CHARS else text[:MAX_MESSAGE_CHARS] + '\n...'
+
+
+class CodeGrader:
+    """Compiles and runs C++ answers in the sandbox on a bounded worker pool with an artifact cache"""
+
+    def __init__(self, compiler: str = CODE_GRADER_COMPILER, workers: int = CODE_GRADER_WORKERS,
+                 cache_dir: str = CODE_GRADER_CACHE_DIR, cache_size: int = CODE_GRADER_CACHE_SIZE,
+                 run_timeout: float = CODE_GRADER_RUN_TIMEOUT, memory_mb: int = CODE_GRADER_MEMORY_MB,
+                 enabled: bool = CODE_GRADER_ENABLED, sandbox: Optional[Sandbox] = None):
+        self.compiler = shutil.which(compiler) if enabled else None
+        self.sandbox = sandbox or Sandbox()
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.cache_size = cache_size
+        self.run_timeout = run_timeout
+        self.memory_mb = memory_mb
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='code-grader')
+        self.compiles = 0
+        self.artifact_hits = 0
+
+    @property
+    def available(self) -> bool:
+        return self.compiler is not None and self.sandbox.available
+
+    def grade(self, question: str, code: str) -> Optional[Dict]:
+        """Grade code against the question's example on the worker pool; None without a compiler or sandbox"""
+        if not self.available:
+            return None
+        return self._executor.submit(self._grade, question, code).result()
+
+    def _compile(self, source: str, workdir: str, syntax_only: bool = False) -> Dict:
+        """Compile source, reusing a cached binary with the same source hash"""
+        digest = hashlib.sha256('\0'.join([self.compiler] + COMPILE_FLAGS + [source]).encode('utf-8')).hexdigest()
+        binary = os.path.join(self.cache_dir, digest)
+        if not syntax_only and os.path.exists(binary):
+            os.utime(binary)
+            self.artifact_hits += 1
+            return {'ok': True, 'binary': binary}
+
+        with open(os.path.join(workdir, 'solution.cpp'), 'w') as f:
+            f.write(source)
+        # Paths inside the sandbox, where workdir is mounted at SANDBOX_WORKDIR
+        source_path = f'{SANDBOX_WORKDIR}/solution.cpp'
+        command = [self.compiler] + COMPILE_FLAGS + [source_path]
+        command += ['-fsyntax-only'] if syntax_only else ['-o', f'{SANDBOX_WORKDIR}/solution.out']
+        self.compiles += 1
+        try:
+            result = self.sandbox.run(
+                command, workdir, timeout=COMPILE_TIMEOUT_SECONDS, cpu_seconds=COMPILE_TIMEOUT_SECONDS,
+                memory_mb=COMPILE_MEMORY_MB, file_bytes=COMPILE_FILE_BYTES, processes=COMPILE_PROCESSES,
+                stdin=subprocess.DEVNULL, capture_output=True, text=True
+            )
+        except subprocess.TimeoutExpired:
+            return {'ok': False, 'errors': 'Compilation timed out'}
+        if result.returncode != 0:
+            return {'ok': False, 'errors': result.stderr.replace(source_path, 'solution.cpp')}
+        if syntax_only:
+            return {'ok': True}
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        os.replace(os.path.join(workdir, 'solution.out'), binary)
+        self._prune_cache()
+        return {'ok': True, 'binary': binary}
+
+    def _prune_cache(self):
+        try:
+            entries = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)]
+            if len(entries) <= self.cache_size:
+                return
+            entries.sort(key=os.path.getmtime)
+            for path in entries[:len(entries) - self.cache_size]:
+                os.remove(path)
+        except OSError as e:
+            print(f"Error pruning grader cache: {str(e)}")
+
+    def _run(self, binary: str, workdir: str) -> Dict:
+        stdout_path = os.path.join(workdir, 'stdout.txt')
+        cpu_seconds = max(1, int(self.run_timeout + 0.999))
+        try:
+            with open(stdout_path, 'w') as stdout:
+                result = self.sandbox.run(
+                    [f'{SANDBOX_WORKDIR}/solution'], workdir, timeout=self.run_timeout, cpu_seconds=cpu_seconds,
+                    memory_mb=self.memory_mb, file_bytes=MAX_OUTPUT_BYTES, processes=RUN_PROCESSES,
+                    read_only={binary: f'{SANDBOX_WORKDIR}/solution'},
+                    stdin=subprocess.DEVNULL, stdout=stdout, stderr=subprocess.PIPE
+                )
+        except subprocess.TimeoutExpired:
+            return {'status': TIMEOUT}
+        with open(stdout_path, 'r', errors='replace') as f:
+            output = f.read(MAX_OUTPUT_BYTES)
+        if result.returncode < 0 and -result.returncode in (signal.SIGXCPU, signal.SIGKILL):
+            return {'status': TIMEOUT}
+        if result.returncode != 0:
+            return {'status': RUNTIME_ERROR, 'exit_code': result.returncode,
+                    'output': output, 'errors': result.stderr.decode('utf-8', 'replace')}
+        return {'status': 'ok', 'output': output}
+
+    def _grade(self, question: str, code: str) -> Dict:
+        with tempfile.TemporaryDirectory(prefix='garudaco-grade-') as workdir:
+            harness = build_harness(question, code)
+            if harness is not None:
+                compiled = self._compile(harness, workdir)
+                if compiled['ok']:
+                    return self._check(compiled['binary'], workdir, question)
+
+            # No harness, or the harness didn't build: tell compile errors apart from an unusable example
+            checked = self._compile(code, workdir, syntax_only=True)
+            if not checked['ok']:
+                return {'status': COMPILE_ERROR, 'message': _trim(checked['errors'])}
+            return {'status': INCONCLUSIVE,
+                    'message': 'The code compiles, but the example could not be run against the function signature'}
+
+    def _check(self, binary: str, workdir: str, question: str) -> Dict:
+        expected = extract_field(question, 'EXAMPLE_OUTPUT')
+        run = self._run(binary, workdir)
+        if run['status'] == TIMEOUT:
+            return {'status': TIMEOUT, 'message': f'The example did not finish within {self.run_timeout:g}s'}
+        if run['status'] == RUNTIME_ERROR:
+            return {'status': RUNTIME_ERROR, 'message': _trim(run['errors'] or _describe_exit(run['exit_code']))}
+        actual = run['output'].strip()
+        if outputs_match(actual, expected):
+            status = PASSED
+        elif is_plain_value(expected):
+            status = FAILED
+        else:
+            # Expected output mixes in prose; leave the judgement to the LLM review
+            status = INCONCLUSIVE
+        return {'status': status, 'expected': expected, 'actual': _trim(actual)}
+
+    def stats(self) -> Dict:
+        return {'available': self.available, 'compiles': self.compiles, 'artifact_hits': self.artifact_hits}
+
+
+class RemoteCodeGrader:
+    """CodeGrader interface backed by the grader service; unavailable while the service is down"""
+
+    def __init__(self, url: str = CODE_GRADER_URL, timeout: float = REMOTE_GRADE_TIMEOUT):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._available: Optional[bool] = None
+        self._checked_at = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def available(self) -> bool:
+        """Whether the service is up with a working sandbox; rechecked every REMOTE_HEALTH_SECONDS"""
+        now = time.monotonic()
+        if self._available is None or now - self._checked_at >= REMOTE_HEALTH_SECONDS:
+            self._checked_at = now
+            try:
+                response = self.session.get(f'{self.url}/health', timeout=5)
+                self._available = response.ok and response.json().get('available') is True
+            except (requests.RequestException, ValueError) as e:
+                print(f"Code grader service unavailable: {str(e)}")
+                self._available = False
+        return self._available
+
+    def grade(self, question: str, code: str) -> Optional[Dict]:
+        """Grade through the service; None when it is down, like CodeGrader without a sandbox"""
+        if not self.available:
+            return None
+        self.requests += 1
+        try:
+            response = self.session.post(f'{self.url}/grade', json={'question': question, 'code': code},
+                                         timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()['grade']
+        except (requests.RequestException, ValueError, KeyError) as e:
+            print(f"Error grading code remotely: {str(e)}")
+            self.failures += 1
+            self._available = None
+            return None
+
+    def stats(self) -> Dict:
+        return {'available': bool(self._available), 'remote': self.url, 'requests': self.requests,
+                'failures': self.failures}
+
+
+def format_verification(grade: Dict) -> str:
+    """Render a definite grade in the RESULT/FEEDBACK/SUGGESTIONS format the frontend reads"""
+    status = grade['status']
+    if status == PASSED:
+        feedback = f"Your function returned {grade['actual']} for the example input, which matches the expected output."
+        suggestions = 'Test a few edge cases of your own as well.'
+    elif status == FAILED:
+        feedback = f"For the example input your function returned {grade['actual'] or '(nothing)'}, but {grade['expected']} was expected."
+        suggestions = 'Trace the example input through your code by hand.'
+    elif status == COMPILE_ERROR:
+        feedback = f"The code does not compile:\n{grade['message']}"
+        suggestions = 'Fix the compiler errors above and make sure the function matches FUNCTION_SIGNATURE.'
+    elif status == TIMEOUT:
+        feedback = grade['message']
+        suggestions = 'Look for infinite loops or an algorithm that is too slow.'
+    else:
+        feedback = f"The program crashed on the example input:\n{grade['message']}"
+        suggestions = 'Check array bounds, null pointers and recursion depth.'
+    result = 'YES' if status == PASSED else 'NO'
+    return f"RESULT: {result}\nFEEDBACK: {feedback}\nSUGGESTIONS: {suggestions}"
+
+
+# Global grader instance
+code_grader = RemoteCodeGrader() if CODE_GRADER_URL else CodeGrader()
@@ -1,27 +1,39 @@
+import heapq
 import json
-import math
 import random
 import uuid
 from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Tuple
+from typing import Iterable, List, Optional, Dict, Tuple
+from filters import apply_filters
+from priority import (
+    W_STRUGGLE, W_DUE, W_BASE, W_NOVELTY, DIVERSITY_PENALTY,
+    NEW_TOPIC_WINDOW_DAYS, BASE_INTERVAL_DAYS,
+    calculate_due_score, next_due_at, days_since, laplace_success_rate
+)
+from question_parser import grade_answer
+from sampling import weighted_sample_without_replacement
+from scoring import calculate_priorities
+from storage import topic_added, topic_updated
 from user_manager import user_data_manager
 
-# --------------------------- Configuration (final, tuned weights) ---------------------------
-# These weights were chosen to prioritise: (1) struggle (user failing), (2) due/spacing, (3) inherent difficulty,
-# (4) novelty for new topics.
-W_STRUGGLE = 0.40      # most important: user struggling => repeat sooner
-W_DUE = 0.30           # spaced repetition / time-since-last-seen
-W_BASE = 0.15          # original difficulty (user-provided initial estimate)
-W_NOVELTY = 0.15       # small boost to recently-added topics
-
-# Diversity penalty: when a topic from a category is picked, reduce the priority of other topics in same category
-DIVERSITY_PENALTY = 0.70
-
-# New topic window (days) for novelty boost
-NEW_TOPIC_WINDOW_DAYS = 14
+# --------------------------- Configuration --------------------------------------------------
+# How get_recommendations picks from the prioritized topics: deterministic top-priority
+# ('ranked') or priority-proportional sampling with the diversity penalty ('weighted')
+SELECTION_MODES = ('ranked', 'weighted')
+
+# For get_sorted_recommendations: the sort_order that puts the largest values first
+SORT_DESCENDING_ORDER = {
+    'success_rate': 'top',
+    'attempt_count': 'top',
+    'base_score': 'top',
+    'last_seen': 'bottom',
+    'date_added': 'bottom'
+}
 
-# Base spacing interval (days)
-BASE_INTERVAL_DAYS = 3.0
+# Libraries with at least this many topics only score due topics (see next_due_at) plus
+# EXPLORATION_SAMPLE_SIZE random not-yet-due ones, instead of every topic
+DUE_INDEX_MIN_TOPICS = 200
+EXPLORATION_SAMPLE_SIZE = 20
 
 # Flagging configuration
 BASE_SCORE_ADJUSTMENT_RATIO = 0.10 # Max fraction of the difference to adjust base_score
@@ -43,9 +55,8 @@ def add_new_topic(user_id: str, name: str, category: str, difficulty: int) -> st
     topics = user_data_manager.load_user_topics(user_id)
     
     # Check if topic already exists
-    for topic in topics:
-        if topic['topic_name'].lower() == name.lower():
-            return f"Topic '{name}' already exists"
+    if topics.find_by_name(name) is not None:
+        return f"Topic '{name}' already exists"
     
     new_topic = {
         'topic_id': str(uuid.uuid4()),
@@ -57,9 +68,9 @@ def add_new_topic(user_id: str, name: str, category: str, difficulty: int) -> st
         'date_added': datetime.now(),
         'last_seen': None
     }
+    new_topic['next_due'] = next_due_at(new_topic)
     
-    topics.append(new_topic)
-    user_data_manager.save_user_topics(user_id, topics)
+    user_data_manager.update_user_topics(user_id, [topic_added(new_topic)])
     
     # Update user profile
     profile = user_data_manager.load_user_profile(user_id)
@@ -68,47 +79,112 @@ def add_new_topic(user_id: str, name: str, category: str, difficulty: int) -> st
     
     return f"Topic '{name}' added successfully"
 
-def get_recommendations(user_id: str, count: int, filters: Optional[Dict] = None) -> List[str]:
-    """Get topic recommendations for a specific user using the spaced repetition algorithm"""
+def import_topics(user_id: str, rows: Iterable) -> List[Dict]:
+    """Add many topics for a user with a single write.
+    
+    rows may be any iterable (e.g. a streaming parser) of dicts with topic_name
+    (or name), category and optional base_score. Duplicates are detected against
+    the existing topics and earlier rows of the same import. Returns one result
+    per row with a status of 'added', 'duplicate' or 'invalid'.
+    """
+    topics = user_data_manager.load_user_topics(user_id)
+    results = []
+    changes = []
+    now = datetime.now()
+    
+    for row_no, row in enumerate(rows):
+        if not isinstance(row, dict):
+            results.append({'row': row_no, 'status': 'invalid', 'error': 'Row must be a JSON object'})
+            continue
+        
+        name = row.get('topic_name') or row.get('name')
+        category = row.get('category')
+        base_score = row.get('base_score', 50)
+        if not isinstance(name, str) or not name.strip() or not isinstance(category, str) or not category.strip():
+            results.append({'row': row_no, 'status': 'invalid', 'error': 'Topic name and category are required'})
+            continue
+        if isinstance(base_score, bool) or not isinstance(base_score, (int, float)):
+            results.append({'row': row_no, 'status': 'invalid', 'error': 'base_score must be a number'})
+            continue
+        
+        name = name.strip()
+        existing = topics.find_by_name(name)
+        if existing is not None:
+            results.append({
+                'row': row_no, 'status': 'duplicate', 'topic_name': name, 'topic_id': existing['topic_id']
+            })
+            continue
+        
+        new_topic = {
+            'topic_id': str(uuid.uuid4()),
+            'topic_name': name,
+            'category': category.strip(),
+            'base_score': base_score,
+            'attempts': 0,
+            'successes': 0,
+            'date_added': now,
+            'last_seen': None,
+            'next_due': now
+        }
+        topics.append(new_topic)
+        changes.append(topic_added(new_topic))
+        results.append({'row': row_no, 'status': 'added', 'topic_name': name, 'topic_id': new_topic['topic_id']})
+    
+    if changes:
+        user_data_manager.update_user_topics(user_id, changes)
+        
+        profile = user_data_manager.load_user_profile(user_id)
+        profile['total_topics_added'] = profile.get('total_topics_added', 0) + len(changes)
+        user_data_manager.save_user_profile(user_id, profile)
+    
+    return results
+
+def get_recommendations(user_id: str, count: int, filters: Optional[Dict] = None,
+                        selection_mode: str = 'ranked') -> List[str]:
+    """Get topic recommendations for a specific user using the spaced repetition algorithm
+    
+    selection_mode 'ranked' takes the highest priorities deterministically;
+    'weighted' samples proportionally to priority with the category diversity penalty.
+    """
+    if selection_mode not in SELECTION_MODES:
+        raise ValueError(f"selection_mode must be one of: {', '.join(SELECTION_MODES)}")
+    
     topics = user_data_manager.load_user_topics(user_id)
     
     if not topics:
         return []
     
+    now = datetime.now()
+    filters_applied = False
+    
+    # Large libraries: only score topics that are due plus a small exploration sample
+    if len(topics) >= DUE_INDEX_MIN_TOPICS:
+        candidates = _due_candidates(user_id, topics, count, now)
+        if filters:
+            candidates = apply_filters(candidates, filters)
+        if len(candidates) >= count:
+            topics = candidates
+            filters_applied = True
+    
     # Apply filters if provided
-    if filters:
+    if filters and not filters_applied:
         topics = apply_filters(topics, filters)
     
     if len(topics) == 0:
         return []
     
-    # Calculate priorities for each topic
-    prioritized_topics = []
-    for topic in topics:
-        priority = calculate_priority(topic, topics)
-        prioritized_topics.append((topic, priority))
-    
-    # Sort by priority (highest first)
-    prioritized_topics.sort(key=lambda x: x[1], reverse=True)
-    
-    # Apply diversity penalty and select topics
-    selected_topics = []
-    used_categories = set()
+    # Calculate priorities for all topics in one vectorized pass
+    priorities = calculate_priorities(topics, now)
+    prioritized_topics = list(zip(topics, priorities.tolist()))
     
-    for topic, priority in prioritized_topics:
-        if len(selected_topics) >= count:
-            break
-        
-        # Apply diversity penalty if category already used
-        if topic['category'] in used_categories:
-            priority *= DIVERSITY_PENALTY
-        
-        selected_topics.append(topic)
-        used_categories.add(topic['category'])
-        
-        # If we need more topics and have exhausted unique categories, allow repeats
-        if len(selected_topics) < count and len(used_categories) == len(set(t['category'] for t in topics)):
-            used_categories.clear()
+    if selection_mode == 'weighted':
+        candidates = [
+            {'index': i, 'category': topic['category'], 'priority': priority}
+            for i, (topic, priority) in enumerate(prioritized_topics)
+        ]
+        selected_topics = [topics[c['index']] for c in weighted_sample_without_replacement(candidates, count)]
+    else:
+        selected_topics = _select_ranked(prioritized_topics, count)
     
     # Create assessment set and store current assessment
     set_id = f"set_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{random.randint(1000, 9999)}"
@@ -137,6 +213,58 @@ def get_recommendations(user_id: str, count: int, filters: Optional[Dict] = None
     
     return recommendations
 
+def _due_candidates(user_id: str, topics: List[dict], count: int, now: datetime) -> List[dict]:
+    """Return the due topics, topics without a stored next_due, and a random sample of the rest"""
+    index = topics.due_index
+    unindexed = list(index.unindexed)
+    if unindexed:
+        # Backfill next_due for topics stored before it existed; this also updates the cached index
+        changes = [
+            topic_updated(topic_id, {'next_due': next_due_at(topics.get(topic_id))})
+            for topic_id in unindexed if topics.get(topic_id) is not None
+        ]
+        user_data_manager.update_user_topics(user_id, changes)
+    
+    candidate_ids = (
+        index.due_ids(now) + unindexed +
+        index.sample_not_due(now, max(EXPLORATION_SAMPLE_SIZE, count))
+    )
+    candidates = []
+    seen_ids = set()
+    for topic_id in candidate_ids:
+        topic = topics.get(topic_id)
+        if topic is not None and topic_id not in seen_ids:
+            seen_ids.add(topic_id)
+            candidates.append(topic)
+    return candidates
+
+def _select_ranked(prioritized_topics: List[Tuple[dict, float]], count: int) -> List[dict]:
+    """Deterministically pick the highest-priority topics, cycling through categories"""
+    # Sort by priority (highest first)
+    prioritized_topics = sorted(prioritized_topics, key=lambda x: x[1], reverse=True)
+    category_count = len(set(topic['category'] for topic, _ in prioritized_topics))
+    
+    # Apply diversity penalty and select topics
+    selected_topics = []
+    used_categories = set()
+    
+    for topic, priority in prioritized_topics:
+        if len(selected_topics) >= count:
+            break
+        
+        # Apply diversity penalty if category already used
+        if topic['category'] in used_categories:
+            priority *= DIVERSITY_PENALTY
+        
+        selected_topics.append(topic)
+        used_categories.add(topic['category'])
+        
+        # If we need more topics and have exhausted unique categories, allow repeats
+        if len(selected_topics) < count and len(used_categories) == category_count:
+            used_categories.clear()
+    
+    return selected_topics
+
 def get_sorted_recommendations(user_id: str, count: int, sort_by: str, sort_order: str) -> List[str]:
     """Get sorted topic recommendations for a specific user"""
     topics = user_data_manager.load_user_topics(user_id)
@@ -144,42 +272,20 @@ def get_sorted_recommendations(user_id: str, count: int, sort_by: str, sort_orde
     if not topics:
         return []
     
-    # Add computed fields for sorting
-    enriched_topics = []
-    for topic in topics:
-        attempts = topic.get('attempts', 0)
-        successes = topic.get('successes', 0)
-        success_rate = (successes / attempts * 100) if attempts > 0 else 0
-        
-        days_since_last_seen = 999
-        if topic.get('last_seen'):
-            days_since_last_seen = (datetime.now() - topic['last_seen']).days
-        
-        days_since_added = (datetime.now() - topic['date_added']).days
-        
-        enriched_topic = topic.copy()
-        enriched_topic.update({
-            'success_rate': success_rate,
-            'attempt_count': attempts,
-            'days_since_last_seen': days_since_last_seen,
-            'days_since_added': days_since_added
-        })
-        enriched_topics.append(enriched_topic)
-    
-    # Sort based on criteria
-    if sort_by == 'success_rate':
-        enriched_topics.sort(key=lambda x: x['success_rate'], reverse=(sort_order == 'top'))
-    elif sort_by == 'attempt_count':
-        enriched_topics.sort(key=lambda x: x['attempt_count'], reverse=(sort_order == 'top'))
-    elif sort_by == 'base_score':
-        enriched_topics.sort(key=lambda x: x['base_score'], reverse=(sort_order == 'top'))
-    elif sort_by == 'last_seen':
-        enriched_topics.sort(key=lambda x: x['days_since_last_seen'], reverse=(sort_order == 'bottom'))
-    elif sort_by == 'date_added':
-        enriched_topics.sort(key=lambda x: x['days_since_added'], reverse=(sort_order == 'bottom'))
+    # Select the top `count` by heap over (key, index) tuples; the index tie-break
+    # reproduces the stable full sort, and only the selected topics get copied
+    now = datetime.now()
+    if sort_by in SORT_DESCENDING_ORDER:
+        descending = sort_order == SORT_DESCENDING_ORDER[sort_by]
+        keys = []
+        for i, topic in enumerate(topics):
+            value = _sort_metric(topic, sort_by, now)
+            keys.append((-value if descending else value, i))
+        selected_indexes = [i for _, i in heapq.nsmallest(count, keys)]
+    else:
+        selected_indexes = range(min(count, len(topics)))
     
-    # Take the requested count
-    selected_topics = enriched_topics[:count]
+    selected_topics = [_enrich_topic(topics[i], now) for i in selected_indexes]
     
     # Create assessment set and store current assessment
     set_id = f"sorted_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{random.randint(1000, 9999)}"
@@ -214,6 +320,70 @@ def get_sorted_recommendations(user_id: str, count: int, sort_by: str, sort_orde
     
     return recommendations
 
+def _sort_metric(topic: Dict, sort_by: str, now: datetime) -> float:
+    """Compute the single value get_sorted_recommendations orders by"""
+    if sort_by == 'success_rate':
+        attempts = topic.get('attempts', 0)
+        return (topic.get('successes', 0) / attempts * 100) if attempts > 0 else 0
+    elif sort_by == 'attempt_count':
+        return topic.get('attempts', 0)
+    elif sort_by == 'base_score':
+        return topic['base_score']
+    elif sort_by == 'last_seen':
+        return (now - topic['last_seen']).days if topic.get('last_seen') else 999
+    elif sort_by == 'date_added':
+        return (now - topic['date_added']).days
+    return 0
+
+def _enrich_topic(topic: Dict, now: datetime) -> Dict:
+    """Copy a topic and add the computed fields used for sorted assessments"""
+    attempts = topic.get('attempts', 0)
+    successes = topic.get('successes', 0)
+    success_rate = (successes / attempts * 100) if attempts > 0 else 0
+    
+    days_since_last_seen = 999
+    if topic.get('last_seen'):
+        days_since_last_seen = (now - topic['last_seen']).days
+    
+    days_since_added = (now - topic['date_added']).days
+    
+    enriched_topic = topic.copy()
+    enriched_topic.update({
+        'success_rate': success_rate,
+        'attempt_count': attempts,
+        'days_since_last_seen': days_since_last_seen,
+        'days_since_added': days_since_added
+    })
+    return enriched_topic
+
+def record_assessment_questions(user_id: str, set_id: str, questions: List[Dict]) -> bool:
+    """Store the generated questions (rec_no, question_type, question_text, answer_key, degraded) with the current assessment
+    
+    Answer keys never have to come back from the client: flag_recommendation_set
+    grades MCQ and fill-in-the-blank answers against them.
+    """
+    assessment = user_data_manager.load_user_current_assessment(user_id)
+    if not assessment or assessment['set_id'] != set_id:
+        return False
+    
+    stored = assessment.setdefault('questions', {})
+    for question in questions:
+        stored[str(question['rec_no'])] = {
+            'question_type': question['question_type'],
+            'question_text': question['question_text'],
+            'answer_key': question.get('answer_key'),
+            'degraded': question.get('degraded', False)
+        }
+    user_data_manager.save_user_current_assessment(user_id, assessment)
+    return True
+
+def get_assessment_question(user_id: str, set_id: str, rec_no: int) -> Optional[Dict]:
+    """The stored question for rec_no of the current assessment, or None"""
+    assessment = user_data_manager.load_user_current_assessment(user_id)
+    if not assessment or assessment['set_id'] != set_id:
+        return None
+    return assessment.get('questions', {}).get(str(rec_no))
+
 def flag_recommendation_set(user_id: str, set_id: str, feedback: List[Dict]) -> str:
     """Process feedback for the current assessment set"""
     # Get current assessment
@@ -225,30 +395,35 @@ def flag_recommendation_set(user_id: str, set_id: str, feedback: List[Dict]) ->
     # Load current topics
     topics = user_data_manager.load_user_topics(user_id)
     
-    # Process feedback for each topic
+    # Process feedback for each topic, recording only the fields that change
+    changes = []
     for fb in feedback:
         rec_no = fb['rec_no']
         difficulty = fb['difficulty']  # 'easy', 'medium', 'hard'
-        solved = fb['solved']  # True/False
         
         if rec_no >= len(assessment['topics']):
             continue
         
+        # Grade MCQ and fill-in-the-blank answers against the stored key; otherwise trust the client's verdict
+        stored_question = assessment.get('questions', {}).get(str(rec_no))
+        if stored_question is not None and stored_question.get('degraded'):
+            # A template or fallback question served while the LLM was down says nothing about the topic
+            continue
+        solved = None
+        if stored_question is not None:
+            solved = grade_answer(stored_question['question_type'], stored_question.get('answer_key'), fb.get('answer'))
+        if solved is None:
+            solved = fb['solved']  # True/False
+        
         assessment_topic = assessment['topics'][rec_no]
         topic_id = assessment_topic['topic_id']
         
         # Find the topic in the current topics list
-        topic_index = None
-        for i, topic in enumerate(topics):
-            if topic['topic_id'] == topic_id:
-                topic_index = i
-                break
-        
-        if topic_index is None:
+        topic = topics.get(topic_id)
+        if topic is None:
             continue
         
         # Update topic statistics
-        topic = topics[topic_index]
         topic['attempts'] = topic.get('attempts', 0) + 1
         topic['last_seen'] = datetime.now()
         
@@ -266,10 +441,16 @@ def flag_recommendation_set(user_id: str, set_id: str, feedback: List[Dict]) ->
             new_score = current_score + adjustment
             topic['base_score'] = max(1, min(100, new_score))
         
-        topics[topic_index] = topic
+        changes.append(topic_updated(topic_id, {
+            'attempts': topic['attempts'],
+            'successes': topic.get('successes', 0),
+            'last_seen': topic['last_seen'],
+            'base_score': topic['base_score'],
+            'next_due': next_due_at(topic)
+        }))
     
-    # Save updated topics
-    user_data_manager.save_user_topics(user_id, topics)
+    # Append the changes to the user's topic journal
+    user_data_manager.update_user_topics(user_id, changes)
     
     # Update user profile
     profile = user_data_manager.load_user_profile(user_id)
@@ -283,39 +464,6 @@ def flag_recommendation_set(user_id: str, set_id: str, feedback: List[Dict]) ->
 
 # --------------------------- Helper Functions ----------------------------------
 
-def apply_filters(topics: List[dict], filters: Dict) -> List[dict]:
-    """Apply filters to topics list"""
-    filtered_topics = []
-    now = datetime.now()
-    
-    for topic in topics:
-        # Filter by added_in_last_days
-        if 'added_in_last_days' in filters and filters['added_in_last_days'] is not None:
-            days_since_added = (now - topic['date_added']).days
-            if days_since_added > filters['added_in_last_days']:
-                continue
-        
-        # Filter by not_asked_in_last_days
-        if 'not_asked_in_last_days' in filters and filters['not_asked_in_last_days'] is not None:
-            if topic.get('last_seen'):
-                days_since_last_seen = (now - topic['last_seen']).days
-                if days_since_last_seen < filters['not_asked_in_last_days']:
-                    continue
-        
-        # Filter by min_base_score
-        if 'min_base_score' in filters and filters['min_base_score'] is not None:
-            if topic['base_score'] < filters['min_base_score']:
-                continue
-        
-        # Filter by categories
-        if 'categories' in filters and filters['categories']:
-            if topic['category'] not in filters['categories']:
-                continue
-        
-        filtered_topics.append(topic)
-    
-    return filtered_topics
-
 def calculate_priority(topic: Dict, all_topics: List[Dict]) -> float:
     """Calculate priority score for a topic"""
     struggle_score = calculate_struggle_score(topic)
@@ -344,31 +492,6 @@ def calculate_struggle_score(topic: Dict) -> float:
     # Higher failure rate = higher struggle score = higher priority
     return min(failure_rate * 2, 1.0)
 
-def calculate_due_score(topic: Dict) -> float:
-    """Calculate due score based on spaced repetition"""
-    last_seen = topic.get('last_seen')
-    
-    if not last_seen:
-        return 1.0  # High priority for never-seen topics
-    
-    days_since_last_seen = (datetime.now() - last_seen).days
-    
-    # Calculate target interval based on success rate
-    attempts = topic.get('attempts', 0)
-    successes = topic.get('successes', 0)
-    success_rate = successes / attempts if attempts > 0 else 0
-    
-    # More successful topics can wait longer
-    interval_multiplier = max(1, success_rate * 3)
-    target_interval = BASE_INTERVAL_DAYS * interval_multiplier
-    
-    if days_since_last_seen >= target_interval:
-        # Topic is due or overdue
-        return min(days_since_last_seen / target_interval, 1.0)
-    else:
-        # Topic is not yet due
-        return (days_since_last_seen / target_interval) * 0.3
-
 def calculate_base_score(topic: Dict) -> float:
     """Calculate priority based on base difficulty"""
     # Higher difficulty = higher priority (more practice needed)
@@ -508,18 +631,6 @@ def _persist_recommendation_set(set_id: str, picked: List[dict]):
     ]
     _save_recommendation_sets(recommendation_sets)
 
-# --------------------------- Utility functions --------------------------------------------
-def days_since(dt: Optional[datetime], now: datetime) -> Optional[float]:
-    if dt is None:
-        return None
-    return max(0.0, (now - dt).total_seconds() / 86400.0)
-
-
-def laplace_success_rate(successes: int, attempts: int, alpha: float = 1.0, beta: float = 1.0) -> float:
-    """Return smoothed success rate using Laplace smoothing to handle zero attempts."""
-    return (successes + alpha) / (attempts + alpha + beta)
-
-
 # --------------------------- Core priority function --------------------------------------
 def _compute_priority(topic: dict, now: datetime) -> Tuple[float, dict]:
     """
@@ -653,49 +764,7 @@ def filter_topics(topics: List[dict], filters: Dict = None) -> List[dict]:
     - min_base_score: int - only topics with base_score >= X
     - categories: List[str] - only topics from specified categories
     """
-    if not filters:
-        return topics
-    
-    now = datetime.utcnow()
-    filtered = topics.copy()
-    
-    # Filter by topics added in last X days
-    if 'added_in_last_days' in filters:
-        days_limit = filters['added_in_last_days']
-        filtered = [
-            t for t in filtered 
-            if t.get('date_added') and 
-            days_since(t['date_added'], now) is not None and 
-            days_since(t['date_added'], now) <= days_limit
-        ]
-    
-    # Filter by topics not asked in last X days
-    if 'not_asked_in_last_days' in filters:
-        days_limit = filters['not_asked_in_last_days']
-        filtered = [
-            t for t in filtered 
-            if not t.get('last_seen') or 
-            days_since(t['last_seen'], now) is None or 
-            days_since(t['last_seen'], now) >= days_limit
-        ]
-    
-    # Filter by minimum base score
-    if 'min_base_score' in filters:
-        min_score = filters['min_base_score']
-        filtered = [
-            t for t in filtered 
-            if t.get('base_score', 50) >= min_score
-        ]
-    
-    # Filter by categories
-    if 'categories' in filters and filters['categories']:
-        categories = [cat.lower() for cat in filters['categories']]
-        filtered = [
-            t for t in filtered 
-            if t.get('category', '').lower() in categories
-        ]
-    
-    return filtered
+    return apply_filters(topics, filters)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,91 @@
+"""Topic filtering shared by recommendations and the topic listing.
+
+A filter dict may contain:
+- added_in_last_days: int - only topics added in the last X (whole) days
+- not_asked_in_last_days: int - only topics not asked in the last X days (never-asked topics match)
+- min_base_score: number - only topics with base_score >= X
+- categories: List[str] - only topics from these categories (case-insensitive)
+
+compile_filter turns the dict into a single predicate evaluated once per
+topic. For a TopicCollection, apply_filters first narrows the candidates with
+the collection's FilterIndex (category sets and bisected date ranges), so the
+cost follows the size of the matched set rather than the whole library.
+"""
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from topic_index import TopicCollection
+
+
+def _active(filters: Optional[Dict]) -> Dict:
+    """Drop unset entries so an empty filter dict means "no filtering" """
+    return {key: value for key, value in (filters or {}).items() if value not in (None, [], '')}
+
+
+def _added_cutoff(days: int, now: datetime) -> datetime:
+    # (now - date_added).days <= days  <=>  date_added > now - (days + 1)
+    return now - timedelta(days=days + 1)
+
+
+def _seen_cutoff(days: int, now: datetime) -> datetime:
+    # (now - last_seen).days >= days  <=>  last_seen <= now - days
+    return now - timedelta(days=days)
+
+
+def compile_filter(filters: Optional[Dict], now: Optional[datetime] = None) -> Callable[[dict], bool]:
+    """Return a predicate that checks every active filter in one call per topic"""
+    filters = _active(filters)
+    now = now or datetime.now()
+    checks = []
+
+    if 'added_in_last_days' in filters:
+        added_cutoff = _added_cutoff(filters['added_in_last_days'], now)
+        checks.append(lambda t: t.get('date_added') is not None and t['date_added'] > added_cutoff)
+
+    if 'not_asked_in_last_days' in filters:
+        seen_cutoff = _seen_cutoff(filters['not_asked_in_last_days'], now)
+        checks.append(lambda t: not t.get('last_seen') or t['last_seen'] <= seen_cutoff)
+
+    if 'min_base_score' in filters:
+        min_score = filters['min_base_score']
+        checks.append(lambda t: t.get('base_score', 50) >= min_score)
+
+    if 'categories' in filters:
+        categories = {category.casefold() for category in filters['categories']}
+        checks.append(lambda t: (t.get('category') or '').casefold() in categories)
+
+    return lambda topic: all(check(topic) for check in checks)
+
+
+def _indexed_candidates(topics: TopicCollection, filters: Dict, now: datetime) -> Optional[List[str]]:
+    """Return the smallest candidate id list the filter index can produce, or None if no filter is indexable"""
+    index = topics.filter_index
+    candidates = []
+    if 'categories' in filters:
+        candidates.append(index.category_ids(filters['categories']))
+    if 'added_in_last_days' in filters:
+        candidates.append(index.added_after(_added_cutoff(filters['added_in_last_days'], now)))
+    if 'not_asked_in_last_days' in filters:
+        candidates.append(index.not_seen_since(_seen_cutoff(filters['not_asked_in_last_days'], now)))
+    if not candidates:
+        return None
+    return min(candidates, key=len)
+
+
+def apply_filters(topics: List[dict], filters: Optional[Dict], now: Optional[datetime] = None) -> List[dict]:
+    """Return the topics matching filters, in their original order"""
+    filters = _active(filters)
+    if not filters:
+        return list(topics)
+    now = now or datetime.now()
+    predicate = compile_filter(filters, now)
+
+    candidate_ids = _indexed_candidates(topics, filters, now) if isinstance(topics, TopicCollection) else None
+    if candidate_ids is None:
+        return [topic for topic in topics if predicate(topic)]
+
+    # Verify the remaining filters on the narrowed set only, then restore library order
+    matched = [topics.get(topic_id) for topic_id in candidate_ids]
+    matched = [topic for topic in matched if topic is not None and predicate(topic)]
+    matched.sort(key=lambda topic: topics.position_of[topic['topic_id']])
+    return matched
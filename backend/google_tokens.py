@@ -0,0 +1,172 @@
+"""Local verification of Google ID tokens.
+
+Google signs ID tokens with RS256 keys published as a JWKS document. The
+keys are fetched once, cached for as long as the response's Cache-Control
+max-age allows and refreshed in the background before they expire, so
+verifying a sign-in is a signature check plus claim checks with no network
+round trip. Key sources are pluggable: StaticKeySource takes a fixed set of
+public keys, e.g. a locally generated key pair in tests.
+"""
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+import jwt
+import requests
+
+GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
+GOOGLE_CERTS_URL = os.getenv('GOOGLE_CERTS_URL', 'https://www.googleapis.com/oauth2/v3/certs')
+GOOGLE_CERTS_TIMEOUT = float(os.getenv('GOOGLE_CERTS_TIMEOUT', 5))
+# Clock skew tolerated on exp/iat/nbf
+GOOGLE_TOKEN_LEEWAY = int(os.getenv('GOOGLE_TOKEN_LEEWAY', 60))
+
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+
+# Used when the certs response has no usable max-age
+DEFAULT_KEYS_MAX_AGE = 3600
+# Refresh this long before the cached keys expire
+REFRESH_MARGIN_SECONDS = 300
+# Fetches are at least this far apart, including retries after a failure and fetches for unknown key ids
+MIN_FETCH_INTERVAL_SECONDS = 60
+
+
+class KeySource:
+    """Maps a key id (the token header's kid) to a public key"""
+
+    def get_key(self, kid: str) -> Optional[Any]:
+        raise NotImplementedError
+
+
+class StaticKeySource(KeySource):
+    """Fixed keys by kid, given as public key objects or PEM strings"""
+
+    def __init__(self, keys: Dict[str, Any]):
+        self.keys = dict(keys)
+
+    def get_key(self, kid: str) -> Optional[Any]:
+        return self.keys.get(kid)
+
+
+def cache_max_age(headers) -> int:
+    """Seconds the response may be cached, from Cache-Control max-age minus Age"""
+    match = re.search(r'max-age=(\d+)', headers.get('Cache-Control', ''))
+    if not match:
+        return DEFAULT_KEYS_MAX_AGE
+    age = headers.get('Age', '0')
+    return max(0, int(match.group(1)) - (int(age) if age.isdigit() else 0))
+
+
+class JWKSKeySource(KeySource):
+    """Public keys from a JWKS URL, cached per the response's cache headers.
+
+    The first lookup fetches the keys; afterwards a daemon thread refreshes
+    them shortly before they expire. When a refresh fails the previous keys
+    stay in use and the fetch is retried. A kid that isn't cached (Google
+    rotated its keys early) triggers a fetch, at most once per
+    MIN_FETCH_INTERVAL_SECONDS.
+    """
+
+    def __init__(self, url: str = GOOGLE_CERTS_URL, timeout: float = GOOGLE_CERTS_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._keys: Dict[str, Any] = {}
+        self._expires_at = 0.0
+        self._last_fetch: Optional[float] = None
+        self._refresher: Optional[threading.Thread] = None
+
+    def _fetch(self) -> bool:
+        """Fetch and install the key set; returns whether it succeeded"""
+        with self._lock:
+            self._last_fetch = time.monotonic()
+        try:
+            response = requests.get(self.url, timeout=self.timeout)
+            response.raise_for_status()
+            keys = {}
+            for jwk in response.json().get('keys', []):
+                if jwk.get('kty') != 'RSA' or 'kid' not in jwk:
+                    continue
+                keys[jwk['kid']] = jwt.algorithms.RSAAlgorithm.from_jwk(json.dumps(jwk))
+            if not keys:
+                raise ValueError('no RSA keys in the key set')
+            max_age = cache_max_age(response.headers)
+        except Exception as e:
+            print(f"Error fetching Google signing keys: {str(e)}")
+            return False
+        with self._lock:
+            self._keys = keys
+            self._expires_at = time.monotonic() + max_age
+        return True
+
+    def _refresh_loop(self):
+        while True:
+            with self._lock:
+                # Short max-ages still get at most one refresh per MIN_FETCH_INTERVAL_SECONDS
+                refresh_at = max(self._expires_at - REFRESH_MARGIN_SECONDS,
+                                 (self._last_fetch or 0.0) + MIN_FETCH_INTERVAL_SECONDS)
+            delay = refresh_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+                continue
+            self._fetch()
+
+    def _start_refresher(self):
+        with self._lock:
+            if self._refresher is not None:
+                return
+            self._refresher = threading.Thread(target=self._refresh_loop, name='google-keys-refresh', daemon=True)
+        self._refresher.start()
+
+    def get_key(self, kid: str) -> Optional[Any]:
+        with self._lock:
+            key = self._keys.get(kid)
+            # Unknown kid: refetch unless we just did, so forged kids can't make us hammer the endpoint
+            fetch = key is None and (
+                self._last_fetch is None or time.monotonic() - self._last_fetch >= MIN_FETCH_INTERVAL_SECONDS
+            )
+        if fetch and self._fetch():
+            with self._lock:
+                key = self._keys.get(kid)
+        self._start_refresher()
+        return key
+
+
+class GoogleTokenVerifier:
+    """Verifies Google ID tokens locally: RS256 signature, audience, issuer and expiry"""
+
+    def __init__(self, client_id: Optional[str] = GOOGLE_CLIENT_ID, key_source: Optional[KeySource] = None,
+                 issuers: Iterable[str] = GOOGLE_ISSUERS, leeway: int = GOOGLE_TOKEN_LEEWAY):
+        self.client_id = client_id
+        self.key_source = key_source or JWKSKeySource()
+        self.issuers = tuple(issuers)
+        self.leeway = leeway
+
+    def verify(self, token: str) -> Optional[Dict]:
+        """Return the token's claims, or None if it isn't a valid ID token for this client"""
+        if not self.client_id:
+            print("Token verification error: GOOGLE_CLIENT_ID is not set")
+            return None
+        try:
+            header = jwt.get_unverified_header(token)
+            if header.get('alg') != 'RS256':
+                return None
+            key = self.key_source.get_key(header.get('kid', ''))
+            if key is None:
+                return None
+            claims = jwt.decode(
+                token, key, algorithms=['RS256'], audience=self.client_id, leeway=self.leeway,
+                options={'require': ['exp', 'iat', 'iss', 'aud', 'sub']}
+            )
+        except jwt.InvalidTokenError as e:
+            print(f"Token verification error: {e}")
+            return None
+        if claims.get('iss') not in self.issuers:
+            return None
+        return claims
+
+
+# Global verifier used by AuthManager.verify_google_token
+google_token_verifier = GoogleTokenVerifier()
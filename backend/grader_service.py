@@ -0,0 +1,31 @@
+"""Code grader service: gunicorn -c gunicorn.conf.py grader_service:app
+
+Runs CodeGrader (the bubblewrap sandbox) in its own container, which is the
+only one given the permissions bubblewrap needs (see docker-compose.yml).
+The backend sends code here when CODE_GRADER_URL is set. The service holds
+no secrets or user data and is only reachable on the internal network.
+"""
+from flask import Flask, request, jsonify
+
+from code_grader import CodeGrader, code_grader
+
+app = Flask(__name__)
+# Always grade here, even if CODE_GRADER_URL is set in this container's environment
+grader = code_grader if isinstance(code_grader, CodeGrader) else CodeGrader()
+
+
+@app.route('/health', methods=['GET'])
+def health():
+    """Whether code can be graded here: a compiler and a working sandbox"""
+    return jsonify({'available': grader.available, **grader.stats()})
+
+
+@app.route('/grade', methods=['POST'])
+def grade():
+    """Grade code against the question's example; grade is null when the sandbox is unavailable"""
+    data = request.get_json(silent=True) or {}
+    question = data.get('question')
+    code = data.get('code')
+    if not isinstance(question, str) or not isinstance(code, str) or not question or not code:
+        return jsonify({'error': 'Question and code are required'}), 400
+    return jsonify({'grade': grader.grade(question, code)})
@@ -0,0 +1,25 @@
+"""Gunicorn settings for production
+
+The Docker image runs gunicorn -c gunicorn.conf.py -k uvicorn_worker.UvicornWorker asgi:application:
+several worker processes, each an event loop with a pool of threads for the
+Flask routes (ASGI_WSGI_THREADS). gunicorn -c gunicorn.conf.py app:app
+serves the plain Flask app with the gthread workers below instead. User documents are
+guarded by per-user file locks in storage.py, so workers can share the data
+directory. The app is deliberately not preloaded: each worker imports it
+itself and starts its own background threads (question bank refill, LLM
+dispatcher, signing key refresh), which would not survive a fork.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+workers = int(os.getenv('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+worker_class = 'gthread'
+# Threads per gthread worker; uvicorn workers ignore this
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+# Assessment generation and code review wait on the LLM API for a long time
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+accesslog = '-'
+errorlog = '-'
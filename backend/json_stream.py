@@ -0,0 +1,79 @@
+import codecs
+import json
+from typing import IO, Iterator
+
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_ndjson(stream: IO[bytes]) -> Iterator:
+    """Yield one parsed value per non-empty line of a newline-delimited JSON byte stream"""
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON on line {line_no}: {e}")
+
+
+def iter_json_array(stream: IO[bytes], chunk_size: int = CHUNK_SIZE) -> Iterator:
+    """Yield the elements of a top-level JSON array without reading the whole body into memory"""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buffer, pos, eof
+        if eof:
+            return False
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            eof = True
+            buffer = buffer[pos:] + utf8.decode(b'', final=True)
+        else:
+            buffer = buffer[pos:] + utf8.decode(chunk)
+        pos = 0
+        return True
+
+    def next_char() -> str:
+        """Skip whitespace and return the next significant character ('' at end of input)"""
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if not fill():
+                return ''
+
+    if next_char() != '[':
+        raise ValueError("Expected a JSON array")
+    pos += 1
+    if next_char() == ']':
+        return
+
+    while True:
+        next_char()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                # A value that runs to the end of the buffer (e.g. a number) may be truncated
+                if end < len(buffer) or eof:
+                    break
+            except ValueError:
+                if eof:
+                    raise ValueError(f"Invalid JSON array element near offset {pos}")
+            if not fill():
+                raise ValueError("Unexpected end of JSON array")
+        pos = end
+        yield value
+
+        separator = next_char()
+        pos += 1
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError("Expected ',' or ']' in JSON array")
@@ -0,0 +1,115 @@
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Connection pool and timeout configuration for calls to the LLM API
+LLM_POOL_SIZE = int(os.getenv('LLM_POOL_SIZE', 10))
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', 5))
+LLM_READ_TIMEOUT = float(os.getenv('LLM_READ_TIMEOUT', 60))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 2))
+LLM_RETRY_BACKOFF = float(os.getenv('LLM_RETRY_BACKOFF', 0.5))
+LLM_RETRY_BACKOFF_MAX = float(os.getenv('LLM_RETRY_BACKOFF_MAX', 8))
+
+# Responses worth retrying: rate limiting and transient upstream failures
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class LLMAPIError(Exception):
+    """Raised when the LLM API answers with an error status or an unusable body"""
+
+
+class LLMClient:
+    """Shared keep-alive HTTP client for the LLM API.
+
+    One requests.Session with a bounded connection pool is reused by every
+    call, so repeated questions skip the TCP/TLS handshake. Every request has
+    connect/read timeouts, and 429/5xx responses or connection errors are
+    retried with full-jitter exponential backoff (Retry-After is honoured).
+    Read timeouts are not retried: the API may still be working on the
+    request, and a retry would pay for it twice and wait read_timeout again.
+    """
+
+    def __init__(self, pool_size: int = LLM_POOL_SIZE,
+                 connect_timeout: float = LLM_CONNECT_TIMEOUT, read_timeout: float = LLM_READ_TIMEOUT,
+                 max_retries: int = LLM_MAX_RETRIES, backoff: float = LLM_RETRY_BACKOFF,
+                 backoff_max: float = LLM_RETRY_BACKOFF_MAX):
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max(0, max_retries)
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.session = requests.Session()
+        # pool_block keeps at most pool_size sockets per host even under bursts
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+
+    def _retry_delay(self, attempt: int, response: Optional[requests.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt)))
+
+    def post(self, url: str, json: Dict, headers: Optional[Dict] = None) -> requests.Response:
+        """POST json to url, retrying transient failures; raises the last error if every attempt fails"""
+        attempt = 0
+        while True:
+            with self._lock:
+                self.requests += 1
+            response = None
+            try:
+                response = self.session.post(url, json=json, headers=headers, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    return response
+                if attempt >= self.max_retries:
+                    with self._lock:
+                        self.failures += 1
+                    return response
+            except requests.ReadTimeout:
+                with self._lock:
+                    self.failures += 1
+                raise
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    with self._lock:
+                        self.failures += 1
+                    raise
+            with self._lock:
+                self.retries += 1
+            time.sleep(self._retry_delay(attempt, response))
+            attempt += 1
+
+    def stats(self) -> Dict:
+        """Request, retry and connection reuse counters"""
+        pools = self.adapter.poolmanager.pools
+        connections = 0
+        pooled_requests = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+                pooled_requests += pool.num_requests
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'retries': self.retries,
+                'failures': self.failures,
+                'connections_opened': connections,
+                'connections_reused': max(0, pooled_requests - connections),
+                'pool_size': self.pool_size,
+                'timeout': {'connect': self.timeout[0], 'read': self.timeout[1]}
+            }
+
+
+# Global client instance
+llm_client = LLMClient()
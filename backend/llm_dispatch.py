@@ -0,0 +1,236 @@
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, Optional
+
+# Global budget for calls to the LLM API; 0 disables a limit
+LLM_RATE_LIMIT_RPS = float(os.getenv('LLM_RATE_LIMIT_RPS', 10))
+LLM_TOKENS_PER_MINUTE = float(os.getenv('LLM_TOKENS_PER_MINUTE', 600000))
+# Calls allowed to wait for budget before new ones are rejected
+LLM_QUEUE_LIMIT = int(os.getenv('LLM_QUEUE_LIMIT', 100))
+# Calls executed at once once they have budget
+LLM_DISPATCH_WORKERS = int(os.getenv('LLM_DISPATCH_WORKERS', 10))
+
+# Lower numbers are dispatched first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+# Rough prompt size estimate used for the token budget
+CHARS_PER_TOKEN = 4
+
+
+class LLMOverloadedError(Exception):
+    """Raised when the dispatch queue is full and a call is shed"""
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` per second up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay_for(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available (0 when they already are)"""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        if self.rate > 0:
+            self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        if self.rate > 0:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class _Flight:
+    """One in-flight call and everyone waiting for its result"""
+
+    def __init__(self, cost: float):
+        self.cost = cost
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class _Reservation:
+    """A queued call made outside the dispatcher (async_llm.py); granted() is called once it has budget"""
+
+    def __init__(self, cost: float, granted: Callable[[], None]):
+        self.cost = cost
+        self.granted = granted
+
+
+class LLMDispatcher:
+    """Dispatch layer in front of the LLM API call.
+
+    Identical in-flight calls (same prompt and temperature) are coalesced so
+    only one request goes upstream and every caller gets its result. Calls
+    wait in a priority queue until the global requests-per-second and
+    tokens-per-minute budgets allow them, so interactive work runs before
+    background refills. When the queue is full new calls are rejected with
+    LLMOverloadedError; background calls are shed once it is half full.
+    Async calls (async_llm.py) wait in the same queue through reserve().
+    """
+
+    def __init__(self, call: Callable[[str, float], str], max_tokens: int,
+                 rps: float = LLM_RATE_LIMIT_RPS, tokens_per_minute: float = LLM_TOKENS_PER_MINUTE,
+                 max_queue: int = LLM_QUEUE_LIMIT, workers: int = LLM_DISPATCH_WORKERS):
+        self.call = call
+        self.max_tokens = max_tokens
+        self.max_queue = max_queue
+        self.request_bucket = TokenBucket(rps, rps)
+        self.token_bucket = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='llm-dispatch')
+        self._cond = threading.Condition()
+        self._queue = []
+        self._sequence = itertools.count()
+        self._inflight: Dict[Hashable, _Flight] = {}
+        self._thread: Optional[threading.Thread] = None
+        self.dispatched = 0
+        self.coalesced = 0
+        self.shed = 0
+
+    def estimate_tokens(self, prompt: str) -> int:
+        return math.ceil(len(prompt) / CHARS_PER_TOKEN) + self.max_tokens
+
+    def accepting(self, priority: int = PRIORITY_INTERACTIVE) -> bool:
+        """Whether a new call at this priority would be queued rather than shed"""
+        with self._cond:
+            return len(self._queue) < self._queue_limit(priority)
+
+    def _queue_limit(self, priority: int) -> int:
+        return self.max_queue if priority <= PRIORITY_INTERACTIVE else self.max_queue // 2
+
+    def submit(self, prompt: str, temperature: float = 0.7, priority: int = PRIORITY_INTERACTIVE) -> str:
+        """Run the call through the queue and budgets and return its result"""
+        key = (prompt, temperature)
+        with self._cond:
+            flight = self._inflight.get(key)
+            if flight is not None:
+                self.coalesced += 1
+            else:
+                if len(self._queue) >= self._queue_limit(priority):
+                    self.shed += 1
+                    raise LLMOverloadedError("Question generation is busy right now, please try again shortly")
+                flight = _Flight(self.estimate_tokens(prompt))
+                self._inflight[key] = flight
+                heapq.heappush(self._queue, (priority, next(self._sequence), key, flight))
+                self._start()
+                self._cond.notify()
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._dispatch_loop, name='llm-dispatcher', daemon=True)
+            self._thread.start()
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                # Re-check the head after every wait so newly queued urgent calls jump ahead
+                _, _, key, flight = self._queue[0]
+                delay = max(self.request_bucket.delay_for(1), self.token_bucket.delay_for(flight.cost))
+                if delay > 0:
+                    self._cond.wait(timeout=delay)
+                    continue
+                heapq.heappop(self._queue)
+                self.request_bucket.consume(1)
+                self.token_bucket.consume(flight.cost)
+                self.dispatched += 1
+            if isinstance(flight, _Reservation):
+                flight.granted()
+                continue
+            try:
+                self._executor.submit(self._run, key, flight)
+            except RuntimeError as e:
+                # Interpreter shutdown: release the waiters instead of leaving them blocked
+                flight.error = e
+                with self._cond:
+                    self._inflight.pop(key, None)
+                flight.done.set()
+
+    def _run(self, key: Hashable, flight: _Flight):
+        prompt, temperature = key
+        try:
+            flight.result = self.call(prompt, temperature)
+        except BaseException as e:
+            flight.error = e
+        finally:
+            with self._cond:
+                self._inflight.pop(key, None)
+                self._refund_unused(flight.result)
+            flight.done.set()
+
+    def _refund_unused(self, result):
+        """Give back the part of the completion estimate that wasn't used; callers hold the lock"""
+        if isinstance(result, str):
+            unused = self.max_tokens - math.ceil(len(result) / CHARS_PER_TOKEN)
+            if unused > 0:
+                self.token_bucket.refund(unused)
+
+    # ---- calls made outside the executor (the asyncio dispatcher in async_llm.py) ----
+
+    def reserve(self, cost: float, granted: Callable[[], None], priority: int = PRIORITY_INTERACTIVE) -> _Reservation:
+        """Queue a call by priority like submit(); granted() runs on the dispatcher thread once it has budget
+
+        Raises LLMOverloadedError when the call would be shed. The caller makes
+        the call itself and settles its estimate with release().
+        """
+        with self._cond:
+            if len(self._queue) >= self._queue_limit(priority):
+                self.shed += 1
+                raise LLMOverloadedError("Question generation is busy right now, please try again shortly")
+            reservation = _Reservation(cost, granted)
+            heapq.heappush(self._queue, (priority, next(self._sequence), None, reservation))
+            self._start()
+            self._cond.notify()
+        return reservation
+
+    def cancel(self, reservation: _Reservation):
+        """Drop a reservation that is still queued; one already granted has used its budget"""
+        with self._cond:
+            queued = [entry for entry in self._queue if entry[3] is not reservation]
+            if len(queued) != len(self._queue):
+                self._queue = queued
+                heapq.heapify(self._queue)
+                self._cond.notify()
+
+    def release(self, result):
+        """Settle a reserved call's token estimate once its result is known"""
+        with self._cond:
+            self._refund_unused(result)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                'queued': len(self._queue),
+                'in_flight': len(self._inflight) - sum(1 for entry in self._queue if isinstance(entry[3], _Flight)),
+                'queue_limit': self.max_queue,
+                'dispatched': self.dispatched,
+                'coalesced': self.coalesced,
+                'shed': self.shed,
+                'rate_limit_rps': self.request_bucket.rate,
+                'tokens_per_minute': self.token_bucket.rate * 60
+            }
@@ -0,0 +1,80 @@
+"""Priority weights and spaced-repetition helpers shared by engine, scoring and sampling.
+
+A leaf module: it imports nothing from the rest of the backend, so the
+modules that score and pick topics can all import it at top level.
+"""
+import math
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+# --------------------------- Configuration (final, tuned weights) ---------------------------
+# These weights were chosen to prioritise: (1) struggle (user failing), (2) due/spacing, (3) inherent difficulty,
+# (4) novelty for new topics.
+W_STRUGGLE = 0.40      # most important: user struggling => repeat sooner
+W_DUE = 0.30           # spaced repetition / time-since-last-seen
+W_BASE = 0.15          # original difficulty (user-provided initial estimate)
+W_NOVELTY = 0.15       # small boost to recently-added topics
+
+# Diversity penalty: when a topic from a category is picked, reduce the priority of other topics in same category
+DIVERSITY_PENALTY = 0.70
+
+# New topic window (days) for novelty boost
+NEW_TOPIC_WINDOW_DAYS = 14
+
+# Base spacing interval (days)
+BASE_INTERVAL_DAYS = 3.0
+
+
+# --------------------------- Due-score helpers --------------------------------------------
+def calculate_due_score(topic: Dict) -> float:
+    """Calculate due score based on spaced repetition"""
+    last_seen = topic.get('last_seen')
+    
+    if not last_seen:
+        return 1.0  # High priority for never-seen topics
+    
+    days_since_last_seen = (datetime.now() - last_seen).days
+    
+    # Calculate target interval based on success rate
+    attempts = topic.get('attempts', 0)
+    successes = topic.get('successes', 0)
+    success_rate = successes / attempts if attempts > 0 else 0
+    
+    # More successful topics can wait longer
+    interval_multiplier = max(1, success_rate * 3)
+    target_interval = BASE_INTERVAL_DAYS * interval_multiplier
+    
+    if days_since_last_seen >= target_interval:
+        # Topic is due or overdue
+        return min(days_since_last_seen / target_interval, 1.0)
+    else:
+        # Topic is not yet due
+        return (days_since_last_seen / target_interval) * 0.3
+
+def next_due_at(topic: Dict) -> datetime:
+    """Return when calculate_due_score starts treating the topic as due.
+    
+    Never-seen topics are due from the moment they are added. Otherwise the
+    topic becomes due once the whole days since last_seen reach the
+    success-scaled target interval.
+    """
+    last_seen = topic.get('last_seen')
+    if not last_seen:
+        return topic.get('date_added') or datetime.now()
+    
+    attempts = topic.get('attempts', 0)
+    successes = topic.get('successes', 0)
+    success_rate = successes / attempts if attempts > 0 else 0
+    target_interval = BASE_INTERVAL_DAYS * max(1, success_rate * 3)
+    return last_seen + timedelta(days=math.ceil(target_interval))
+
+
+def days_since(dt: Optional[datetime], now: datetime) -> Optional[float]:
+    if dt is None:
+        return None
+    return max(0.0, (now - dt).total_seconds() / 86400.0)
+
+
+def laplace_success_rate(successes: int, attempts: int, alpha: float = 1.0, beta: float = 1.0) -> float:
+    """Return smoothed success rate using Laplace smoothing to handle zero attempts."""
+    return (successes + alpha) / (attempts + alpha + beta)
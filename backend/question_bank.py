@@ -0,0 +1,450 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+from question_parser import parse_question
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; every process then refills on its own
+    fcntl = None
+
+# Fresh questions kept per (topic, category, type, difficulty bucket); 0 disables the bank
+QUESTION_BANK_DEPTH = int(os.getenv('QUESTION_BANK_DEPTH', 3))
+QUESTION_BANK_MAX_KEYS = int(os.getenv('QUESTION_BANK_MAX_KEYS', 2000))
+QUESTION_BANK_TTL_DAYS = float(os.getenv('QUESTION_BANK_TTL_DAYS', 30))
+QUESTION_BANK_PATH = os.getenv('QUESTION_BANK_PATH', os.path.join('data', 'question_bank.db'))
+
+# Difficulty (0.0-1.0) is bucketed so nearby base scores share questions
+DIFFICULTY_BUCKETS = 5
+# Questions kept per key, counting ones already served to some users
+MAX_QUESTIONS_PER_KEY_FACTOR = 4
+# Seconds the refill worker sleeps when the queue is empty (it is woken early by local requests)
+REFILL_POLL_SECONDS = 2
+# Seconds between attempts of a non-owner process to take over the refill worker
+REFILL_OWNER_RETRY_SECONDS = 30
+
+
+def difficulty_bucket(difficulty: float) -> int:
+    return min(DIFFICULTY_BUCKETS - 1, max(0, int(difficulty * DIFFICULTY_BUCKETS)))
+
+
+def bucket_difficulty(bucket: int) -> float:
+    """Representative difficulty used when pre-generating for a bucket"""
+    return (bucket + 0.5) / DIFFICULTY_BUCKETS
+
+
+class QuestionBank:
+    """Persistent bank of generated questions shared between users and worker processes.
+
+    Questions are keyed by (topic name, category, question type, difficulty
+    bucket). take() serves a question the user has not seen before. Keys in
+    demand, requested more than once or by more than one user, are queued for
+    a background refill that keeps QUESTION_BANK_DEPTH fresh questions per
+    key; one-off keys are not pre-generated. Questions expire after the TTL;
+    when the bank holds more than max_keys keys the least recently used key
+    is evicted. Only questions that parse are banked, and they are stored
+    with their parsed form.
+
+    The bank lives in one SQLite database (WAL mode), so every worker process
+    serves from the same questions and served-to records, and each change is
+    committed as it happens. The refill queue is a table too; only the process
+    holding the refill lock file generates, and another takes over if it exits.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS bank_keys (
+            key TEXT PRIMARY KEY,
+            topic_name TEXT NOT NULL,
+            category TEXT NOT NULL,
+            question_type TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            last_used REAL NOT NULL,
+            requests INTEGER NOT NULL DEFAULT 0,
+            first_user TEXT,
+            shared INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_bank_keys_last_used ON bank_keys (last_used);
+        CREATE TABLE IF NOT EXISTS questions (
+            id TEXT PRIMARY KEY,
+            key TEXT NOT NULL,
+            text TEXT NOT NULL,
+            text_hash TEXT NOT NULL,
+            parsed TEXT,
+            created_at REAL NOT NULL,
+            served INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (key, text_hash)
+        );
+        CREATE INDEX IF NOT EXISTS idx_questions_key ON questions (key);
+        CREATE TABLE IF NOT EXISTS served (
+            user_id TEXT NOT NULL,
+            question_id TEXT NOT NULL,
+            PRIMARY KEY (user_id, question_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_served_question ON served (question_id);
+        CREATE TABLE IF NOT EXISTS refill_queue (
+            key TEXT PRIMARY KEY,
+            queued_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: str = QUESTION_BANK_PATH, depth: int = QUESTION_BANK_DEPTH,
+                 max_keys: int = QUESTION_BANK_MAX_KEYS, ttl_days: float = QUESTION_BANK_TTL_DAYS):
+        self.path = path
+        self.depth = depth
+        self.max_keys = max_keys
+        self.ttl_seconds = ttl_days * 86400
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._owner_lock_file = None
+        self._generate: Optional[Callable[[str, str, str, float], str]] = None
+        self._worker: Optional[threading.Thread] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generated = 0
+        self._initialized = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.depth > 0
+
+    @staticmethod
+    def make_key(topic_name: str, category: str, question_type: str, difficulty: float) -> Tuple[str, Dict]:
+        bucket = difficulty_bucket(difficulty)
+        key = '|'.join([topic_name.strip().casefold(), category.strip().casefold(), question_type, str(bucket)])
+        return key, {'topic_name': topic_name, 'category': category, 'question_type': question_type, 'bucket': bucket}
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    # ---- database ----
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it (and creating the database) on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            # Autocommit mode: transactions are opened explicitly by _transaction()
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                if not self._initialized:
+                    self._init_db(conn)
+                    self._initialized = True
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction that takes the database write lock up front, so read-then-update is atomic"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _init_db(self, conn: sqlite3.Connection):
+        """Create the tables and drop expired questions; _connect calls this once, holding self._lock"""
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self.SCHEMA)
+        try:
+            with self._transaction() as conn:
+                self._migrate(conn)
+                self._import_legacy(conn)
+                self._expire(conn, time.time())
+        except Exception as e:
+            print(f"Error loading question bank: {str(e)}")
+
+    def _migrate(self, conn: sqlite3.Connection):
+        """Add text_hash to banks created before questions were deduplicated, dropping duplicates"""
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(questions)")]
+        if 'text_hash' in columns:
+            return
+        conn.execute("ALTER TABLE questions ADD COLUMN text_hash TEXT NOT NULL DEFAULT ''")
+        conn.executemany("UPDATE questions SET text_hash = ? WHERE id = ?", [
+            (self.text_hash(text), question_id) for question_id, text in conn.execute("SELECT id, text FROM questions")
+        ])
+        # Keep the oldest copy of each question
+        self._delete_questions(conn, "rowid NOT IN (SELECT MIN(rowid) FROM questions GROUP BY key, text_hash)", ())
+        conn.execute("CREATE UNIQUE INDEX idx_questions_text_hash ON questions (key, text_hash)")
+
+    def _import_legacy(self, conn: sqlite3.Connection):
+        """Import the JSON file earlier versions saved next to the database, once, into an empty bank"""
+        legacy_path = os.path.splitext(self.path)[0] + '.json'
+        if legacy_path == self.path or not os.path.exists(legacy_path):
+            return
+        if conn.execute("SELECT 1 FROM bank_keys LIMIT 1").fetchone() is not None:
+            return
+        with open(legacy_path, 'r') as f:
+            data = json.load(f)
+        now = time.time()
+        for key, entry in data.get('entries', {}).items():
+            conn.execute(
+                "INSERT OR IGNORE INTO bank_keys (key, topic_name, category, question_type, bucket, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, entry['topic_name'], entry['category'], entry['question_type'], entry['bucket'], now)
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO questions (id, key, text, text_hash, parsed, created_at, served) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(q['id'], key, q['text'], self.text_hash(q['text']),
+                  json.dumps(q['parsed']) if q.get('parsed') else None, q['created_at'], q['served'])
+                 for q in entry['questions']]
+            )
+        conn.executemany(
+            "INSERT OR IGNORE INTO served (user_id, question_id) VALUES (?, ?)",
+            [(user_id, question_id) for user_id, ids in data.get('served', {}).items() for question_id in ids]
+        )
+
+    # ---- eviction (inside a transaction) ----
+
+    @staticmethod
+    def _delete_questions(conn: sqlite3.Connection, where: str, params: tuple):
+        conn.execute(f"DELETE FROM served WHERE question_id IN (SELECT id FROM questions WHERE {where})", params)
+        conn.execute(f"DELETE FROM questions WHERE {where}", params)
+
+    def _expire(self, conn: sqlite3.Connection, now: float, key: Optional[str] = None):
+        cutoff = now - self.ttl_seconds
+        if key is None:
+            self._delete_questions(conn, "created_at < ?", (cutoff,))
+        else:
+            self._delete_questions(conn, "key = ? AND created_at < ?", (key, cutoff))
+
+    def _evict_lru(self, conn: sqlite3.Connection):
+        excess = conn.execute("SELECT COUNT(*) FROM bank_keys").fetchone()[0] - self.max_keys
+        if excess <= 0:
+            return
+        keys = [row[0] for row in conn.execute(
+            "SELECT key FROM bank_keys ORDER BY last_used LIMIT ?", (excess,)
+        )]
+        for key in keys:
+            self._delete_questions(conn, "key = ?", (key,))
+            conn.execute("DELETE FROM bank_keys WHERE key = ?", (key,))
+            conn.execute("DELETE FROM refill_queue WHERE key = ?", (key,))
+        with self._lock:
+            self.evictions += len(keys)
+
+    def _touch_key(self, conn: sqlite3.Connection, key: str, meta: Dict, now: float):
+        conn.execute(
+            "INSERT INTO bank_keys (key, topic_name, category, question_type, bucket, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET last_used = excluded.last_used",
+            (key, meta['topic_name'], meta['category'], meta['question_type'], meta['bucket'], now)
+        )
+
+    @staticmethod
+    def _parsed(question_type: str, row: tuple) -> Optional[Dict]:
+        question_id, text, parsed = row
+        # Questions imported from before they were stored parsed are parsed on first use
+        return json.loads(parsed) if parsed else parse_question(question_type, text)
+
+    # ---- serving ----
+
+    def take(self, user_id: str, topic_name: str, category: str, question_type: str,
+             difficulty: float) -> Optional[Tuple[str, Dict]]:
+        """Return (text, parsed question) for a banked question this user has not been served, or None on a miss"""
+        if not self.enabled:
+            return None
+        key, meta = self.make_key(topic_name, category, question_type, difficulty)
+        now = time.time()
+        with self._transaction() as conn:
+            self._expire(conn, now, key)
+            self._touch_key(conn, key, meta, now)
+            # Demand: how often the key was asked for, and whether more than one user wants it
+            conn.execute(
+                "UPDATE bank_keys SET requests = requests + 1, first_user = COALESCE(first_user, ?), "
+                "shared = shared OR (first_user IS NOT NULL AND first_user != ?) WHERE key = ?",
+                (user_id, user_id, key)
+            )
+            row = conn.execute(
+                "SELECT id, text, parsed FROM questions WHERE key = ? AND id NOT IN "
+                "(SELECT question_id FROM served WHERE user_id = ?) ORDER BY served, created_at LIMIT 1",
+                (key, user_id)
+            ).fetchone()
+            question = None
+            if row is not None:
+                question = (row[1], self._parsed(question_type, row))
+                conn.execute("INSERT OR IGNORE INTO served (user_id, question_id) VALUES (?, ?)", (user_id, row[0]))
+                conn.execute("UPDATE questions SET served = served + 1, parsed = ? WHERE id = ?",
+                             (json.dumps(question[1]) if question[1] else None, row[0]))
+            requests, shared = conn.execute(
+                "SELECT requests, shared FROM bank_keys WHERE key = ?", (key,)
+            ).fetchone()
+            if (requests > 1 or shared) and self._generate is not None:
+                conn.execute("INSERT OR IGNORE INTO refill_queue (key, queued_at) VALUES (?, ?)", (key, now))
+            self._evict_lru(conn)
+        with self._lock:
+            if question is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if self._generate is not None:
+            self._wakeup.set()
+        return question
+
+    def any_question(self, topic_name: str, category: str, question_type: str,
+                     difficulty: float) -> Optional[Tuple[str, Dict]]:
+        """Least served question at the key, even one the user has seen; a fallback while generation is down"""
+        if not self.enabled:
+            return None
+        key, _ = self.make_key(topic_name, category, question_type, difficulty)
+        row = self._connect().execute(
+            "SELECT id, text, parsed FROM questions WHERE key = ? ORDER BY served, created_at LIMIT 1", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[1], self._parsed(question_type, row)
+
+    def add(self, topic_name: str, category: str, question_type: str, difficulty: float, text: str,
+            parsed: Optional[Dict] = None, served_to: Optional[str] = None):
+        """Bank a generated question, optionally recording it as already served to a user"""
+        if not self.enabled:
+            return
+        parsed = parsed or parse_question(question_type, text)
+        if parsed is None:
+            return
+        key, meta = self.make_key(topic_name, category, question_type, difficulty)
+        self._add(key, meta, text, parsed, served_to)
+
+    def _add(self, key: str, meta: Dict, text: str, parsed: Dict, served_to: Optional[str] = None):
+        text_hash = self.text_hash(text)
+        now = time.time()
+        with self._transaction() as conn:
+            self._touch_key(conn, key, meta, now)
+            # Coalesced generation hands the same text to every caller; it is banked once
+            conn.execute(
+                "INSERT OR IGNORE INTO questions (id, key, text, text_hash, parsed, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (uuid.uuid4().hex, key, text, text_hash, json.dumps(parsed), now)
+            )
+            if served_to is not None:
+                question_id = conn.execute(
+                    "SELECT id FROM questions WHERE key = ? AND text_hash = ?", (key, text_hash)
+                ).fetchone()[0]
+                if conn.execute("INSERT OR IGNORE INTO served (user_id, question_id) VALUES (?, ?)",
+                                (served_to, question_id)).rowcount:
+                    conn.execute("UPDATE questions SET served = served + 1 WHERE id = ?", (question_id,))
+            # Keep the newest questions per key
+            limit = max(1, self.depth * MAX_QUESTIONS_PER_KEY_FACTOR)
+            self._delete_questions(
+                conn, "key = ? AND id NOT IN (SELECT id FROM questions WHERE key = ? "
+                      "ORDER BY created_at DESC, rowid DESC LIMIT ?)", (key, key, limit)
+            )
+            self._evict_lru(conn)
+
+    def _fresh_count(self, key: str) -> int:
+        """Questions at the key that have not been served to anyone yet"""
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM questions WHERE key = ? AND served = 0", (key,)
+        ).fetchone()[0]
+
+    # ---- background refill ----
+
+    def start_refill(self, generate: Callable[[str, str, str, float], str]):
+        """Start the refill worker; generate(question_type, topic_name, category, difficulty) returns question text
+
+        Every process queues keys in demand, but only the one holding the refill
+        lock generates, so N workers don't refill (and pay for) the same key N times.
+        """
+        if not self.enabled or self._worker is not None:
+            return
+        self._generate = generate
+        self._worker = threading.Thread(target=self._refill_loop, name='question-bank-refill', daemon=True)
+        self._worker.start()
+
+    def _acquire_refill_ownership(self) -> bool:
+        if self._owner_lock_file is not None or fcntl is None:
+            return True
+        self._connect()  # Creates the database directory
+        lock_file = open(f"{self.path}.refill.lock", 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._owner_lock_file = lock_file
+        return True
+
+    def _next_refill(self) -> Optional[Tuple[str, Dict]]:
+        row = self._connect().execute(
+            "SELECT b.key, b.topic_name, b.category, b.question_type, b.bucket FROM refill_queue q "
+            "JOIN bank_keys b ON b.key = q.key ORDER BY q.queued_at LIMIT 1"
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], {'topic_name': row[1], 'category': row[2], 'question_type': row[3], 'bucket': row[4]}
+
+    def _refill_loop(self):
+        while not self._acquire_refill_ownership():
+            time.sleep(REFILL_OWNER_RETRY_SECONDS)
+        while True:
+            try:
+                job = self._next_refill()
+            except sqlite3.Error as e:
+                print(f"Error reading question bank refill queue: {str(e)}")
+                job = None
+            if job is None:
+                self._wakeup.wait(REFILL_POLL_SECONDS)
+                self._wakeup.clear()
+                continue
+            key, meta = job
+            try:
+                self._refill(key, meta)
+            except Exception as e:
+                print(f"Error refilling question bank for {key}: {str(e)}")
+            finally:
+                with self._transaction() as conn:
+                    conn.execute("DELETE FROM refill_queue WHERE key = ?", (key,))
+
+    def _refill(self, key: str, meta: Dict):
+        difficulty = bucket_difficulty(meta['bucket'])
+        while self.depth - self._fresh_count(key) > 0:
+            text = self._generate(meta['question_type'], meta['topic_name'], meta['category'], difficulty)
+            # Never bank error messages or responses that don't parse
+            parsed = parse_question(meta['question_type'], text)
+            if parsed is None:
+                return
+            self._add(key, meta, text, parsed)
+            with self._lock:
+                self.generated += 1
+
+    def stats(self) -> Dict:
+        """Bank size and queue (shared by all processes) and this process's hit/miss counters"""
+        if self.enabled:
+            conn = self._connect()
+            keys = conn.execute("SELECT COUNT(*) FROM bank_keys").fetchone()[0]
+            questions = conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+            queued = conn.execute("SELECT COUNT(*) FROM refill_queue").fetchone()[0]
+        else:
+            keys = questions = queued = 0
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'keys': keys,
+                'questions': questions,
+                'max_keys': self.max_keys,
+                'depth': self.depth,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'evictions': self.evictions,
+                'generated': self.generated,
+                'refill_queue': queued,
+                'refill_owner': self._owner_lock_file is not None or (fcntl is None and self._worker is not None)
+            }
+
+
+# Global question bank instance
+question_bank = QuestionBank()
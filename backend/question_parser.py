@@ -0,0 +1,173 @@
+"""Turn generated question text into compact structured questions.
+
+Responses that follow the prompt's format exactly are parsed with one
+anchored regex per question type. Anything else (markdown bold labels,
+lowercase labels, "A." options, ANSWER vs ANSWERS, fields spread over
+several lines) goes through a slower line-by-line scan. Structured
+questions are what the API ships and what the question bank stores, so a
+response is only parsed once.
+"""
+import re
+from typing import Dict, List, Optional
+
+MCQ_OPTIONS = ('A', 'B', 'C', 'D')
+
+STRICT_PATTERNS = {
+    'mcq': re.compile(
+        r'\s*QUESTION:\s*(?P<question>.+?)\s*\n'
+        r'A\)\s*(?P<A>.+?)\s*\nB\)\s*(?P<B>.+?)\s*\nC\)\s*(?P<C>.+?)\s*\nD\)\s*(?P<D>.+?)\s*\n'
+        r'ANSWER:\s*(?P<answer>[A-D])\s*\nEXPLANATION:\s*(?P<explanation>.*?)\s*',
+        re.DOTALL
+    ),
+    'blank': re.compile(
+        r'\s*QUESTION:\s*(?P<question>.+?)\s*\nANSWERS:\s*(?P<answers>.+?)\s*\n'
+        r'EXPLANATION:\s*(?P<explanation>.*?)\s*',
+        re.DOTALL
+    ),
+    'code': re.compile(
+        r'\s*QUESTION:\s*(?P<question>.+?)\s*\nREQUIREMENTS:\s*(?P<requirements>.*?)\s*\n'
+        r'FUNCTION_SIGNATURE:\s*(?P<signature>.+?)\s*\nEXAMPLE_INPUT:\s*(?P<example_input>.*?)\s*\n'
+        r'EXAMPLE_OUTPUT:\s*(?P<example_output>.*?)\s*',
+        re.DOTALL
+    )
+}
+
+# Labels as the lenient scan recognises them, mapped to the structured field
+LENIENT_LABELS = {
+    'QUESTION': 'question',
+    'ANSWER': 'answer',
+    'ANSWERS': 'answer',
+    'CORRECT_ANSWER': 'answer',
+    'EXPLANATION': 'explanation',
+    'REQUIREMENTS': 'requirements',
+    'FUNCTION_SIGNATURE': 'signature',
+    'SIGNATURE': 'signature',
+    'EXAMPLE_INPUT': 'example_input',
+    'EXAMPLE_OUTPUT': 'example_output'
+}
+LABEL_PATTERN = re.compile(r'^[\s*#_>-]*([A-Za-z][A-Za-z _]*?)[\s*_]*:[\s*_]*(.*)$')
+OPTION_PATTERN = re.compile(r'^[\s*]*\(?([A-D])[).:][\s*]*(.*)$')
+ANSWER_LETTER_PATTERN = re.compile(r'\b([A-D])\b')
+
+
+def normalize_answer(answer: str) -> str:
+    """Case- and whitespace-insensitive form used to compare fill-in-the-blank answers"""
+    return ' '.join(answer.casefold().split())
+
+
+def _clean(value: Optional[str]) -> str:
+    return (value or '').strip().strip('`').strip()
+
+
+def _split_answers(value: str) -> List[str]:
+    value = _clean(value)
+    # Drop a trailing "(multiple valid answers ...)" echoed from the prompt, then the brackets
+    value = re.sub(r'\s*\((?:multiple|case)[^)]*\)\s*$', '', value, flags=re.IGNORECASE)
+    if value.startswith('[') and value.endswith(']'):
+        value = value[1:-1]
+    answers = []
+    for answer in value.split('|'):
+        answer = normalize_answer(answer.strip().strip('`"\''))
+        if answer and answer not in answers:
+            answers.append(answer)
+    return answers
+
+
+def _strict_fields(question_type: str, text: str) -> Optional[Dict[str, str]]:
+    pattern = STRICT_PATTERNS.get(question_type)
+    match = pattern.fullmatch(text) if pattern else None
+    return match.groupdict() if match else None
+
+
+def _lenient_fields(text: str) -> Dict[str, str]:
+    fields: Dict[str, List[str]] = {}
+    current = None
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        label = LABEL_PATTERN.match(stripped)
+        field = LENIENT_LABELS.get(label.group(1).strip().upper().replace(' ', '_')) if label else None
+        if field:
+            current = field
+            fields.setdefault(current, []).append(label.group(2))
+            continue
+        # Options only count between the question and the answer, so "A." in an explanation is left alone
+        option = OPTION_PATTERN.match(stripped)
+        if option and current in ('question',) + MCQ_OPTIONS:
+            current = option.group(1)
+            fields[current] = [option.group(2)]
+            continue
+        if current is not None:
+            fields[current].append(stripped)
+    return {field: '\n'.join(lines) for field, lines in fields.items()}
+
+
+def _structure(question_type: str, fields: Dict[str, str]) -> Optional[Dict]:
+    question = _clean(fields.get('question'))
+    if not question:
+        return None
+    if question_type == 'mcq':
+        options = {letter: _clean(fields.get(letter)) for letter in MCQ_OPTIONS}
+        letter = ANSWER_LETTER_PATTERN.search(_clean(fields.get('answer')).upper())
+        if not all(options.values()) or not letter:
+            return None
+        return {'question': question, 'options': options, 'answer': letter.group(1),
+                'explanation': _clean(fields.get('explanation'))}
+    if question_type == 'blank':
+        answers = _split_answers(fields.get('answers', fields.get('answer', '')))
+        if not answers:
+            return None
+        return {'question': question, 'answers': answers, 'explanation': _clean(fields.get('explanation'))}
+    if question_type == 'code':
+        return {
+            'question': question,
+            'requirements': _clean(fields.get('requirements')),
+            'signature': _clean(fields.get('signature')),
+            'example_input': _clean(fields.get('example_input')),
+            'example_output': _clean(fields.get('example_output'))
+        }
+    return None
+
+
+def parse_question(question_type: str, text: Optional[str]) -> Optional[Dict]:
+    """Structured form of a generated question, or None when the text isn't a usable question"""
+    if not text:
+        return None
+    fields = _strict_fields(question_type, text)
+    if fields is not None:
+        parsed = _structure(question_type, fields)
+        if parsed is not None:
+            return parsed
+    return _structure(question_type, _lenient_fields(text))
+
+
+def fallback_question(text: Optional[str]) -> Dict:
+    """Structured stand-in for text that could not be parsed (e.g. an error message), shown as is"""
+    return {'question': (text or '').strip(), 'unparsed': True}
+
+
+def answer_key(question_type: str, parsed: Optional[Dict]) -> Optional[Dict]:
+    """The part of a structured question needed to grade an answer locally"""
+    if not parsed or parsed.get('unparsed'):
+        return None
+    if question_type == 'mcq':
+        return {'answer': parsed['answer']}
+    if question_type == 'blank':
+        return {'answers': parsed['answers']}
+    return None
+
+
+def grade_answer(question_type: str, key: Optional[Dict], user_answer) -> Optional[bool]:
+    """Whether user_answer matches the answer key, or None when it can't be graded locally
+
+    With a key, a missing or non-string answer is wrong rather than ungraded,
+    so leaving the answer out can't fall back to the client's own verdict.
+    """
+    if not key or question_type not in ('mcq', 'blank'):
+        return None
+    if not isinstance(user_answer, str):
+        return False
+    if question_type == 'mcq':
+        return user_answer.strip().upper() == key['answer']
+    return normalize_answer(user_answer) in key['answers']
@@ -0,0 +1,112 @@
+import random
+from typing import Dict, Hashable, List, Optional
+
+from priority import DIVERSITY_PENALTY
+
+
+class SumTree:
+    """Array-backed segment tree over non-negative weights.
+
+    Supports point updates and sampling an index proportionally to its
+    weight in O(log n). Internal sums are recomputed from their children on
+    every update, so repeated removals do not accumulate float drift.
+    """
+
+    def __init__(self, weights: List[float]):
+        self.size = 1
+        while self.size < max(1, len(weights)):
+            self.size *= 2
+        self.tree = [0.0] * (2 * self.size)
+        self.tree[self.size:self.size + len(weights)] = [float(w) for w in weights]
+        for node in range(self.size - 1, 0, -1):
+            self.tree[node] = self.tree[2 * node] + self.tree[2 * node + 1]
+
+    @property
+    def total(self) -> float:
+        return self.tree[1]
+
+    def get(self, index: int) -> float:
+        return self.tree[self.size + index]
+
+    def update(self, index: int, weight: float):
+        node = self.size + index
+        self.tree[node] = weight
+        node //= 2
+        while node:
+            self.tree[node] = self.tree[2 * node] + self.tree[2 * node + 1]
+            node //= 2
+
+    def find(self, r: float) -> int:
+        """Return the index whose cumulative weight range contains r (0 <= r < total)"""
+        node = 1
+        while node < self.size:
+            left, right = self.tree[2 * node], self.tree[2 * node + 1]
+            # Never descend into an empty subtree, even if r overshoots through rounding
+            if r < left or right <= 0.0:
+                node = 2 * node
+            else:
+                r -= left
+                node = 2 * node + 1
+        return node - self.size
+
+
+def weighted_sample_without_replacement(items: List[dict], k: int, category_key: str = "category",
+                                        penalty: float = DIVERSITY_PENALTY,
+                                        rng: Optional[random.Random] = None) -> List[dict]:
+    """
+    Tree-based equivalent of engine._weighted_sample_without_replacement in O(n + k log n).
+
+    Every pick from a category multiplies the remaining weights of that category
+    by `penalty`, so an item's weight is priority * penalty ** picks_from_category.
+    Sampling first picks a category by its penalized total, then an item inside
+    it by raw priority, which yields the same distribution as the linear version.
+    Items without a category are never penalized. Returns shallow copies in the
+    order chosen, with 'priority' set to the effective weight at pick time.
+    """
+    rng = rng or random
+    k = min(k, len(items))
+    if k <= 0:
+        return []
+
+    # Group item indexes by category; uncategorized items each form their own unpenalized group
+    groups: Dict[Hashable, List[int]] = {}
+    for index, item in enumerate(items):
+        category = item.get(category_key, None)
+        key = ('category', category) if category is not None else ('item', index)
+        groups.setdefault(key, []).append(index)
+    group_keys = list(groups)
+    penalized = [key[0] == 'category' for key in group_keys]
+    item_trees = [SumTree([items[i]["priority"] for i in groups[key]]) for key in group_keys]
+    multipliers = [1.0] * len(group_keys)
+    group_tree = SumTree([tree.total for tree in item_trees])
+
+    # Remaining (group, slot) pairs for the uniform fallback once all weights are zero
+    remaining = [(g, slot) for g, key in enumerate(group_keys) for slot in range(len(groups[key]))]
+    remaining_pos = {pair: pos for pos, pair in enumerate(remaining)}
+
+    chosen = []
+    for _ in range(k):
+        if group_tree.total <= 0.0:
+            g, slot = rng.choice(remaining)
+        else:
+            g = group_tree.find(rng.random() * group_tree.total)
+            slot = item_trees[g].find(rng.random() * item_trees[g].total)
+
+        pick = dict(items[groups[group_keys[g]][slot]])
+        pick["priority"] = item_trees[g].get(slot) * multipliers[g]
+        chosen.append(pick)
+
+        # Remove the pick: zero its weight and swap-delete it from the fallback list
+        item_trees[g].update(slot, 0.0)
+        pos = remaining_pos.pop((g, slot))
+        last = remaining.pop()
+        if pos < len(remaining):
+            remaining[pos] = last
+            remaining_pos[last] = pos
+
+        # Diversity penalty: one multiplication per category instead of one per remaining item
+        if penalized[g]:
+            multipliers[g] *= penalty
+        group_tree.update(g, item_trees[g].total * multipliers[g])
+
+    return chosen
@@ -0,0 +1,220 @@
+"""Sandbox for running untrusted programs (the code grader's compiler and user binaries).
+
+Each command runs under bubblewrap in fresh user, PID, network, IPC, UTS and
+cgroup namespaces as uid/gid 65534. The filesystem is an empty tmpfs root
+with /usr (and the /lib, /bin links into it) mounted read-only, a private
+/proc, /dev and /tmp, and only the job's work directory writable at
+/sandbox. The backend's files, environment and processes are not visible,
+and there is no network. A seccomp filter denies sockets, ptrace, mounts,
+new namespaces, module loading and similar calls. Resource limits (CPU,
+address space, file size, core dumps, process count) are applied inside the
+sandbox by exec'ing through prlimit, not with preexec_fn in this threaded
+process.
+
+bwrap needs unprivileged user namespaces; docker-compose.yml has the
+container settings. When the sandbox can't start, nothing is run.
+"""
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+from typing import Dict, List, Optional
+
+SANDBOX_BWRAP = os.getenv('CODE_GRADER_BWRAP', 'bwrap')
+SANDBOX_PRLIMIT = '/usr/bin/prlimit'
+# Mount point of the job's work directory inside the sandbox
+SANDBOX_WORKDIR = '/sandbox'
+SANDBOX_UID = 65534
+
+# ---- seccomp ----
+
+AUDIT_ARCH_X86_64 = 0xC000003E
+AUDIT_ARCH_AARCH64 = 0xC00000B7
+X32_SYSCALL_BIT = 0x40000000
+
+SECCOMP_RET_KILL_PROCESS = 0x80000000
+SECCOMP_RET_ERRNO = 0x00050000
+SECCOMP_RET_ALLOW = 0x7FFF0000
+EPERM = 1
+ENOSYS = 38
+
+BPF_LD_W_ABS = 0x20
+BPF_JEQ_K = 0x15
+BPF_JGE_K = 0x35
+BPF_JSET_K = 0x45
+BPF_RET_K = 0x06
+
+# Offsets into struct seccomp_data
+SECCOMP_DATA_NR = 0
+SECCOMP_DATA_ARCH = 4
+SECCOMP_DATA_ARG0 = 16
+
+# CLONE_NEWNS | CLONE_NEWCGROUP | CLONE_NEWUTS | CLONE_NEWIPC | CLONE_NEWUSER | CLONE_NEWPID | CLONE_NEWNET
+CLONE_NAMESPACE_FLAGS = 0x7E020000
+
+DENIED_SYSCALLS = [
+    'socket', 'socketpair', 'connect', 'accept', 'accept4', 'bind', 'listen',
+    'ptrace', 'process_vm_readv', 'process_vm_writev', 'personality',
+    'mount', 'umount2', 'pivot_root', 'chroot', 'unshare', 'setns', 'open_by_handle_at',
+    'init_module', 'finit_module', 'delete_module', 'kexec_load', 'reboot', 'swapon',
+    'bpf', 'perf_event_open', 'userfaultfd', 'io_uring_setup', 'keyctl', 'add_key', 'request_key'
+]
+
+SYSCALL_NUMBERS = {
+    AUDIT_ARCH_X86_64: {
+        'socket': 41, 'socketpair': 53, 'connect': 42, 'accept': 43, 'accept4': 288, 'bind': 49, 'listen': 50,
+        'ptrace': 101, 'process_vm_readv': 310, 'process_vm_writev': 311, 'personality': 135,
+        'mount': 165, 'umount2': 166, 'pivot_root': 155, 'chroot': 161, 'unshare': 272, 'setns': 308,
+        'open_by_handle_at': 304, 'init_module': 175, 'finit_module': 313, 'delete_module': 176,
+        'kexec_load': 246, 'reboot': 169, 'swapon': 167, 'bpf': 321, 'perf_event_open': 298,
+        'userfaultfd': 323, 'io_uring_setup': 425, 'keyctl': 250, 'add_key': 248, 'request_key': 249,
+        'clone': 56, 'clone3': 435
+    },
+    AUDIT_ARCH_AARCH64: {
+        'socket': 198, 'socketpair': 199, 'connect': 203, 'accept': 202, 'accept4': 242, 'bind': 200, 'listen': 201,
+        'ptrace': 117, 'process_vm_readv': 270, 'process_vm_writev': 271, 'personality': 92,
+        'mount': 40, 'umount2': 39, 'pivot_root': 41, 'chroot': 51, 'unshare': 97, 'setns': 268,
+        'open_by_handle_at': 265, 'init_module': 105, 'finit_module': 273, 'delete_module': 106,
+        'kexec_load': 104, 'reboot': 142, 'swapon': 224, 'bpf': 280, 'perf_event_open': 241,
+        'userfaultfd': 282, 'io_uring_setup': 425, 'keyctl': 219, 'add_key': 217, 'request_key': 218,
+        'clone': 220, 'clone3': 435
+    }
+}
+
+MACHINE_ARCHES = {'x86_64': AUDIT_ARCH_X86_64, 'amd64': AUDIT_ARCH_X86_64, 'aarch64': AUDIT_ARCH_AARCH64,
+                  'arm64': AUDIT_ARCH_AARCH64}
+
+
+def _instruction(code: int, k: int, jt: int = 0, jf: int = 0) -> bytes:
+    return struct.pack('=HBBI', code, jt, jf, k)
+
+
+def seccomp_filter(arch: Optional[int] = None) -> Optional[bytes]:
+    """Compiled BPF program (struct sock_filter array) for bwrap --seccomp, or None on unsupported machines
+
+    Denied calls fail with EPERM; clone with namespace flags is denied too,
+    and clone3 (whose flags a filter can't inspect) fails with ENOSYS so libc
+    falls back to clone. Syscalls of a foreign architecture kill the process.
+    """
+    arch = arch or MACHINE_ARCHES.get(os.uname().machine)
+    numbers = SYSCALL_NUMBERS.get(arch)
+    if numbers is None:
+        return None
+    # The tail of the program is: ALLOW, EPERM, ENOSYS; jumps are relative to the next instruction
+    body = [('ld', SECCOMP_DATA_ARCH), ('arch', arch), ('kill',), ('ld', SECCOMP_DATA_NR)]
+    if arch == AUDIT_ARCH_X86_64:
+        body.append(('deny_ge', X32_SYSCALL_BIT))
+    body += [('deny', numbers[name]) for name in DENIED_SYSCALLS]
+    body += [('nosys', numbers['clone3']), ('clone', numbers['clone']), ('ld', SECCOMP_DATA_ARG0),
+             ('deny_set', CLONE_NAMESPACE_FLAGS)]
+    allow = len(body)
+    deny, nosys = allow + 1, allow + 2
+
+    program = b''
+    for index, (op, *args) in enumerate(body):
+        to = lambda target: target - index - 1
+        if op == 'ld':
+            program += _instruction(BPF_LD_W_ABS, args[0])
+        elif op == 'arch':
+            program += _instruction(BPF_JEQ_K, args[0], jt=1)
+        elif op == 'kill':
+            program += _instruction(BPF_RET_K, SECCOMP_RET_KILL_PROCESS)
+        elif op == 'deny_ge':
+            program += _instruction(BPF_JGE_K, args[0], jt=to(deny))
+        elif op == 'deny':
+            program += _instruction(BPF_JEQ_K, args[0], jt=to(deny))
+        elif op == 'nosys':
+            program += _instruction(BPF_JEQ_K, args[0], jt=to(nosys))
+        elif op == 'clone':
+            # Not clone: skip the argument check straight to ALLOW
+            program += _instruction(BPF_JEQ_K, args[0], jf=to(allow))
+        elif op == 'deny_set':
+            program += _instruction(BPF_JSET_K, args[0], jt=to(deny))
+    program += _instruction(BPF_RET_K, SECCOMP_RET_ALLOW)
+    program += _instruction(BPF_RET_K, SECCOMP_RET_ERRNO | EPERM)
+    program += _instruction(BPF_RET_K, SECCOMP_RET_ERRNO | ENOSYS)
+    return program
+
+
+# ---- command line ----
+
+def prlimit_command(cpu_seconds: int, memory_mb: int, file_bytes: int, processes: int) -> List[str]:
+    """prlimit prefix that sets the limits and execs the program (it runs inside the sandbox)"""
+    memory = memory_mb * 1024 * 1024
+    return [SANDBOX_PRLIMIT, f'--cpu={cpu_seconds}', f'--as={memory}', f'--fsize={file_bytes}', '--core=0',
+            f'--nproc={processes}', '--']
+
+
+def _system_mounts() -> List[str]:
+    """Read-only /usr plus /lib*, /bin and /sbin as the host has them (links into /usr on merged-/usr systems)"""
+    args = ['--ro-bind', '/usr', '/usr']
+    for path in ('/lib', '/lib64', '/lib32', '/bin', '/sbin'):
+        if os.path.islink(path):
+            args += ['--symlink', os.readlink(path), path]
+        elif os.path.isdir(path):
+            args += ['--ro-bind', path, path]
+    return args + ['--ro-bind-try', '/etc/ld.so.cache', '/etc/ld.so.cache']
+
+
+def bwrap_command(bwrap: str, workdir: str, seccomp_fd: int, read_only: Optional[Dict[str, str]] = None) -> List[str]:
+    """bwrap prefix for a job: workdir writable at SANDBOX_WORKDIR, read_only maps host paths to sandbox paths"""
+    args = [bwrap, '--unshare-all', '--die-with-parent', '--new-session', '--clearenv',
+            '--uid', str(SANDBOX_UID), '--gid', str(SANDBOX_UID), '--hostname', 'sandbox',
+            '--setenv', 'PATH', '/usr/bin:/bin', '--setenv', 'HOME', SANDBOX_WORKDIR,
+            *_system_mounts(), '--proc', '/proc', '--dev', '/dev', '--tmpfs', '/tmp',
+            '--bind', workdir, SANDBOX_WORKDIR]
+    for source, target in (read_only or {}).items():
+        args += ['--ro-bind', source, target]
+    return args + ['--chdir', SANDBOX_WORKDIR, '--seccomp', str(seccomp_fd), '--']
+
+
+class Sandbox:
+    """Runs commands under bwrap with the seccomp filter and prlimit limits"""
+
+    def __init__(self, bwrap: str = SANDBOX_BWRAP):
+        self.bwrap = shutil.which(bwrap)
+        self.filter = seccomp_filter()
+        self._usable: Optional[bool] = None
+
+    @property
+    def available(self) -> bool:
+        """Whether sandboxed jobs can start here; checked once by running a trivial command"""
+        if self._usable is None:
+            self._usable = False
+            if self.bwrap is None or self.filter is None or not os.path.exists(SANDBOX_PRLIMIT):
+                print("Code grader sandbox unavailable: bwrap, prlimit or a supported architecture is missing")
+            else:
+                try:
+                    with tempfile.TemporaryDirectory(prefix='garudaco-probe-') as workdir:
+                        probe = self.run(['/usr/bin/true'], workdir, timeout=10, cpu_seconds=5, memory_mb=256,
+                                         file_bytes=0, processes=4, capture_output=True, check_available=False)
+                    self._usable = probe.returncode == 0
+                    if not self._usable:
+                        print(f"Code grader sandbox unavailable: {probe.stderr.decode('utf-8', 'replace').strip()}")
+                except (OSError, subprocess.SubprocessError) as e:
+                    print(f"Code grader sandbox unavailable: {str(e)}")
+        return self._usable
+
+    def run(self, command: List[str], workdir: str, timeout: float, cpu_seconds: int, memory_mb: int,
+            file_bytes: int, processes: int, read_only: Optional[Dict[str, str]] = None,
+            check_available: bool = True, **kwargs) -> subprocess.CompletedProcess:
+        """subprocess.run command in the sandbox; raises subprocess.TimeoutExpired like subprocess.run
+
+        A command killed by a signal reports it as a negative returncode, as it would unsandboxed.
+        """
+        if check_available and not self.available:
+            raise RuntimeError('The code grader sandbox is not available')
+        read_fd, write_fd = os.pipe()
+        try:
+            with os.fdopen(write_fd, 'wb') as pipe:
+                pipe.write(self.filter)
+            full_command = (bwrap_command(self.bwrap, workdir, read_fd, read_only)
+                            + prlimit_command(cpu_seconds, memory_mb, file_bytes, processes) + command)
+            result = subprocess.run(full_command, timeout=timeout, pass_fds=(read_fd,), env={}, **kwargs)
+        finally:
+            os.close(read_fd)
+        # bwrap exits with 128 + N when the sandboxed process was killed by signal N
+        if 128 < result.returncode < 128 + 65:
+            result.returncode = 128 - result.returncode
+        return result
@@ -0,0 +1,112 @@
+"""Vectorized (NumPy) versions of the engine's priority functions.
+
+Topics are converted once into columnar arrays and every priority is then
+computed with array arithmetic. The results match engine.calculate_priority
+and engine._compute_priority for the same `now` within float tolerance.
+"""
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from priority import (
+    W_STRUGGLE, W_DUE, W_BASE, W_NOVELTY,
+    NEW_TOPIC_WINDOW_DAYS, BASE_INTERVAL_DAYS
+)
+
+SECONDS_PER_DAY = 86400.0
+
+
+def _epoch(value: Optional[datetime]) -> float:
+    return value.timestamp() if value is not None else np.nan
+
+
+class TopicColumns:
+    """Columnar view of a topic list, built once and reused for every score"""
+
+    def __init__(self, topics: List[Dict], now: datetime):
+        self.now = now
+        now_epoch = now.timestamp()
+        count = len(topics)
+        self.attempts = np.fromiter((t.get('attempts', 0) for t in topics), dtype=np.float64, count=count)
+        self.successes = np.fromiter((t.get('successes', 0) for t in topics), dtype=np.float64, count=count)
+        self.base_score = np.fromiter((t.get('base_score', 50) for t in topics), dtype=np.float64, count=count)
+        self.rec_score_avg = np.fromiter((t.get('rec_score_avg', 50.0) for t in topics), dtype=np.float64, count=count)
+        # A missing date_added counts as "added now"; an explicit None is NaN (never added)
+        self.date_added = np.fromiter(
+            (_epoch(t['date_added']) if 'date_added' in t else now_epoch for t in topics),
+            dtype=np.float64, count=count
+        )
+        self.last_seen = np.fromiter((_epoch(t.get('last_seen')) for t in topics), dtype=np.float64, count=count)
+        self.seconds_since_added = now_epoch - self.date_added
+        self.seconds_since_seen = now_epoch - self.last_seen
+
+    def __len__(self) -> int:
+        return len(self.attempts)
+
+
+def calculate_priorities(topics: List[Dict], now: Optional[datetime] = None,
+                         columns: Optional[TopicColumns] = None) -> np.ndarray:
+    """Batch equivalent of engine.calculate_priority for every topic"""
+    columns = columns or TopicColumns(topics, now or datetime.now())
+    attempts = columns.attempts
+    tried = attempts > 0
+    safe_attempts = np.where(tried, attempts, 1.0)
+    success_rate = np.where(tried, columns.successes / safe_attempts, 0.0)
+
+    # Struggle: neutral 0.5 for untested topics, otherwise doubled failure rate capped at 1
+    struggle = np.where(tried, np.minimum((1.0 - success_rate) * 2.0, 1.0), 0.5)
+
+    # Due: whole days since last seen (timedelta.days floors) against a success-scaled interval
+    seen = ~np.isnan(columns.last_seen)
+    days_seen = np.floor(np.where(seen, columns.seconds_since_seen, 0.0) / SECONDS_PER_DAY)
+    target_interval = BASE_INTERVAL_DAYS * np.maximum(1.0, success_rate * 3.0)
+    ratio = days_seen / target_interval
+    due = np.where(days_seen >= target_interval, np.minimum(ratio, 1.0), ratio * 0.3)
+    due = np.where(seen, due, 1.0)
+
+    base = columns.base_score / 100.0
+
+    days_added = np.floor(columns.seconds_since_added / SECONDS_PER_DAY)
+    with np.errstate(invalid='ignore'):
+        novelty = np.where(days_added <= NEW_TOPIC_WINDOW_DAYS, 1.0 - days_added / NEW_TOPIC_WINDOW_DAYS, 0.0)
+
+    return W_STRUGGLE * struggle + W_DUE * due + W_BASE * base + W_NOVELTY * novelty
+
+
+def compute_priorities(topics: List[Dict], now: Optional[datetime] = None,
+                       columns: Optional[TopicColumns] = None) -> np.ndarray:
+    """Batch equivalent of engine._compute_priority (priority only, no breakdown)"""
+    columns = columns or TopicColumns(topics, now or datetime.now())
+    success_rate = (columns.successes + 1.0) / (columns.attempts + 2.0)
+    struggle_index = 1.0 - success_rate
+
+    base_norm = np.clip((columns.base_score - 1.0) / 99.0, 0.0, 1.0)
+
+    days_added = np.maximum(0.0, columns.seconds_since_added / SECONDS_PER_DAY)
+    days_added = np.where(np.isnan(days_added), 9999.0, days_added)
+    novelty = np.where(
+        days_added <= NEW_TOPIC_WINDOW_DAYS,
+        np.maximum(0.0, (NEW_TOPIC_WINDOW_DAYS - days_added) / float(NEW_TOPIC_WINDOW_DAYS)),
+        0.0
+    )
+
+    seen = ~np.isnan(columns.last_seen)
+    days_since_seen = np.where(
+        seen,
+        np.maximum(0.0, np.where(seen, columns.seconds_since_seen, 0.0) / SECONDS_PER_DAY),
+        np.minimum(days_added + 30.0, 365.0)
+    )
+
+    rec_difficulty_norm = np.clip((columns.rec_score_avg - 1.0) / 99.0, 0.0, 1.0)
+    due_multiplier = 1.0 + (1.0 - rec_difficulty_norm) * 3.0
+    desired_interval = BASE_INTERVAL_DAYS * (1.0 + success_rate * 7.0) * due_multiplier
+    due_norm = np.minimum(2.0, days_since_seen / np.maximum(1.0, desired_interval)) / 2.0
+
+    priority = (
+        W_STRUGGLE * struggle_index +
+        W_DUE * due_norm +
+        W_BASE * base_norm +
+        W_NOVELTY * novelty
+    )
+    return np.maximum(0.0, priority)
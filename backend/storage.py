@@ -0,0 +1,740 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import msgpack
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; user locks then only serialize threads of one process
+    fcntl = None
+
+# Topic fields that get their own column in the SQLite backend; anything else is kept in `extra`
+TOPIC_COLUMNS = ['topic_name', 'category', 'base_score', 'attempts', 'successes']
+TOPIC_DATE_FIELDS = ['date_added', 'last_seen', 'next_due']
+PROFILE_DATE_FIELDS = ['created_at', 'last_login']
+
+# On-disk format for new writes of user documents: 'json' (indented) or 'msgpack'
+# (packed, with the topic snapshot stored column by column). Both are auto-detected on read.
+STORAGE_FORMAT = os.getenv('STORAGE_FORMAT', 'json')
+BINARY_MAGIC = b'GDC\x01'
+
+# Journal size (bytes) after which a user's topic journal is folded back into the snapshot
+JOURNAL_COMPACT_BYTES = int(os.getenv('JOURNAL_COMPACT_BYTES', 64 * 1024))
+
+
+def atomic_write(path: str, data: bytes):
+    """Replace path with data via a uniquely named temp file, so readers in any process never see a partial file"""
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or '.', prefix=f".{os.path.basename(path)}.", suffix='.tmp'
+    )
+    try:
+        os.fchmod(fd, 0o644)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class UserLocks:
+    """Per-user advisory locks shared by every process using the same lock directory.
+
+    Each user has a lock file held with flock, so a read-modify-write of one
+    user's documents can't interleave with another worker process or thread
+    doing the same. Locks are reentrant within a thread.
+    """
+
+    def __init__(self, lock_dir: str):
+        self.lock_dir = lock_dir
+        self._held = threading.local()
+        self._thread_locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def lock_path(self, user_id: str) -> str:
+        return os.path.join(self.lock_dir, f".{user_id}.lock")
+
+    def acquire(self, user_id: str):
+        held = self._held.__dict__.setdefault('locks', {})
+        if user_id in held:
+            held[user_id][1] += 1
+            return
+        if fcntl is None:
+            with self._guard:
+                handle = self._thread_locks.setdefault(user_id, threading.Lock())
+            handle.acquire()
+        else:
+            handle = open(self.lock_path(user_id), 'a')
+            try:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            except BaseException:
+                handle.close()
+                raise
+        held[user_id] = [handle, 1]
+
+    def release(self, user_id: str):
+        held = self._held.locks
+        held[user_id][1] -= 1
+        if held[user_id][1]:
+            return
+        handle, _ = held.pop(user_id)
+        if fcntl is None:
+            handle.release()
+        else:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            handle.close()
+
+    @contextmanager
+    def hold(self, user_id: str):
+        self.acquire(user_id)
+        try:
+            yield
+        finally:
+            self.release(user_id)
+
+
+def _encode_dates(data: Dict, fields: List[str]) -> Dict:
+    """Return a copy of data with the given datetime fields converted to ISO strings"""
+    data = data.copy()
+    for field in fields:
+        if data.get(field):
+            data[field] = data[field].isoformat()
+    return data
+
+
+def _decode_dates(data: Dict, fields: List[str]) -> Dict:
+    """Convert the given ISO string fields back to datetimes in place"""
+    for field in fields:
+        value = data.get(field)
+        if isinstance(value, str) and value:
+            data[field] = datetime.fromisoformat(value)
+    return data
+
+
+def _to_epoch(value: Optional[datetime]) -> Optional[float]:
+    return value.timestamp() if value else None
+
+
+def _from_epoch(value: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(value) if value is not None else None
+
+
+def topic_added(topic: dict) -> Dict:
+    """Build a change record that appends a new topic"""
+    return {'op': 'add', 'topic': topic}
+
+
+def topic_updated(topic_id: str, fields: Dict) -> Dict:
+    """Build a change record that overwrites some fields of an existing topic"""
+    return {'op': 'set', 'topic_id': topic_id, 'fields': fields}
+
+
+def apply_topic_changes(topics: List[dict], changes: List[Dict]) -> List[dict]:
+    """Apply change records to a topic list in place; updates to unknown topics are ignored
+
+    Replay is idempotent: an 'add' for a topic_id that is already present
+    overwrites it in place, so a journal replayed on top of a snapshot that
+    already includes it (a crash before the journal was removed) can't
+    duplicate topics.
+    """
+    by_id = {topic['topic_id']: topic for topic in topics}
+    for change in changes:
+        if change['op'] == 'add':
+            topic = by_id.get(change['topic']['topic_id'])
+            if topic is not None:
+                topic.clear()
+                topic.update(change['topic'])
+                continue
+            topic = dict(change['topic'])
+            topics.append(topic)
+            by_id[topic['topic_id']] = topic
+        elif change['op'] == 'set':
+            topic = by_id.get(change['topic_id'])
+            if topic is not None:
+                topic.update(change['fields'])
+    return topics
+
+
+def _change_to_json(change: Dict) -> Dict:
+    if change['op'] == 'add':
+        return topic_added(_encode_dates(change['topic'], TOPIC_DATE_FIELDS))
+    return topic_updated(change['topic_id'], _encode_dates(change['fields'], TOPIC_DATE_FIELDS))
+
+
+def _change_from_json(change: Dict) -> Dict:
+    _decode_dates(change['topic'] if change['op'] == 'add' else change['fields'], TOPIC_DATE_FIELDS)
+    return change
+
+
+def _encode_assessment(assessment_data: Dict) -> Dict:
+    """Serialize the datetimes of an assessment without touching the caller's topic dicts"""
+    serializable_data = _encode_dates(assessment_data, ['timestamp'])
+    serializable_data['topics'] = [
+        _encode_dates(topic, TOPIC_DATE_FIELDS) for topic in assessment_data.get('topics', [])
+    ]
+    return serializable_data
+
+
+def _decode_assessment(data: Dict) -> Dict:
+    _decode_dates(data, ['timestamp'])
+    for topic in data.get('topics', []):
+        _decode_dates(topic, TOPIC_DATE_FIELDS)
+    return data
+
+
+def _encode_topic_columns(topics: List[dict]) -> Dict:
+    """Column-oriented topic snapshot: one list per field, with the positions of topics that lack it
+
+    Unpacking a few long lists is much cheaper than one map per topic, and
+    dates stay ISO strings, which parse faster than epoch seconds convert.
+    """
+    fields = list(dict.fromkeys(field for topic in topics for field in topic))
+    columns, missing = {}, {}
+    for field in fields:
+        values = [topic.get(field) for topic in topics]
+        if field in TOPIC_DATE_FIELDS:
+            values = [value.isoformat() if value else value for value in values]
+        columns[field] = values
+        absent = [position for position, topic in enumerate(topics) if field not in topic]
+        if absent:
+            missing[field] = absent
+    return {'columns': columns, 'missing': missing}
+
+
+def _decode_topic_columns(data: Dict) -> List[dict]:
+    columns = data['columns']
+    for field in TOPIC_DATE_FIELDS:
+        if field in columns:
+            columns[field] = [datetime.fromisoformat(value) if value else value for value in columns[field]]
+    fields = list(columns)
+    topics = [dict(zip(fields, values)) for values in zip(*columns.values())]
+    for field, positions in data.get('missing', {}).items():
+        for position in positions:
+            del topics[position][field]
+    return topics
+
+
+class StorageBackend:
+    """Interface for persisting per-user topics, profiles and the current assessment.
+
+    Loaders return None when nothing has been stored yet; defaults are the
+    responsibility of UserDataManager.
+    """
+
+    user_locks: Optional[UserLocks] = None
+
+    def lock_user(self, user_id: str):
+        """Context manager holding the user's cross-process lock (reentrant within a thread)"""
+        return self.user_locks.hold(user_id) if self.user_locks is not None else nullcontext()
+
+    def ensure_user(self, user_id: str):
+        pass
+
+    def user_exists(self, user_id: str) -> bool:
+        raise NotImplementedError
+
+    def list_users(self) -> List[str]:
+        raise NotImplementedError
+
+    def load_topics(self, user_id: str) -> Optional[List[dict]]:
+        raise NotImplementedError
+
+    def save_topics(self, user_id: str, topics_data: List[dict]):
+        raise NotImplementedError
+
+    def topics_version(self, user_id: str):
+        """Return a cheap token that changes whenever the stored topics change, even from another process"""
+        return None
+
+    def apply_topic_changes(self, user_id: str, changes: List[Dict]):
+        """Persist a batch of topic change records (see topic_added/topic_updated)"""
+        topics = self.load_topics(user_id) or []
+        self.save_topics(user_id, apply_topic_changes(topics, changes))
+
+    def compact_topics(self, user_id: str) -> bool:
+        """Fold any pending incremental changes into the stored snapshot; returns True if work was done"""
+        return False
+
+    def load_profile(self, user_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def save_profile(self, user_id: str, profile_data: Dict):
+        raise NotImplementedError
+
+    def load_assessment(self, user_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def save_assessment(self, user_id: str, assessment_data: Dict):
+        raise NotImplementedError
+
+    def delete_assessment(self, user_id: str):
+        raise NotImplementedError
+
+
+class JSONFileStorage(StorageBackend):
+    """Stores each user as a directory of JSON files (the original layout).
+
+    Topic changes are appended to topics_journal.jsonl instead of rewriting
+    topics_data.json; loading replays the journal on top of the snapshot and
+    the journal is compacted back into the snapshot once it grows large.
+
+    Documents are written as indented JSON or, with file_format='msgpack', as
+    BINARY_MAGIC followed by a msgpack body, with the topic snapshot laid out
+    column by column (see _encode_topic_columns). The filenames stay the
+    same and the format is detected on every read.
+
+    Documents are replaced atomically, and the snapshot and journal are only
+    read or changed under the user's lock, so several worker processes can
+    share one data directory.
+    """
+
+    TOPICS_FILE = "topics_data.json"
+    JOURNAL_FILE = "topics_journal.jsonl"
+
+    def __init__(self, base_dir: str = "data", file_format: Optional[str] = None):
+        self.base_dir = base_dir
+        self.file_format = (file_format or STORAGE_FORMAT).lower()
+        if self.file_format not in ('json', 'msgpack'):
+            raise ValueError(f"Unknown storage format: {self.file_format}")
+        os.makedirs(self.base_dir, exist_ok=True)
+        # Lock files are dotfiles in base_dir, not per-user directories, so locking never creates a user
+        self.user_locks = UserLocks(self.base_dir)
+
+    def get_user_dir(self, user_id: str) -> str:
+        """Get the directory path for a specific user, creating it if needed"""
+        user_dir = os.path.join(self.base_dir, user_id)
+        os.makedirs(user_dir, exist_ok=True)
+        return user_dir
+
+    def get_user_file_path(self, user_id: str, filename: str) -> str:
+        """Get the full file path for a user-specific file"""
+        return os.path.join(self.get_user_dir(user_id), filename)
+
+    def _read_document(self, user_id: str, filename: str):
+        try:
+            with open(self.get_user_file_path(user_id, filename), 'rb') as f:
+                raw = f.read()
+            if raw.startswith(BINARY_MAGIC):
+                return msgpack.unpackb(raw[len(BINARY_MAGIC):], raw=False)
+            return json.loads(raw)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_document(self, user_id: str, filename: str, data):
+        if self.file_format == 'msgpack':
+            raw = BINARY_MAGIC + msgpack.packb(data, use_bin_type=True)
+        else:
+            raw = json.dumps(data, indent=2).encode('utf-8')
+        atomic_write(self.get_user_file_path(user_id, filename), raw)
+
+    def ensure_user(self, user_id: str):
+        self.get_user_dir(user_id)
+
+    def user_exists(self, user_id: str) -> bool:
+        return os.path.isdir(os.path.join(self.base_dir, user_id))
+
+    def list_users(self) -> List[str]:
+        if not os.path.exists(self.base_dir):
+            return []
+        return [d for d in os.listdir(self.base_dir) if os.path.isdir(os.path.join(self.base_dir, d))]
+
+    def _read_journal(self, user_id: str) -> List[Dict]:
+        changes = []
+        try:
+            with open(self.get_user_file_path(user_id, self.JOURNAL_FILE), 'r') as f:
+                for line in f:
+                    try:
+                        changes.append(_change_from_json(json.loads(line)))
+                    except (json.JSONDecodeError, KeyError, ValueError):
+                        # A torn final line from an interrupted append is skipped
+                        continue
+        except FileNotFoundError:
+            pass
+        return changes
+
+    def load_topics(self, user_id: str) -> Optional[List[dict]]:
+        # Under the lock so a compaction can't drop the journal between the two reads
+        with self.lock_user(user_id):
+            data = self._read_document(user_id, self.TOPICS_FILE)
+            changes = self._read_journal(user_id)
+        if data is None and not changes:
+            return None
+        # msgpack snapshots are column-oriented; JSON snapshots are a list of topics
+        if isinstance(data, dict):
+            topics = _decode_topic_columns(data)
+        else:
+            topics = [_decode_dates(topic, TOPIC_DATE_FIELDS) for topic in data or []]
+        return apply_topic_changes(topics, changes)
+
+    def save_topics(self, user_id: str, topics_data: List[dict]):
+        if self.file_format == 'msgpack':
+            serializable_data = _encode_topic_columns(topics_data)
+        else:
+            serializable_data = [_encode_dates(topic, TOPIC_DATE_FIELDS) for topic in topics_data]
+        with self.lock_user(user_id):
+            self._write_document(user_id, self.TOPICS_FILE, serializable_data)
+            # The snapshot now includes everything the journal recorded
+            journal_path = self.get_user_file_path(user_id, self.JOURNAL_FILE)
+            if os.path.exists(journal_path):
+                os.remove(journal_path)
+
+    def topics_version(self, user_id: str):
+        version = []
+        for filename in (self.TOPICS_FILE, self.JOURNAL_FILE):
+            try:
+                stat = os.stat(os.path.join(self.base_dir, user_id, filename))
+                # The inode changes on every atomic replace, even within one mtime tick
+                version.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                version.append(None)
+        return tuple(version)
+
+    def apply_topic_changes(self, user_id: str, changes: List[Dict]):
+        if not changes:
+            return
+        lines = ''.join(json.dumps(_change_to_json(change)) + '\n' for change in changes)
+        with self.lock_user(user_id):
+            with open(self.get_user_file_path(user_id, self.JOURNAL_FILE), 'a') as f:
+                f.write(lines)
+                journal_size = f.tell()
+            if journal_size > JOURNAL_COMPACT_BYTES:
+                self.compact_topics(user_id)
+
+    def compact_topics(self, user_id: str) -> bool:
+        with self.lock_user(user_id):
+            if not os.path.exists(os.path.join(self.base_dir, user_id, self.JOURNAL_FILE)):
+                return False
+            self.save_topics(user_id, self.load_topics(user_id) or [])
+            return True
+
+    def load_profile(self, user_id: str) -> Optional[Dict]:
+        data = self._read_document(user_id, "profile.json")
+        if data is None:
+            return None
+        return _decode_dates(data, PROFILE_DATE_FIELDS)
+
+    def save_profile(self, user_id: str, profile_data: Dict):
+        self._write_document(
+            user_id, "profile.json", _encode_dates(profile_data, PROFILE_DATE_FIELDS)
+        )
+
+    def load_assessment(self, user_id: str) -> Optional[Dict]:
+        data = self._read_document(user_id, "current_assessment.json")
+        if data is None:
+            return None
+        return _decode_assessment(data)
+
+    def save_assessment(self, user_id: str, assessment_data: Dict):
+        self._write_document(
+            user_id, "current_assessment.json", _encode_assessment(assessment_data)
+        )
+
+    def delete_assessment(self, user_id: str):
+        file_path = self.get_user_file_path(user_id, "current_assessment.json")
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+
+class SQLiteStorage(StorageBackend):
+    """Stores all users in a single embedded SQLite database (WAL mode).
+
+    Topics get one row each with dates stored as epoch seconds, so saving a
+    topic list only rewrites the rows of that user inside one transaction.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS topics (
+            user_id TEXT NOT NULL,
+            topic_id TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            topic_name TEXT,
+            category TEXT,
+            base_score,
+            attempts INTEGER,
+            successes INTEGER,
+            date_added REAL,
+            last_seen REAL,
+            next_due REAL,
+            extra TEXT,
+            PRIMARY KEY (user_id, topic_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_topics_user_position ON topics (user_id, position);
+        CREATE INDEX IF NOT EXISTS idx_topics_user_next_due ON topics (user_id, next_due);
+        CREATE TABLE IF NOT EXISTS profiles (
+            user_id TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS assessments (
+            user_id TEXT PRIMARY KEY,
+            set_id TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS users (
+            user_id TEXT PRIMARY KEY,
+            topics_version INTEGER NOT NULL DEFAULT 0
+        );
+    """
+
+    TOPIC_ROW_COLUMNS = ['user_id', 'topic_id', 'position'] + TOPIC_COLUMNS + TOPIC_DATE_FIELDS + ['extra']
+    INSERT_TOPIC = (
+        f"INSERT INTO topics ({', '.join(TOPIC_ROW_COLUMNS)}) "
+        f"VALUES ({', '.join('?' for _ in TOPIC_ROW_COLUMNS)})"
+    )
+
+    def __init__(self, db_path: str = "data/garudaco.db"):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._local = threading.local()
+        # Transactions keep each write consistent; the lock files serialize a request's read-modify-write
+        self.user_locks = UserLocks(db_dir or '.')
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            # Databases created before next_due existed need the column before the schema's index
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(topics)")}
+            if columns and 'next_due' not in columns:
+                conn.execute("ALTER TABLE topics ADD COLUMN next_due REAL")
+            conn.executescript(self.SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _topic_row(self, user_id: str, position: int, topic: dict) -> tuple:
+        extra = {
+            key: value for key, value in topic.items()
+            if key != 'topic_id' and key not in TOPIC_COLUMNS and key not in TOPIC_DATE_FIELDS
+        }
+        return (
+            user_id, topic['topic_id'], position,
+            *(topic.get(column) for column in TOPIC_COLUMNS),
+            *(_to_epoch(topic.get(field)) for field in TOPIC_DATE_FIELDS),
+            json.dumps(extra) if extra else None
+        )
+
+    def ensure_user(self, user_id: str):
+        conn = self._connect()
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO users (user_id) VALUES (?)", (user_id,))
+
+    def user_exists(self, user_id: str) -> bool:
+        row = self._connect().execute(
+            "SELECT 1 FROM users WHERE user_id = ? UNION SELECT 1 FROM profiles WHERE user_id = ?",
+            (user_id, user_id)
+        ).fetchone()
+        return row is not None
+
+    def list_users(self) -> List[str]:
+        rows = self._connect().execute(
+            "SELECT user_id FROM users UNION SELECT user_id FROM profiles UNION SELECT DISTINCT user_id FROM topics"
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def load_topics(self, user_id: str) -> Optional[List[dict]]:
+        rows = self._connect().execute(
+            f"SELECT topic_id, {', '.join(TOPIC_COLUMNS + TOPIC_DATE_FIELDS)}, extra "
+            "FROM topics WHERE user_id = ? ORDER BY position",
+            (user_id,)
+        ).fetchall()
+        if not rows:
+            return None
+        topics = []
+        date_start = 1 + len(TOPIC_COLUMNS)
+        for row in rows:
+            topic = {'topic_id': row[0]}
+            topic.update(zip(TOPIC_COLUMNS, row[1:date_start]))
+            topic.update(
+                (field, _from_epoch(value)) for field, value in zip(TOPIC_DATE_FIELDS, row[date_start:-1])
+            )
+            extra = row[-1]
+            if extra:
+                topic.update(json.loads(extra))
+            topics.append(topic)
+        return topics
+
+    def save_topics(self, user_id: str, topics_data: List[dict]):
+        rows = [self._topic_row(user_id, i, topic) for i, topic in enumerate(topics_data)]
+        conn = self._connect()
+        with conn:
+            existing_ids = {
+                row[0] for row in conn.execute("SELECT topic_id FROM topics WHERE user_id = ?", (user_id,))
+            }
+            stale_ids = existing_ids - {row[1] for row in rows}
+            conn.executemany(
+                "DELETE FROM topics WHERE user_id = ? AND topic_id = ?",
+                [(user_id, topic_id) for topic_id in stale_ids]
+            )
+            updated_columns = ['position'] + TOPIC_COLUMNS + TOPIC_DATE_FIELDS + ['extra']
+            conn.executemany(
+                self.INSERT_TOPIC + " ON CONFLICT (user_id, topic_id) DO UPDATE SET " +
+                ", ".join(f"{column} = excluded.{column}" for column in updated_columns),
+                rows
+            )
+            conn.execute(
+                "INSERT INTO users (user_id, topics_version) VALUES (?, 1) "
+                "ON CONFLICT (user_id) DO UPDATE SET topics_version = topics_version + 1",
+                (user_id,)
+            )
+
+    def topics_version(self, user_id: str):
+        row = self._connect().execute(
+            "SELECT topics_version FROM users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def apply_topic_changes(self, user_id: str, changes: List[Dict]):
+        conn = self._connect()
+        with conn:
+            for change in changes:
+                if change['op'] == 'add':
+                    position = conn.execute(
+                        "SELECT COALESCE(MAX(position), -1) + 1 FROM topics WHERE user_id = ?", (user_id,)
+                    ).fetchone()[0]
+                    conn.execute(
+                        self.INSERT_TOPIC.replace("INSERT", "INSERT OR REPLACE", 1),
+                        self._topic_row(user_id, position, change['topic'])
+                    )
+                    continue
+
+                fields = dict(change['fields'])
+                for field in TOPIC_DATE_FIELDS:
+                    if field in fields:
+                        fields[field] = _to_epoch(fields[field])
+                extra_fields = {
+                    key: fields.pop(key) for key in list(fields)
+                    if key not in TOPIC_COLUMNS and key not in TOPIC_DATE_FIELDS
+                }
+                if extra_fields:
+                    row = conn.execute(
+                        "SELECT extra FROM topics WHERE user_id = ? AND topic_id = ?",
+                        (user_id, change['topic_id'])
+                    ).fetchone()
+                    if row is None:
+                        continue
+                    extra = json.loads(row[0]) if row[0] else {}
+                    extra.update(extra_fields)
+                    fields['extra'] = json.dumps(extra)
+                if fields:
+                    # Column names come from the fixed TOPIC_COLUMNS/TOPIC_DATE_FIELDS lists
+                    assignments = ", ".join(f"{column} = ?" for column in fields)
+                    conn.execute(
+                        f"UPDATE topics SET {assignments} WHERE user_id = ? AND topic_id = ?",
+                        (*fields.values(), user_id, change['topic_id'])
+                    )
+            conn.execute(
+                "INSERT INTO users (user_id, topics_version) VALUES (?, 1) "
+                "ON CONFLICT (user_id) DO UPDATE SET topics_version = topics_version + 1",
+                (user_id,)
+            )
+
+    def load_profile(self, user_id: str) -> Optional[Dict]:
+        row = self._connect().execute(
+            "SELECT data FROM profiles WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return _decode_dates(json.loads(row[0]), PROFILE_DATE_FIELDS)
+
+    def save_profile(self, user_id: str, profile_data: Dict):
+        data = json.dumps(_encode_dates(profile_data, PROFILE_DATE_FIELDS))
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO profiles (user_id, data) VALUES (?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET data = excluded.data",
+                (user_id, data)
+            )
+
+    def load_assessment(self, user_id: str) -> Optional[Dict]:
+        row = self._connect().execute(
+            "SELECT data FROM assessments WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return _decode_assessment(json.loads(row[0]))
+
+    def save_assessment(self, user_id: str, assessment_data: Dict):
+        data = json.dumps(_encode_assessment(assessment_data))
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO assessments (user_id, set_id, data) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET set_id = excluded.set_id, data = excluded.data",
+                (user_id, assessment_data.get('set_id'), data)
+            )
+
+    def delete_assessment(self, user_id: str):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM assessments WHERE user_id = ?", (user_id,))
+
+
+def create_storage(backend: Optional[str] = None, base_dir: str = "data") -> StorageBackend:
+    """Create the storage backend selected by STORAGE_BACKEND ('json' or 'sqlite')"""
+    backend = (backend or os.getenv('STORAGE_BACKEND', 'json')).lower()
+    if backend == 'sqlite':
+        return SQLiteStorage(os.getenv('SQLITE_PATH', os.path.join(base_dir, 'garudaco.db')))
+    if backend == 'json':
+        return JSONFileStorage(base_dir)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+def copy_user_data(source: StorageBackend, target: StorageBackend, user_ids: Optional[List[str]] = None) -> int:
+    """Copy every user's documents from one backend to another, returning the number of users copied"""
+    user_ids = user_ids if user_ids is not None else source.list_users()
+    for user_id in user_ids:
+        target.ensure_user(user_id)
+        topics = source.load_topics(user_id)
+        if topics is not None:
+            target.save_topics(user_id, topics)
+        profile = source.load_profile(user_id)
+        if profile is not None:
+            target.save_profile(user_id, profile)
+        assessment = source.load_assessment(user_id)
+        if assessment is not None:
+            target.save_assessment(user_id, assessment)
+    return len(user_ids)
+
+
+def compact_all(storage: StorageBackend, user_ids: Optional[List[str]] = None) -> int:
+    """Fold pending topic journals into snapshots, returning the number of users compacted"""
+    user_ids = user_ids if user_ids is not None else storage.list_users()
+    return sum(1 for user_id in user_ids if storage.compact_topics(user_id))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Maintenance commands for Garudaco user storage")
+    parser.add_argument('--data-dir', default='data', help="Base directory of user data")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    compact_parser = subparsers.add_parser('compact', help="Fold topic journals back into snapshots")
+    compact_parser.add_argument('user_ids', nargs='*', help="Users to compact (default: all)")
+    convert_parser = subparsers.add_parser('convert', help="Rewrite JSON user directories in another file format")
+    convert_parser.add_argument('--format', choices=['json', 'msgpack'], default='msgpack', help="Target format")
+    convert_parser.add_argument('user_ids', nargs='*', help="Users to convert (default: all)")
+    args = parser.parse_args()
+
+    if args.command == 'compact':
+        compacted = compact_all(create_storage(base_dir=args.data_dir), args.user_ids or None)
+        print(f"✅ Compacted topic journals for {compacted} user(s)")
+    elif args.command == 'convert':
+        # Reads auto-detect the format, so converting in place is a copy onto the same directory
+        converted = copy_user_data(
+            JSONFileStorage(args.data_dir), JSONFileStorage(args.data_dir, args.format), args.user_ids or None
+        )
+        print(f"✅ Converted {converted} user director(ies) to {args.format}")
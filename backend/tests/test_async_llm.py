@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from async_llm import AsyncLLMDispatcher
+from llm_dispatch import PRIORITY_BACKGROUND, LLMDispatcher, LLMOverloadedError, TokenBucket
+
+
+def dispatchers(rps, max_queue=100):
+    calls = []
+
+    async def call(prompt, temperature):
+        calls.append(prompt)
+        return prompt
+
+    budget = LLMDispatcher(lambda *args: None, max_tokens=10, tokens_per_minute=0, max_queue=max_queue)
+    # Room for a single call up front, then one every 1/rps seconds
+    budget.request_bucket = TokenBucket(rps, 1)
+    return AsyncLLMDispatcher(call, budget), calls
+
+
+def test_async_calls_wait_in_the_priority_queue():
+    async def scenario():
+        dispatcher, calls = dispatchers(rps=20)
+        background = [asyncio.ensure_future(dispatcher.submit(f'refill {i}', priority=PRIORITY_BACKGROUND))
+                      for i in range(3)]
+        while dispatcher.budget.stats()['dispatched'] < 1:
+            await asyncio.sleep(0.001)
+        interactive = asyncio.ensure_future(dispatcher.submit('assessment'))
+        # Identical calls share one upstream request
+        shared = asyncio.ensure_future(dispatcher.submit('assessment'))
+        assert await interactive == await shared == 'assessment'
+        await asyncio.gather(*background)
+        return dispatcher, calls
+
+    dispatcher, calls = asyncio.run(scenario())
+    # The first refill took the one request of budget; the interactive call jumped the rest
+    assert calls == ['refill 0', 'assessment', 'refill 1', 'refill 2']
+    assert dispatcher.stats()['coalesced'] == 1
+    assert dispatcher.budget.stats()['dispatched'] == 4
+
+
+def test_async_calls_are_shed_and_cancelled_reservations_leave_the_queue():
+    async def scenario():
+        dispatcher, calls = dispatchers(rps=0.001, max_queue=2)
+        first = asyncio.ensure_future(dispatcher.submit('first'))
+        assert await first == 'first'
+        waiting = asyncio.ensure_future(dispatcher.submit('waiting', priority=PRIORITY_BACKGROUND))
+        await asyncio.sleep(0)
+        # Background calls are shed once the queue is half full
+        with pytest.raises(LLMOverloadedError):
+            await dispatcher.submit('shed', priority=PRIORITY_BACKGROUND)
+        assert dispatcher.budget.stats()['queued'] == 1
+
+        task = next(iter(dispatcher._inflight.values()))
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        await asyncio.sleep(0)
+        return dispatcher, calls
+
+    dispatcher, calls = asyncio.run(scenario())
+    assert calls == ['first']
+    assert dispatcher.budget.stats()['queued'] == 0
+    assert dispatcher.stats()['shed'] == 1
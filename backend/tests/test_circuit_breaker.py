@@ -0,0 +1,99 @@
+from types import SimpleNamespace
+
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(circuit_breaker, 'time', SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def run(breaker, clock, latency=0.0, error=None):
+    def call():
+        clock.advance(latency)
+        if error is not None:
+            raise error
+        return 'ok'
+    return breaker.call(call)
+
+
+def test_breaker_opens_on_error_rate(clock):
+    breaker = CircuitBreaker(window=10, min_calls=4, error_rate=0.5, slow_seconds=0, open_seconds=30)
+    run(breaker, clock)
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            run(breaker, clock, error=ValueError('bad'))
+    # Below min_calls nothing trips, however bad the rate
+    assert breaker.state == CLOSED
+    run(breaker, clock)
+    assert breaker.state == OPEN and breaker.trips == 1
+
+    upstream = []
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: upstream.append(1))
+    assert upstream == [] and breaker.rejected == 1
+    assert breaker.is_open() and breaker.retry_after() == 30
+    clock.advance(12)
+    assert breaker.retry_after() == 18
+
+
+def test_breaker_opens_on_p95_latency(clock):
+    breaker = CircuitBreaker(window=20, min_calls=20, error_rate=1.0, slow_seconds=5, open_seconds=30)
+    # One slow call in twenty is above the 95th percentile's rank
+    for _ in range(19):
+        run(breaker, clock, latency=0.5)
+    run(breaker, clock, latency=6)
+    assert breaker.state == CLOSED
+    # A second one is not
+    run(breaker, clock, latency=6)
+    assert breaker.state == OPEN
+    assert breaker.stats()['latency']['p95'] == 6
+
+
+def test_half_open_lets_a_single_probe_through(clock):
+    breaker = CircuitBreaker(window=4, min_calls=2, error_rate=0.5, slow_seconds=5, open_seconds=30)
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            run(breaker, clock, error=ValueError('bad'))
+    assert breaker.state == OPEN
+    clock.advance(30)
+    assert not breaker.is_open()
+
+    # While the probe is running every other call is rejected
+    def probe():
+        assert breaker.state == HALF_OPEN and breaker.is_open()
+        with pytest.raises(CircuitOpenError):
+            breaker.call(lambda: 'second')
+        clock.advance(6)
+        return 'probe'
+    assert breaker.call(probe) == 'probe'
+    # The probe succeeded but too slowly: open again for another period
+    assert breaker.state == OPEN and breaker.trips == 2
+    with pytest.raises(CircuitOpenError):
+        run(breaker, clock)
+
+    clock.advance(30)
+    with pytest.raises(ValueError):
+        run(breaker, clock, error=ValueError('still bad'))
+    assert breaker.state == OPEN and breaker.trips == 3
+
+    clock.advance(30)
+    assert run(breaker, clock, latency=1) == 'ok'
+    assert breaker.state == CLOSED and breaker.stats()['window'] == 0
+    assert run(breaker, clock) == 'ok'
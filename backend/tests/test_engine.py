@@ -0,0 +1,72 @@
+import json
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import engine
+from engine import SORT_DESCENDING_ORDER
+from user_manager import UserDataManager
+
+NOW = datetime(2026, 3, 14, 12, 0, 0)
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return NOW
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    manager = UserDataManager(base_dir=str(tmp_path))
+    monkeypatch.setattr(engine, 'user_data_manager', manager)
+    monkeypatch.setattr(engine, 'datetime', FrozenDatetime)
+    return manager
+
+
+def tied_topics(count, seed=0):
+    """Topics drawn from a few values per field, so every sort key has many ties"""
+    rng = random.Random(seed)
+    topics = []
+    for i in range(count):
+        attempts = rng.choice([0, 2, 4])
+        topics.append({
+            'topic_id': f't{i}',
+            'topic_name': f'Topic {i}',
+            'category': rng.choice(['a', 'b']),
+            'base_score': rng.choice([30, 50, 70]),
+            'attempts': attempts,
+            'successes': rng.randint(0, attempts),
+            'date_added': NOW - timedelta(days=rng.choice([1, 5, 30]), hours=1),
+            'last_seen': rng.choice([None, NOW - timedelta(days=2, hours=1), NOW - timedelta(days=9, hours=1)])
+        })
+    return topics
+
+
+def baseline_days(topic, field):
+    return (NOW - topic[field]).days if topic.get(field) else 999
+
+
+BASELINE_KEYS = {
+    'success_rate': lambda t: t['successes'] / t['attempts'] * 100 if t['attempts'] else 0,
+    'attempt_count': lambda t: t['attempts'],
+    'base_score': lambda t: t['base_score'],
+    'last_seen': lambda t: baseline_days(t, 'last_seen'),
+    'date_added': lambda t: baseline_days(t, 'date_added'),
+}
+
+
+@pytest.mark.parametrize('sort_by', sorted(SORT_DESCENDING_ORDER))
+@pytest.mark.parametrize('sort_order', ['top', 'bottom'])
+@pytest.mark.parametrize('count', [1, 7, 40, 100])
+def test_sorted_recommendations_match_a_stable_full_sort(manager, sort_by, sort_order, count):
+    topics = tied_topics(40)
+    manager.save_user_topics('u1', topics)
+
+    recommendations = [json.loads(rec) for rec in engine.get_sorted_recommendations('u1', count, sort_by, sort_order)]
+
+    descending = sort_order == SORT_DESCENDING_ORDER[sort_by]
+    expected = sorted(topics, key=BASELINE_KEYS[sort_by], reverse=descending)[:count]
+    assert [rec['topic_id'] for rec in recommendations] == [topic['topic_id'] for topic in expected]
+    assert [rec['sort_value'] for rec in recommendations] == [BASELINE_KEYS[sort_by](t) for t in expected]
@@ -0,0 +1,117 @@
+import itertools
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from filters import apply_filters, compile_filter
+from storage import topic_updated
+from topic_index import TopicCollection
+
+NOW = datetime(2026, 3, 14, 12, 0, 0)
+
+
+def baseline_filter(topics, filters, now):
+    """The filter loop engine.apply_filters used before filters.py, with case-insensitive categories"""
+    filtered = []
+    for topic in topics:
+        if filters.get('added_in_last_days') is not None:
+            if (now - topic['date_added']).days > filters['added_in_last_days']:
+                continue
+        if filters.get('not_asked_in_last_days') is not None:
+            if topic.get('last_seen') and (now - topic['last_seen']).days < filters['not_asked_in_last_days']:
+                continue
+        if filters.get('min_base_score') is not None:
+            if topic.get('base_score', 50) < filters['min_base_score']:
+                continue
+        if filters.get('categories'):
+            if topic['category'].lower() not in [category.lower() for category in filters['categories']]:
+                continue
+        filtered.append(topic)
+    return filtered
+
+
+def random_topics(count, seed=0):
+    rng = random.Random(seed)
+    topics = []
+    for i in range(count):
+        # Offsets land on, just before and just after whole-day boundaries
+        added = timedelta(days=rng.randint(0, 20), seconds=rng.choice([-1, 0, 1, 3600]))
+        seen = timedelta(days=rng.randint(0, 20), seconds=rng.choice([-1, 0, 1, 3600]))
+        topics.append({
+            'topic_id': f't{i}',
+            'topic_name': f'Topic {i}',
+            'category': rng.choice(['Python', 'python', 'Go', 'Rust']),
+            'base_score': rng.choice([10, 50, 50.5, 90]),
+            'date_added': NOW - max(added, timedelta(0)),
+            'last_seen': rng.choice([None, NOW - max(seen, timedelta(0))])
+        })
+    return topics
+
+
+FILTER_VALUES = {
+    'added_in_last_days': [None, 0, 1, 7, 30],
+    'not_asked_in_last_days': [None, 0, 1, 3, 14],
+    'min_base_score': [None, 50, 50.5],
+    'categories': [None, [], ['PYTHON'], ['go', 'Rust'], ['Haskell']],
+}
+
+
+def all_filter_combinations():
+    names = list(FILTER_VALUES)
+    for values in itertools.product(*FILTER_VALUES.values()):
+        yield dict(zip(names, values))
+
+
+@pytest.mark.parametrize('indexed', [False, True], ids=['list', 'indexed'])
+def test_apply_filters_matches_the_baseline(indexed):
+    topics = random_topics(300)
+    library = TopicCollection(topics) if indexed else topics
+
+    for filters in all_filter_combinations():
+        expected = [topic['topic_id'] for topic in baseline_filter(topics, filters, NOW)]
+        assert [topic['topic_id'] for topic in apply_filters(library, filters, NOW)] == expected, filters
+
+        predicate = compile_filter(filters, NOW)
+        assert [topic['topic_id'] for topic in topics if predicate(topic)] == expected, filters
+
+
+def test_day_cutoffs():
+    def topic(topic_id, **fields):
+        return dict({'topic_id': topic_id, 'category': 'c', 'base_score': 50, 'date_added': NOW}, **fields)
+
+    topics = TopicCollection([
+        topic('added 2d23h59m ago', date_added=NOW - timedelta(days=3) + timedelta(seconds=1)),
+        topic('added 3d ago', date_added=NOW - timedelta(days=3)),
+        topic('seen 1d23h59m ago', last_seen=NOW - timedelta(days=2) + timedelta(seconds=1)),
+        topic('seen 2d ago', last_seen=NOW - timedelta(days=2)),
+        topic('never seen', last_seen=None),
+    ])
+
+    # Whole days since added <= 2
+    assert [t['topic_id'] for t in apply_filters(topics, {'added_in_last_days': 2}, NOW)] == [
+        'added 2d23h59m ago', 'seen 1d23h59m ago', 'seen 2d ago', 'never seen'
+    ]
+    # Whole days since last seen >= 2, and never-asked topics match
+    assert [t['topic_id'] for t in apply_filters(topics, {'not_asked_in_last_days': 2}, NOW)] == [
+        'added 2d23h59m ago', 'added 3d ago', 'seen 2d ago', 'never seen'
+    ]
+
+
+def test_indexed_path_follows_topic_updates():
+    topics = TopicCollection(random_topics(50, seed=1))
+    filters = {'categories': ['go'], 'not_asked_in_last_days': 5}
+    before = apply_filters(topics, filters, NOW)
+
+    moved = before[0]
+    topics.apply_changes([topic_updated(moved['topic_id'], {'category': 'Rust', 'last_seen': NOW})])
+    after = [topic['topic_id'] for topic in apply_filters(topics, filters, NOW)]
+    assert moved['topic_id'] not in after
+    assert after == [topic['topic_id'] for topic in baseline_filter(topics, filters, NOW)]
+
+
+def test_no_active_filters_returns_a_copy_of_everything():
+    topics = random_topics(5)
+    result = apply_filters(topics, {'categories': [], 'min_base_score': None})
+    assert result == topics and result is not topics
+    assert apply_filters(topics, None) == topics
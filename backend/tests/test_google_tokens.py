@@ -0,0 +1,114 @@
+import hashlib
+import hmac
+import json
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.utils import base64url_encode
+
+from google_tokens import GoogleTokenVerifier, StaticKeySource, cache_max_age, DEFAULT_KEYS_MAX_AGE
+
+CLIENT_ID = 'test-client.apps.googleusercontent.com'
+KID = 'test-key'
+
+
+@pytest.fixture(scope='module')
+def private_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+@pytest.fixture
+def verifier(private_key):
+    return GoogleTokenVerifier(client_id=CLIENT_ID, key_source=StaticKeySource({KID: private_key.public_key()}),
+                               leeway=0)
+
+
+def make_token(key, kid=KID, algorithm='RS256', **overrides):
+    now = int(time.time())
+    claims = {'iss': 'https://accounts.google.com', 'aud': CLIENT_ID, 'sub': '1234567890',
+              'email': 'user@example.com', 'iat': now, 'exp': now + 3600}
+    claims.update(overrides)
+    return jwt.encode(claims, key, algorithm=algorithm, headers={'kid': kid})
+
+
+def test_valid_token_is_accepted(verifier, private_key):
+    claims = verifier.verify(make_token(private_key))
+    assert claims['sub'] == '1234567890'
+    assert claims['email'] == 'user@example.com'
+
+
+def test_other_google_issuer_form_is_accepted(verifier, private_key):
+    assert verifier.verify(make_token(private_key, iss='accounts.google.com')) is not None
+
+
+def test_wrong_audience_is_rejected(verifier, private_key):
+    assert verifier.verify(make_token(private_key, aud='someone-else.apps.googleusercontent.com')) is None
+
+
+def test_wrong_issuer_is_rejected(verifier, private_key):
+    assert verifier.verify(make_token(private_key, iss='https://evil.example.com')) is None
+
+
+def test_expired_token_is_rejected(verifier, private_key):
+    now = int(time.time())
+    assert verifier.verify(make_token(private_key, iat=now - 7200, exp=now - 3600)) is None
+
+
+def test_missing_required_claim_is_rejected(verifier, private_key):
+    now = int(time.time())
+    token = jwt.encode({'iss': 'https://accounts.google.com', 'aud': CLIENT_ID, 'iat': now, 'exp': now + 3600},
+                       private_key, algorithm='RS256', headers={'kid': KID})
+    assert verifier.verify(token) is None
+
+
+def base64url(data):
+    return base64url_encode(data).decode('ascii')
+
+
+def forge_token(header, claims, secret=b''):
+    """Hand-built token, for algorithms PyJWT refuses to sign with these keys"""
+    segments = [base64url(json.dumps(header).encode('utf-8')), base64url(json.dumps(claims).encode('utf-8'))]
+    signing_input = '.'.join(segments).encode('ascii')
+    signature = hmac.new(secret, signing_input, hashlib.sha256).digest() if header['alg'] == 'HS256' else b''
+    return '.'.join(segments + [base64url(signature)])
+
+
+def test_non_rs256_algorithms_are_rejected(verifier, private_key):
+    assert verifier.verify(make_token(private_key, algorithm='RS512')) is None
+
+    claims = jwt.decode(make_token(private_key), options={'verify_signature': False})
+    assert verifier.verify(forge_token({'alg': 'none', 'typ': 'JWT', 'kid': KID}, claims)) is None
+    # HS256 keyed with the public key: the classic algorithm confusion forgery
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    assert verifier.verify(forge_token({'alg': 'HS256', 'typ': 'JWT', 'kid': KID}, claims, public_pem)) is None
+
+
+def test_unknown_kid_is_rejected(verifier, private_key):
+    assert verifier.verify(make_token(private_key, kid='rotated-away')) is None
+
+
+def test_signature_from_another_key_is_rejected(verifier):
+    other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    assert verifier.verify(make_token(other_key)) is None
+
+
+def test_verification_needs_a_client_id(private_key):
+    verifier = GoogleTokenVerifier(client_id=None, key_source=StaticKeySource({KID: private_key.public_key()}))
+    assert verifier.verify(make_token(private_key)) is None
+
+
+def test_cache_max_age_subtracts_age():
+    assert cache_max_age({'Cache-Control': 'public, max-age=20000, must-revalidate', 'Age': '500'}) == 19500
+    assert cache_max_age({'Cache-Control': 'public, max-age=20000'}) == 20000
+
+
+def test_cache_max_age_edge_cases():
+    assert cache_max_age({}) == DEFAULT_KEYS_MAX_AGE
+    assert cache_max_age({'Cache-Control': 'no-transform'}) == DEFAULT_KEYS_MAX_AGE
+    assert cache_max_age({'Cache-Control': 'max-age=100', 'Age': '500'}) == 0
+    assert cache_max_age({'Cache-Control': 'max-age=100', 'Age': 'bogus'}) == 100
@@ -0,0 +1,155 @@
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+import llm_client
+from llm_client import LLMClient
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers each POST with the next scripted (status, headers, delay) of its server"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server = self.server
+        with server.lock:
+            server.clients.append(self.client_address[1])
+            status, headers, delay = server.script.pop(0) if server.script else (200, {}, 0)
+        time.sleep(delay)
+        body = json.dumps({'status': status}).encode('utf-8')
+        try:
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:
+            pass  # The client gave up waiting
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.script = []
+    server.clients = []
+    server.url = f'http://127.0.0.1:{server.server_address[1]}/v1/chat/completions'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Backoff delays the client asked for, without actually sleeping"""
+    delays = []
+    monkeypatch.setattr(llm_client, 'time', SimpleNamespace(sleep=delays.append))
+    return delays
+
+
+def test_reuses_one_keep_alive_connection(stub):
+    client = LLMClient(pool_size=2)
+    for _ in range(3):
+        assert client.post(stub.url, json={'q': 1}).status_code == 200
+    assert len(set(stub.clients)) == 1
+    stats = client.stats()
+    assert stats['requests'] == 3
+    assert stats['connections_opened'] == 1
+    assert stats['connections_reused'] == 2
+
+
+def test_retries_429_honouring_retry_after(stub, sleeps):
+    stub.script = [(429, {'Retry-After': '3'}, 0), (200, {}, 0)]
+    client = LLMClient(max_retries=2, backoff_max=8)
+    assert client.post(stub.url, json={}).status_code == 200
+    assert sleeps == [3.0]
+    stats = client.stats()
+    assert (stats['requests'], stats['retries'], stats['failures']) == (2, 1, 0)
+
+
+def test_retry_after_is_capped_at_backoff_max(stub, sleeps):
+    stub.script = [(503, {'Retry-After': '120'}, 0), (200, {}, 0)]
+    client = LLMClient(max_retries=1, backoff_max=5)
+    assert client.post(stub.url, json={}).status_code == 200
+    assert sleeps == [5.0]
+
+
+def test_returns_last_5xx_once_retries_are_exhausted(stub, sleeps):
+    stub.script = [(502, {}, 0), (503, {}, 0), (500, {}, 0)]
+    client = LLMClient(max_retries=2, backoff=0.5, backoff_max=8)
+    assert client.post(stub.url, json={}).status_code == 500
+    assert len(stub.clients) == 3
+    assert sleeps[0] <= 0.5 and sleeps[1] <= 1.0
+    stats = client.stats()
+    assert (stats['requests'], stats['retries'], stats['failures']) == (3, 2, 1)
+
+
+def test_does_not_retry_4xx(stub, sleeps):
+    stub.script = [(400, {}, 0)]
+    client = LLMClient(max_retries=2)
+    assert client.post(stub.url, json={}).status_code == 400
+    assert sleeps == []
+    assert client.stats()['retries'] == 0
+
+
+def test_read_timeout_is_not_retried(stub, sleeps):
+    stub.script = [(200, {}, 1.0)]
+    client = LLMClient(read_timeout=0.2, max_retries=2)
+    started = time.monotonic()
+    with pytest.raises(requests.ReadTimeout):
+        client.post(stub.url, json={})
+    assert time.monotonic() - started < 0.9
+    assert len(stub.clients) == 1
+    stats = client.stats()
+    assert (stats['requests'], stats['retries'], stats['failures']) == (1, 0, 1)
+
+
+def test_connection_errors_are_retried(sleeps):
+    with socket.socket() as closed:
+        closed.bind(('127.0.0.1', 0))
+        port = closed.getsockname()[1]
+    client = LLMClient(max_retries=2)
+    with pytest.raises(requests.ConnectionError):
+        client.post(f'http://127.0.0.1:{port}/', json={})
+    assert len(sleeps) == 2
+    stats = client.stats()
+    assert (stats['requests'], stats['retries'], stats['failures']) == (3, 2, 1)
+
+
+def test_connect_timeout_is_retried(sleeps):
+    # A listener whose accept backlog is full drops new SYNs, so connecting times out
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(0)
+    fillers = []
+    try:
+        for _ in range(4):
+            filler = socket.socket()
+            filler.setblocking(False)
+            filler.connect_ex(listener.getsockname())
+            fillers.append(filler)
+        client = LLMClient(connect_timeout=0.2, max_retries=1)
+        started = time.monotonic()
+        with pytest.raises(requests.ConnectTimeout):
+            client.post(f'http://127.0.0.1:{listener.getsockname()[1]}/', json={})
+        assert time.monotonic() - started < 2
+        assert client.stats()['retries'] == 1
+    finally:
+        for filler in fillers:
+            filler.close()
+        listener.close()
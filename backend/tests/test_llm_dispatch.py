@@ -0,0 +1,162 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import llm_dispatch
+from llm_dispatch import PRIORITY_BACKGROUND, LLMDispatcher, LLMOverloadedError, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_dispatch, 'time', SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def in_thread(func, *args, **kwargs):
+    """Run func in a thread; the returned dict gets its 'result' or 'error'"""
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = func(*args, **kwargs)
+        except Exception as e:
+            outcome['error'] = e
+    outcome['thread'] = threading.Thread(target=run, daemon=True)
+    outcome['thread'].start()
+    return outcome
+
+
+def test_token_bucket_refills_at_its_rate_up_to_capacity(clock):
+    bucket = TokenBucket(rate=2, capacity=10)
+    bucket.consume(10)
+    assert bucket.delay_for(4) == 2.0
+    clock.advance(1)
+    assert bucket.delay_for(4) == 1.0
+    clock.advance(100)
+    assert bucket.delay_for(10) == 0.0 and bucket.tokens == 10
+
+    # Requests larger than the bucket wait for a full bucket instead of forever
+    bucket.consume(50)
+    assert bucket.tokens == 0
+    assert bucket.delay_for(50) == 5.0
+
+    bucket.refund(3)
+    assert bucket.tokens == 3
+    bucket.refund(100)
+    assert bucket.tokens == 10
+
+
+def test_token_bucket_without_a_rate_never_waits(clock):
+    bucket = TokenBucket(rate=0, capacity=0)
+    bucket.consume(1000)
+    assert bucket.delay_for(1000) == 0.0
+
+
+def test_identical_calls_are_coalesced(clock):
+    release = threading.Event()
+    calls = []
+
+    def call(prompt, temperature):
+        calls.append((prompt, temperature))
+        release.wait(5)
+        return f"{prompt}@{temperature}"
+
+    dispatcher = LLMDispatcher(call, max_tokens=10, rps=0, tokens_per_minute=0)
+    callers = [in_thread(dispatcher.submit, 'p', 0.7) for _ in range(3)]
+    other = in_thread(dispatcher.submit, 'p', 0.3)
+    wait_for(lambda: dispatcher.coalesced == 2 and len(calls) == 2)
+    release.set()
+    for outcome in callers + [other]:
+        outcome['thread'].join(5)
+
+    assert sorted(calls) == [('p', 0.3), ('p', 0.7)]
+    assert [outcome['result'] for outcome in callers] == ['p@0.7'] * 3
+    assert other['result'] == 'p@0.3'
+    # Once done the key is free again
+    assert dispatcher.submit('p', 0.7) == 'p@0.7' and len(calls) == 3
+
+
+def test_errors_reach_every_coalesced_caller(clock):
+    release = threading.Event()
+
+    def call(prompt, temperature):
+        release.wait(5)
+        raise RuntimeError('upstream failed')
+
+    dispatcher = LLMDispatcher(call, max_tokens=10, rps=0, tokens_per_minute=0)
+    callers = [in_thread(dispatcher.submit, 'p') for _ in range(2)]
+    wait_for(lambda: dispatcher.coalesced == 1)
+    release.set()
+    for outcome in callers:
+        outcome['thread'].join(5)
+        assert str(outcome['error']) == 'upstream failed'
+
+
+def test_unused_completion_tokens_are_refunded(clock):
+    # 40-character prompt = 10 tokens, plus max_tokens for the completion
+    dispatcher = LLMDispatcher(lambda prompt, temperature: 'x' * 20, max_tokens=100, rps=0,
+                               tokens_per_minute=6000)
+    dispatcher.submit('p' * 40)
+    # 110 reserved, the 5-token answer leaves 95 of the estimate unused; the clock never moved
+    assert dispatcher.token_bucket.tokens == 6000 - 110 + 95
+
+    # An error result refunds nothing
+    failing = LLMDispatcher(lambda *args: 1 / 0, max_tokens=100, rps=0, tokens_per_minute=6000)
+    with pytest.raises(ZeroDivisionError):
+        failing.submit('p' * 40)
+    assert failing.token_bucket.tokens == 6000 - 110
+
+
+def test_full_queue_sheds_background_calls_first(clock):
+    order = []
+
+    def call(prompt, temperature):
+        order.append(prompt)
+        return prompt
+
+    # One request of budget up front and none refilled until the clock moves
+    dispatcher = LLMDispatcher(call, max_tokens=10, rps=1, tokens_per_minute=0, max_queue=4)
+    assert dispatcher.submit('first') == 'first'
+
+    queued = [in_thread(dispatcher.submit, f'refill {i}', priority=PRIORITY_BACKGROUND) for i in range(2)]
+    wait_for(lambda: dispatcher.stats()['queued'] == 2)
+    assert not dispatcher.accepting(PRIORITY_BACKGROUND) and dispatcher.accepting()
+    with pytest.raises(LLMOverloadedError):
+        dispatcher.submit('refill 2', priority=PRIORITY_BACKGROUND)
+
+    queued += [in_thread(dispatcher.submit, f'assessment {i}') for i in range(2)]
+    wait_for(lambda: dispatcher.stats()['queued'] == 4)
+    with pytest.raises(LLMOverloadedError):
+        dispatcher.submit('assessment 2')
+    assert dispatcher.stats()['shed'] == 2
+
+    # One request per second: interactive calls drain before the background ones
+    while len(order) < 5:
+        clock.advance(1)
+        with dispatcher._cond:
+            dispatcher._cond.notify()
+        time.sleep(0.01)
+    for outcome in queued:
+        outcome['thread'].join(5)
+    assert order == ['first', 'assessment 0', 'assessment 1', 'refill 0', 'refill 1']
@@ -0,0 +1,106 @@
+import json
+import sqlite3
+
+from question_bank import QuestionBank
+
+MCQ = """Question: Which keyword defines a function in Python?
+A) func
+B) def
+C) lambda
+D) define
+Correct Answer: B"""
+
+
+def bank(tmp_path, **kwargs):
+    return QuestionBank(path=str(tmp_path / 'question_bank.db'), **kwargs)
+
+
+def queued(question_bank):
+    return [row[0] for row in question_bank._connect().execute("SELECT key FROM refill_queue")]
+
+
+def test_refill_is_queued_only_for_keys_in_demand(tmp_path):
+    question_bank = bank(tmp_path)
+    question_bank._generate = lambda *args: MCQ
+
+    assert question_bank.take('u1', 'Python', 'Basics', 'mcq', 0.5) is None
+    assert question_bank.take('u1', 'Rust', 'Basics', 'mcq', 0.5) is None
+    assert queued(question_bank) == []
+
+    # Asked for again, by the same user or another one
+    question_bank.take('u1', 'Python', 'Basics', 'mcq', 0.5)
+    question_bank.take('u2', 'Rust', 'Basics', 'mcq', 0.5)
+    assert sorted(queued(question_bank)) == ['python|basics|mcq|2', 'rust|basics|mcq|2']
+
+
+def test_processes_share_questions_and_served_records(tmp_path):
+    first, second = bank(tmp_path), bank(tmp_path)
+    first.add('Python', 'Basics', 'mcq', 0.5, MCQ, served_to='u1')
+
+    assert second.take('u1', 'Python', 'Basics', 'mcq', 0.5) is None
+    text, parsed = second.take('u2', 'Python', 'Basics', 'mcq', 0.5)
+    assert text == MCQ and parsed['answer'] == 'B'
+    assert first.take('u2', 'Python', 'Basics', 'mcq', 0.5) is None
+    assert first.stats()['questions'] == 1
+
+
+def test_only_one_bank_owns_the_refill(tmp_path):
+    first, second = bank(tmp_path), bank(tmp_path)
+    assert first._acquire_refill_ownership()
+    assert not second._acquire_refill_ownership()
+    first._owner_lock_file.close()
+    assert second._acquire_refill_ownership()
+
+
+def test_lru_eviction_and_legacy_import(tmp_path):
+    legacy = {
+        'entries': {'python|basics|mcq|2': {
+            'topic_name': 'Python', 'category': 'Basics', 'question_type': 'mcq', 'bucket': 2,
+            'questions': [{'id': 'q1', 'text': MCQ, 'created_at': 4102444800, 'served': 1}]
+        }},
+        'served': {'u1': ['q1']}
+    }
+    (tmp_path / 'question_bank.json').write_text(json.dumps(legacy))
+    question_bank = bank(tmp_path, max_keys=2)
+
+    assert question_bank.take('u1', 'Python', 'Basics', 'mcq', 0.5) is None
+    assert question_bank.take('u2', 'Python', 'Basics', 'mcq', 0.5)[1]['answer'] == 'B'
+
+    question_bank.take('u1', 'Rust', 'Basics', 'mcq', 0.5)
+    question_bank.take('u1', 'Go', 'Basics', 'mcq', 0.5)
+    stats = question_bank.stats()
+    assert (stats['keys'], stats['questions'], stats['evictions']) == (2, 0, 1)
+
+
+def test_coalesced_questions_are_banked_once(tmp_path):
+    question_bank = bank(tmp_path)
+    # Every caller sharing one generation call banks the same text
+    question_bank.add('Python', 'Basics', 'mcq', 0.5, MCQ, served_to='u1')
+    question_bank.add('Python', 'Basics', 'mcq', 0.5, MCQ, served_to='u2')
+    question_bank.add('Python', 'Basics', 'mcq', 0.5, MCQ)
+
+    assert question_bank.stats()['questions'] == 1
+    assert question_bank.take('u1', 'Python', 'Basics', 'mcq', 0.5) is None
+    assert question_bank.take('u2', 'Python', 'Basics', 'mcq', 0.5) is None
+    assert question_bank.take('u3', 'Python', 'Basics', 'mcq', 0.5)[0] == MCQ
+
+
+def test_banks_without_text_hashes_are_deduplicated(tmp_path):
+    path = tmp_path / 'question_bank.db'
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE questions (id TEXT PRIMARY KEY, key TEXT NOT NULL, text TEXT NOT NULL, parsed TEXT,
+                                created_at REAL NOT NULL, served INTEGER NOT NULL DEFAULT 0);
+        CREATE TABLE served (user_id TEXT NOT NULL, question_id TEXT NOT NULL, PRIMARY KEY (user_id, question_id));
+    """)
+    conn.executemany("INSERT INTO questions VALUES (?, 'python|basics|mcq|2', ?, NULL, 4102444800, 1)",
+                     [('q1', MCQ), ('q2', MCQ)])
+    conn.executemany("INSERT INTO served VALUES (?, ?)", [('u1', 'q1'), ('u2', 'q2')])
+    conn.commit()
+    conn.close()
+
+    question_bank = bank(tmp_path)
+    assert question_bank.stats()['questions'] == 1
+    assert question_bank.take('u1', 'Python', 'Basics', 'mcq', 0.5) is None
+    question_bank.add('Python', 'Basics', 'mcq', 0.5, MCQ)
+    assert question_bank.stats()['questions'] == 1
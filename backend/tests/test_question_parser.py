@@ -0,0 +1,129 @@
+import pytest
+
+from question_parser import _strict_fields, answer_key, fallback_question, grade_answer, parse_question
+
+MCQ = """QUESTION: Which container keeps its keys sorted?
+A) std::unordered_map
+B) std::map
+C) std::vector
+D) std::deque
+ANSWER: B
+EXPLANATION: std::map is a balanced tree ordered by key."""
+
+BLANK = """QUESTION: Binary search runs in _____ time.
+ANSWERS: [O(log n)|logarithmic| O(LOG N) ] (multiple valid answers separated by |, case insensitive)
+EXPLANATION: The range halves on every step."""
+
+CODE = """QUESTION: Implement a function that adds two numbers.
+REQUIREMENTS: Handle negative numbers.
+FUNCTION_SIGNATURE: int add(int a, int b)
+EXAMPLE_INPUT: 2, 3
+EXAMPLE_OUTPUT: 5"""
+
+
+def test_exact_prompt_format_takes_the_strict_path():
+    for question_type, text in (('mcq', MCQ), ('blank', BLANK), ('code', CODE)):
+        assert _strict_fields(question_type, text) is not None
+
+    assert parse_question('mcq', MCQ) == {
+        'question': 'Which container keeps its keys sorted?',
+        'options': {'A': 'std::unordered_map', 'B': 'std::map', 'C': 'std::vector', 'D': 'std::deque'},
+        'answer': 'B',
+        'explanation': 'std::map is a balanced tree ordered by key.'
+    }
+    assert parse_question('code', CODE) == {
+        'question': 'Implement a function that adds two numbers.',
+        'requirements': 'Handle negative numbers.',
+        'signature': 'int add(int a, int b)',
+        'example_input': '2, 3',
+        'example_output': '5'
+    }
+
+
+def test_blank_answers_are_split_on_pipes_and_normalized():
+    parsed = parse_question('blank', BLANK)
+    assert parsed['question'] == 'Binary search runs in _____ time.'
+    # The echoed "(multiple valid answers ...)" hint and the brackets are dropped; duplicates collapse
+    assert parsed['answers'] == ['o(log n)', 'logarithmic']
+
+    text = "QUESTION: A ___ is LIFO.\nANSWERS: `stack` | \"Stack\" |  call   stack\nEXPLANATION: -"
+    assert parse_question('blank', text)['answers'] == ['stack', 'call stack']
+
+
+@pytest.mark.parametrize('text', [
+    # Markdown bold labels and "A." options
+    """**Question:** Which container keeps its keys sorted?
+
+A. std::unordered_map
+B. std::map
+C. std::vector
+D. std::deque
+
+**Correct Answer:** B) std::map
+**Explanation:** std::map is a balanced tree ordered by key.""",
+    # Lowercase labels, "(A)" options, the question spread over two lines
+    """question: Which container
+keeps its keys sorted?
+(A) std::unordered_map
+(B) std::map
+(C) std::vector
+(D) std::deque
+answer: b
+explanation: std::map is a balanced tree ordered by key.""",
+])
+def test_mcq_variants_go_through_the_lenient_scan(text):
+    assert _strict_fields('mcq', text) is None
+    parsed = parse_question('mcq', text)
+    assert parsed['options']['B'] == 'std::map'
+    assert parsed['answer'] == 'B'
+    assert parsed['explanation'] == 'std::map is a balanced tree ordered by key.'
+
+
+def test_options_in_the_explanation_are_left_alone():
+    text = MCQ.replace("EXPLANATION: std::map is a balanced tree ordered by key.",
+                       "EXPLANATION: Unlike\nA. hashing, a tree keeps order.")
+    parsed = parse_question('mcq', text)
+    assert parsed['options']['A'] == 'std::unordered_map'
+    assert parsed['explanation'] == 'Unlike\nA. hashing, a tree keeps order.'
+
+
+@pytest.mark.parametrize('question_type, text', [
+    ('mcq', None),
+    ('mcq', ''),
+    ('mcq', 'Error: The LLM API is unavailable right now'),
+    # An option is missing
+    ('mcq', MCQ.replace('D) std::deque\n', '')),
+    # No answer letter
+    ('mcq', MCQ.replace('ANSWER: B', 'ANSWER: none of them')),
+    ('blank', 'QUESTION: A ___ is LIFO.\nANSWERS: \nEXPLANATION: -'),
+    ('code', 'REQUIREMENTS: nothing to implement'),
+    ('essay', MCQ),
+])
+def test_unusable_text_is_not_parsed(question_type, text):
+    assert parse_question(question_type, text) is None
+
+
+def test_grading_against_the_answer_key():
+    mcq_key = answer_key('mcq', parse_question('mcq', MCQ))
+    assert mcq_key == {'answer': 'B'}
+    assert grade_answer('mcq', mcq_key, ' b ') is True
+    assert grade_answer('mcq', mcq_key, 'A') is False
+
+    blank_key = answer_key('blank', parse_question('blank', BLANK))
+    assert grade_answer('blank', blank_key, '  Logarithmic ') is True
+    assert grade_answer('blank', blank_key, 'O(log   N)') is True
+    assert grade_answer('blank', blank_key, 'linear') is False
+
+
+@pytest.mark.parametrize('user_answer', [None, 2, ['B'], {'answer': 'B'}])
+def test_a_missing_answer_is_wrong_not_ungraded(user_answer):
+    assert grade_answer('mcq', {'answer': 'B'}, user_answer) is False
+    assert grade_answer('blank', {'answers': ['stack']}, user_answer) is False
+
+
+def test_questions_without_a_key_are_not_graded_locally():
+    assert answer_key('code', parse_question('code', CODE)) is None
+    assert answer_key('mcq', fallback_question('Error: upstream failed')) is None
+    assert answer_key('mcq', None) is None
+    assert grade_answer('mcq', None, 'B') is None
+    assert grade_answer('code', {'answer': 'B'}, 'B') is None
@@ -0,0 +1,104 @@
+import random
+from collections import Counter
+
+import pytest
+
+import engine
+from priority import DIVERSITY_PENALTY
+from sampling import SumTree, weighted_sample_without_replacement
+
+ITEMS = [
+    {'id': 'a1', 'category': 'a', 'priority': 4.0},
+    {'id': 'a2', 'category': 'a', 'priority': 2.0},
+    {'id': 'b1', 'category': 'b', 'priority': 3.0},
+    {'id': 'b2', 'category': 'b', 'priority': 0.0},
+    {'id': 'c1', 'category': None, 'priority': 1.0},
+    {'id': 'c2', 'category': None, 'priority': 1.5},
+]
+
+
+def test_sum_tree_totals_follow_updates():
+    tree = SumTree([1.0, 2.0, 3.0])
+    assert tree.total == 6.0 and tree.size == 4
+    tree.update(1, 0.5)
+    tree.update(0, 0.0)
+    assert tree.total == 3.5
+    assert [tree.get(i) for i in range(3)] == [0.0, 0.5, 3.0]
+    # Removing everything leaves no drift behind
+    for i in range(3):
+        tree.update(i, 0.0)
+    assert tree.total == 0.0
+
+
+def test_sum_tree_never_finds_zero_weight_leaves():
+    tree = SumTree([0.0, 1.0, 0.0, 2.0, 0.0])
+    assert tree.find(0.0) == 1
+    assert tree.find(0.999) == 1
+    assert tree.find(1.0) == 3
+    # r overshooting the total through rounding still lands on a weighted leaf
+    assert tree.find(3.0 + 1e-9) == 3
+    assert [tree.find(r / 10) for r in range(30)].count(1) == 10
+
+
+def test_picks_carry_the_category_penalty():
+    items = [{'id': f'a{i}', 'category': 'a', 'priority': 1.0} for i in range(3)]
+    items.append({'id': 'x', 'category': None, 'priority': 1.0})
+    chosen = weighted_sample_without_replacement(items, 4, rng=random.Random(0))
+
+    picked_from_a = 0
+    for pick in chosen:
+        if pick['category'] == 'a':
+            assert pick['priority'] == pytest.approx(DIVERSITY_PENALTY ** picked_from_a)
+            picked_from_a += 1
+        else:
+            # Items without a category are never penalized
+            assert pick['priority'] == 1.0
+    # The input is left untouched
+    assert all(item['priority'] == 1.0 for item in items)
+
+
+def test_seeded_runs_are_reproducible():
+    first = weighted_sample_without_replacement(ITEMS, 4, rng=random.Random(7))
+    second = weighted_sample_without_replacement(ITEMS, 4, rng=random.Random(7))
+    assert [pick['id'] for pick in first] == [pick['id'] for pick in second]
+
+
+def test_k_larger_than_the_population_returns_every_item_once():
+    chosen = weighted_sample_without_replacement(ITEMS, 50, rng=random.Random(1))
+    assert sorted(pick['id'] for pick in chosen) == sorted(item['id'] for item in ITEMS)
+    # Zero-weight items only come after every weighted one is gone
+    assert chosen[-1]['id'] == 'b2'
+    assert weighted_sample_without_replacement(ITEMS, 0) == []
+    assert weighted_sample_without_replacement([], 3) == []
+
+
+def test_all_zero_weights_fall_back_to_uniform_picks():
+    items = [{'id': i, 'category': 'a', 'priority': 0.0} for i in range(4)]
+    rng = random.Random(3)
+    counts = Counter()
+    for _ in range(4000):
+        chosen = weighted_sample_without_replacement(items, 2, rng=rng)
+        assert len({pick['id'] for pick in chosen}) == 2
+        counts[chosen[0]['id']] += 1
+    assert all(abs(count / 4000 - 0.25) < 0.03 for count in counts.values())
+
+
+def test_distribution_matches_the_linear_version():
+    trials = 20000
+    random.seed(11)
+    linear = Counter(
+        tuple(pick['id'] for pick in engine._weighted_sample_without_replacement(ITEMS, 3))
+        for _ in range(trials)
+    )
+    rng = random.Random(11)
+    tree = Counter(
+        tuple(pick['id'] for pick in weighted_sample_without_replacement(ITEMS, 3, rng=rng))
+        for _ in range(trials)
+    )
+
+    # Per-position frequencies of every item agree within sampling noise
+    for position in range(3):
+        for item in ITEMS:
+            p_linear = sum(n for picks, n in linear.items() if picks[position] == item['id']) / trials
+            p_tree = sum(n for picks, n in tree.items() if picks[position] == item['id']) / trials
+            assert abs(p_linear - p_tree) < 0.02, (position, item['id'], p_linear, p_tree)
@@ -0,0 +1,172 @@
+import ctypes
+import errno
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from code_grader import CodeGrader, RemoteCodeGrader, PASSED
+from sandbox import Sandbox, seccomp_filter, prlimit_command, SANDBOX_PRLIMIT
+
+PR_SET_NO_NEW_PRIVS = 38
+PR_SET_SECCOMP = 22
+SECCOMP_MODE_FILTER = 2
+CLONE_NEWUSER = 0x10000000
+
+QUESTION = '''QUESTION: Add two numbers.
+FUNCTION_SIGNATURE: int add(int a, int b)
+EXAMPLE_INPUT: 2, 3
+EXAMPLE_OUTPUT: 5
+'''
+
+
+class SockFprog(ctypes.Structure):
+    _fields_ = [('len', ctypes.c_ushort), ('filter', ctypes.c_void_p)]
+
+
+def run_filtered(check):
+    """Fork, load the seccomp filter in the child, run check() there and return its exit code"""
+    program = seccomp_filter()
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            buffer = ctypes.create_string_buffer(program, len(program))
+            fprog = SockFprog(len(program) // 8, ctypes.addressof(buffer))
+            if libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0) == 0 and \
+                    libc.prctl(PR_SET_SECCOMP, SECCOMP_MODE_FILTER, ctypes.byref(fprog), 0, 0) == 0:
+                code = 0 if check() else 2
+        finally:
+            os._exit(code)
+    return os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1])
+
+
+def denied(call):
+    try:
+        call()
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return False
+
+
+def forks():
+    pid = os.fork()
+    if pid == 0:
+        os._exit(7)
+    return os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1]) == 7
+
+
+def starts_thread():
+    results = []
+    thread = threading.Thread(target=results.append, args=(1,))
+    thread.start()
+    thread.join()
+    return results == [1]
+
+
+def unshares_user_namespace():
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.unshare(CLONE_NEWUSER) != 0:
+        raise OSError(ctypes.get_errno(), 'unshare failed')
+
+
+needs_seccomp = pytest.mark.skipif(not sys.platform.startswith('linux') or seccomp_filter() is None,
+                                   reason='seccomp filter is only built for Linux x86_64 and aarch64')
+# CI sets CODE_GRADER_REQUIRE_SANDBOX=1 so a sandbox that can't start fails the run instead of skipping
+REQUIRE_SANDBOX = os.getenv('CODE_GRADER_REQUIRE_SANDBOX') == '1'
+needs_bwrap = pytest.mark.skipif(not REQUIRE_SANDBOX and not Sandbox().available,
+                                 reason='bubblewrap sandbox cannot run here')
+
+
+@needs_seccomp
+def test_filter_denies_sockets():
+    assert run_filtered(lambda: denied(lambda: socket.socket(socket.AF_INET, socket.SOCK_STREAM))) == 0
+    assert run_filtered(lambda: denied(lambda: socket.socketpair())) == 0
+
+
+@needs_seccomp
+def test_filter_denies_new_namespaces():
+    assert run_filtered(lambda: denied(unshares_user_namespace)) == 0
+
+
+@needs_seccomp
+def test_filter_allows_fork_and_threads():
+    assert run_filtered(forks) == 0
+    assert run_filtered(starts_thread) == 0
+
+
+@pytest.mark.skipif(not os.path.exists(SANDBOX_PRLIMIT), reason='prlimit is not installed')
+def test_prlimit_command_sets_limits():
+    command = prlimit_command(cpu_seconds=3, memory_mb=64, file_bytes=1024, processes=5)
+    limits = 'RLIMIT_CPU RLIMIT_AS RLIMIT_FSIZE RLIMIT_NPROC RLIMIT_CORE'
+    script = f'import resource; print(*(resource.getrlimit(getattr(resource, n))[0] for n in {limits.split()!r}))'
+    result = subprocess.run(command + [sys.executable, '-c', script], capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ['3', str(64 * 1024 * 1024), '1024', '5', '0']
+
+
+def test_grader_is_unavailable_without_sandbox(tmp_path):
+    grader = CodeGrader(cache_dir=str(tmp_path), sandbox=Sandbox(bwrap='garudaco-missing-bwrap'))
+    assert not grader.available
+    assert grader.grade(QUESTION, 'int add(int a, int b) { return a + b; }') is None
+
+
+@needs_bwrap
+@pytest.mark.skipif(not REQUIRE_SANDBOX and shutil.which('g++') is None, reason='g++ is not installed')
+def test_sandboxed_program_cannot_see_backend(tmp_path, monkeypatch):
+    monkeypatch.setenv('JWT_SECRET', 'backend-secret')
+    grader = CodeGrader(cache_dir=str(tmp_path))
+    assert grader.grade(QUESTION, 'int add(int a, int b) { return a + b; }')['status'] == PASSED
+
+    leak = '''
+int add(int a, int b) {
+    std::ifstream environ("/proc/" + std::to_string(getppid()) + "/environ");
+    std::string text((std::istreambuf_iterator<char>(environ)), std::istreambuf_iterator<char>());
+    std::ifstream app("/app/app.py");
+    bool network = socket(AF_INET, SOCK_STREAM, 0) >= 0;
+    return text.find("backend-secret") != std::string::npos || app.good() || network ? -1 : a + b;
+}
+'''
+    grade = grader.grade(QUESTION, '#include <unistd.h>\n#include <sys/socket.h>\n' + leak)
+    assert grade['status'] == PASSED
+
+
+@pytest.fixture
+def grader_service(monkeypatch):
+    """grader_service.app on a local port, with its grader replaced by a stub"""
+    from werkzeug.serving import make_server
+    import grader_service
+
+    stub = SimpleNamespace(available=True, stats=lambda: {}, grade=lambda question, code: {'status': PASSED})
+    monkeypatch.setattr(grader_service, 'grader', stub)
+    server = make_server('127.0.0.1', 0, grader_service.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield stub, f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+
+
+def test_remote_grader_uses_the_grader_service(grader_service):
+    stub, url = grader_service
+    grader = RemoteCodeGrader(url)
+    assert grader.available
+    assert grader.grade(QUESTION, 'int add(int a, int b) { return a + b; }') == {'status': PASSED}
+
+    # A service without a working sandbox is unavailable, and grading falls back to the LLM review
+    stub.available = False
+    assert not RemoteCodeGrader(url).available
+    assert RemoteCodeGrader(url).grade(QUESTION, 'int add(int a, int b);') is None
+
+
+def test_remote_grader_is_unavailable_when_the_service_is_down():
+    with socket.socket() as listener:
+        listener.bind(('127.0.0.1', 0))
+        port = listener.getsockname()[1]
+    grader = RemoteCodeGrader(f'http://127.0.0.1:{port}')
+    assert not grader.available
+    assert grader.grade(QUESTION, 'int add(int a, int b);') is None
@@ -0,0 +1,74 @@
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import engine
+import priority
+from scoring import TopicColumns, calculate_priorities, compute_priorities
+
+NOW = datetime(2026, 3, 14, 12, 0, 0)
+
+
+class FrozenDatetime(datetime):
+    """The scalar functions read datetime.now() themselves; pin it to NOW"""
+
+    @classmethod
+    def now(cls, tz=None):
+        return NOW
+
+
+def random_topics(rng, count):
+    topics = []
+    for i in range(count):
+        attempts = rng.choice([0, 0, 1, 2, 5, 20])
+        topic = {
+            'topic_id': f't{i}',
+            'category': rng.choice(['a', 'b', 'c']),
+            'base_score': rng.randint(1, 100),
+            'attempts': attempts,
+            'successes': rng.randint(0, attempts),
+            # Fractional days, including brand-new topics and ones added long ago
+            'date_added': NOW - timedelta(days=rng.choice([0, rng.uniform(0, 14), rng.uniform(14, 400)])),
+            'last_seen': None
+        }
+        if rng.random() < 0.7:
+            topic['last_seen'] = NOW - timedelta(days=rng.uniform(0, 60))
+        if rng.random() < 0.5:
+            topic['rec_score_avg'] = rng.uniform(1, 100)
+        topics.append(topic)
+    return topics
+
+
+@pytest.fixture
+def frozen_now(monkeypatch):
+    monkeypatch.setattr(engine, 'datetime', FrozenDatetime)
+    monkeypatch.setattr(priority, 'datetime', FrozenDatetime)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_calculate_priorities_matches_the_scalar_version(frozen_now, seed):
+    topics = random_topics(random.Random(seed), 200)
+
+    expected = [engine.calculate_priority(topic, topics) for topic in topics]
+    assert np.allclose(calculate_priorities(topics, NOW), expected)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_compute_priorities_matches_the_scalar_version(seed):
+    topics = random_topics(random.Random(seed), 200)
+    # A topic without date_added counts as added now; one with date_added None was never added
+    topics.append({'topic_id': 'undated', 'category': 'a', 'base_score': 50, 'last_seen': None})
+    topics.append({'topic_id': 'none', 'category': 'a', 'base_score': 50, 'date_added': None, 'last_seen': None})
+
+    expected = [engine._compute_priority(topic, NOW)[0] for topic in topics]
+    assert np.allclose(compute_priorities(topics, NOW), expected)
+    # Columns built once can be shared by both scores
+    columns = TopicColumns(topics, NOW)
+    assert np.allclose(compute_priorities(topics, columns=columns), expected)
+
+
+def test_empty_topic_list():
+    assert calculate_priorities([], NOW).shape == (0,)
+    assert compute_priorities([], NOW).shape == (0,)
@@ -0,0 +1,191 @@
+import os
+import sqlite3
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+import storage
+from storage import BINARY_MAGIC, JSONFileStorage, SQLiteStorage, topic_added, topic_updated
+
+NOW = datetime(2026, 3, 1, 12, 30, 15, 123456)
+
+
+def make_topic(topic_id, **fields):
+    topic = {'topic_id': topic_id, 'topic_name': topic_id.upper(), 'category': 'c', 'base_score': 50,
+             'attempts': 0, 'successes': 0, 'date_added': NOW, 'last_seen': None, 'next_due': NOW}
+    topic.update(fields)
+    return topic
+
+
+@pytest.fixture(params=['json', 'msgpack', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'sqlite':
+        return SQLiteStorage(str(tmp_path / 'garudaco.db'))
+    return JSONFileStorage(str(tmp_path), request.param)
+
+
+def test_topics_round_trip(store):
+    assert store.load_topics('u1') is None
+    topics = [
+        make_topic('a', base_score=40, attempts=3, successes=2, last_seen=NOW - timedelta(days=2)),
+        # Fields without a column of their own survive too
+        make_topic('b', base_score=60.5, next_due=None, notes='only this topic has notes', rec_score_avg=72.5)
+    ]
+    store.ensure_user('u1')
+    store.save_topics('u1', topics)
+    assert store.load_topics('u1') == topics
+
+    store.apply_topic_changes('u1', [
+        topic_added(make_topic('c')),
+        topic_updated('a', {'attempts': 4, 'notes': 'added later'}),
+        topic_updated('missing', {'attempts': 1})
+    ])
+    loaded = store.load_topics('u1')
+    assert [topic['topic_id'] for topic in loaded] == ['a', 'b', 'c']
+    assert (loaded[0]['attempts'], loaded[0]['notes']) == (4, 'added later')
+
+    # A full save drops topics that are gone
+    store.save_topics('u1', loaded[1:])
+    assert [topic['topic_id'] for topic in store.load_topics('u1')] == ['b', 'c']
+    assert store.load_topics('u2') is None
+
+
+def test_profile_and_assessment_round_trip(store):
+    profile = {'user_id': 'u1', 'email': 'u1@example.com', 'created_at': NOW, 'last_login': NOW,
+               'total_assessments': 3}
+    store.save_profile('u1', profile)
+    assert store.load_profile('u1') == profile
+    assert store.user_exists('u1') and not store.user_exists('u2')
+    assert 'u1' in store.list_users()
+
+    assessment = {'set_id': 's1', 'timestamp': NOW, 'topics': [make_topic('a'), make_topic('b', last_seen=NOW)]}
+    store.save_assessment('u1', assessment)
+    assert store.load_assessment('u1') == assessment
+    # Saving doesn't convert the caller's dates
+    assert assessment['topics'][1]['last_seen'] == NOW
+
+    store.delete_assessment('u1')
+    assert store.load_assessment('u1') is None
+    assert store.load_profile('u2') is None
+
+
+def test_next_due_is_stored_and_updated(store):
+    store.save_topics('u1', [make_topic('a', next_due=None), make_topic('b')])
+    later = NOW + timedelta(days=3)
+    store.apply_topic_changes('u1', [topic_updated('a', {'next_due': later}), topic_updated('b', {'next_due': None})])
+    assert [topic['next_due'] for topic in store.load_topics('u1')] == [later, None]
+
+    if isinstance(store, SQLiteStorage):
+        # A real column (indexed per user), not part of `extra`
+        rows = store._connect().execute(
+            "SELECT topic_id, next_due, extra FROM topics WHERE user_id = 'u1' ORDER BY position"
+        ).fetchall()
+        assert rows == [('a', later.timestamp(), None), ('b', None, None)]
+
+
+def test_sqlite_adds_next_due_to_older_databases(tmp_path):
+    path = str(tmp_path / 'garudaco.db')
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE topics (user_id TEXT NOT NULL, topic_id TEXT NOT NULL, position INTEGER NOT NULL, "
+        "topic_name TEXT, category TEXT, base_score, attempts INTEGER, successes INTEGER, date_added REAL, "
+        "last_seen REAL, extra TEXT, PRIMARY KEY (user_id, topic_id))"
+    )
+    conn.execute("INSERT INTO topics (user_id, topic_id, position, topic_name) VALUES ('u1', 'a', 0, 'A')")
+    conn.commit()
+    conn.close()
+
+    store = SQLiteStorage(path)
+    assert store.load_topics('u1')[0]['next_due'] is None
+    store.apply_topic_changes('u1', [topic_updated('a', {'next_due': NOW})])
+    assert store.load_topics('u1')[0]['next_due'] == NOW
+
+
+def test_topics_version_changes_on_every_write(store):
+    versions = [store.topics_version('u1')]
+    store.ensure_user('u1')
+    store.save_topics('u1', [make_topic('a')])
+    versions.append(store.topics_version('u1'))
+    store.apply_topic_changes('u1', [topic_updated('a', {'attempts': 1})])
+    versions.append(store.topics_version('u1'))
+    store.save_topics('u1', [make_topic('a', attempts=2)])
+    versions.append(store.topics_version('u1'))
+
+    assert len(set(versions)) == len(versions)
+    # Reads and other documents leave it alone
+    store.load_topics('u1')
+    store.save_profile('u1', {'user_id': 'u1'})
+    assert store.topics_version('u1') == versions[-1]
+    if isinstance(store, SQLiteStorage):
+        assert versions == [0, 1, 2, 3]
+
+
+def test_convert_cli_rewrites_user_directories(tmp_path):
+    source = JSONFileStorage(str(tmp_path), 'json')
+    topics = [make_topic('a'), make_topic('b', notes='n')]
+    source.save_topics('u1', topics)
+    source.apply_topic_changes('u1', [topic_updated('a', {'attempts': 2})])
+    source.save_profile('u1', {'user_id': 'u1', 'created_at': NOW})
+    source.save_profile('u2', {'user_id': 'u2', 'created_at': NOW})
+
+    def convert(*args):
+        script = os.path.abspath(storage.__file__)
+        result = subprocess.run([sys.executable, script, '--data-dir', str(tmp_path), 'convert', *args],
+                                cwd=os.path.dirname(script), capture_output=True, text=True, check=True)
+        return result.stdout
+
+    assert 'Converted 1 user' in convert('--format', 'msgpack', 'u1')
+    for filename in (JSONFileStorage.TOPICS_FILE, 'profile.json'):
+        with open(tmp_path / 'u1' / filename, 'rb') as f:
+            assert f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+    with open(tmp_path / 'u2' / 'profile.json', 'rb') as f:
+        assert f.read(1) == b'{'
+    # The journal was folded into the converted snapshot
+    assert not os.path.exists(tmp_path / 'u1' / JSONFileStorage.JOURNAL_FILE)
+    assert JSONFileStorage(str(tmp_path)).load_topics('u1')[0]['attempts'] == 2
+
+    assert 'Converted 2 user' in convert('--format', 'json')
+    with open(tmp_path / 'u1' / JSONFileStorage.TOPICS_FILE, 'rb') as f:
+        assert f.read(1) == b'['
+    assert JSONFileStorage(str(tmp_path)).load_profile('u1') == {'user_id': 'u1', 'created_at': NOW}
+
+
+def test_journal_replay_after_crash_does_not_duplicate_topics(tmp_path, monkeypatch):
+    store = JSONFileStorage(str(tmp_path))
+    store.ensure_user('u1')
+    store.apply_topic_changes('u1', [
+        topic_added({'topic_id': 'a', 'topic_name': 'A', 'category': 'c', 'attempts': 0}),
+        topic_added({'topic_id': 'b', 'topic_name': 'B', 'category': 'c', 'attempts': 0}),
+        topic_updated('a', {'attempts': 2})
+    ])
+
+    # Crash after the snapshot was written but before the journal was removed
+    def crash(path):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(storage.os, 'remove', crash)
+    try:
+        store.compact_topics('u1')
+    except KeyboardInterrupt:
+        pass
+    monkeypatch.undo()
+
+    assert os.path.exists(tmp_path / 'u1' / store.JOURNAL_FILE)
+    assert [(topic['topic_id'], topic['attempts']) for topic in store.load_topics('u1')] == [('a', 2), ('b', 0)]
+
+
+def test_msgpack_topic_columns_round_trip(tmp_path):
+    now = datetime(2026, 3, 1, 12, 30, 15, 123456)
+    topics = [
+        {'topic_id': 'a', 'topic_name': 'A', 'category': 'c', 'base_score': 40, 'date_added': now,
+         'last_seen': None, 'next_due': now},
+        {'topic_id': 'b', 'topic_name': 'B', 'category': 'c', 'base_score': 60.5, 'date_added': now,
+         'next_due': now, 'notes': 'only this topic has notes'}
+    ]
+    store = JSONFileStorage(str(tmp_path), 'msgpack')
+    store.save_topics('u1', topics)
+    with open(tmp_path / 'u1' / store.TOPICS_FILE, 'rb') as f:
+        assert f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+    assert store.load_topics('u1') == topics
+    assert JSONFileStorage(str(tmp_path), 'json').load_topics('u1') == topics
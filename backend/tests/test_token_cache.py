@@ -0,0 +1,37 @@
+import os
+import time
+
+from token_cache import VerifiedTokenCache, token_digest
+
+
+def test_rewritten_log_with_reused_inode_is_read_from_the_start(tmp_path):
+    path = str(tmp_path / 'revoked_tokens.log')
+    exp = int(time.time()) + 3600
+    writer = VerifiedTokenCache(revoked_path=path, sync_seconds=0)
+    reader = VerifiedTokenCache(revoked_path=path, sync_seconds=0)
+    for token in ('a', 'b', 'c'):
+        writer.revoke(token_digest(token), exp)
+    reader._sync()
+    inode = os.stat(path).st_ino
+
+    # Another process compacts the log into a file that gets the same inode, then revokes a new token
+    with open(path, 'w') as f:
+        f.write(f"{token_digest('d')} {exp}\n")
+    assert os.stat(path).st_ino == inode
+    reader._sync()
+    assert reader.is_revoked(token_digest('d'))
+
+
+def test_compaction_drops_expired_revocations_atomically(tmp_path):
+    path = str(tmp_path / 'revoked_tokens.log')
+    now = int(time.time())
+    cache = VerifiedTokenCache(revoked_path=path, sync_seconds=0)
+    cache.revoke(token_digest('expired'), now - 10)
+    cache.revoke(token_digest('live'), now + 3600)
+    with cache._log_lock():
+        cache._compact()
+
+    assert sorted(os.listdir(tmp_path)) == ['revoked_tokens.log', 'revoked_tokens.log.lock']
+    with open(path) as f:
+        assert f.read() == f"{token_digest('live')} {now + 3600}\n"
+    assert VerifiedTokenCache(revoked_path=path, sync_seconds=0).is_revoked(token_digest('live'))
@@ -0,0 +1,111 @@
+import threading
+from collections import Counter
+
+import pytest
+
+from storage import JSONFileStorage, topic_added, topic_updated
+from user_manager import UserDataManager
+
+
+class CountingStorage(JSONFileStorage):
+    """Counts the document reads and writes that reach storage"""
+
+    def __init__(self, base_dir):
+        super().__init__(base_dir)
+        self.calls = Counter()
+
+    def load_topics(self, user_id):
+        self.calls['load_topics'] += 1
+        return super().load_topics(user_id)
+
+    def apply_topic_changes(self, user_id, changes):
+        self.calls['apply_topic_changes'] += 1
+        return super().apply_topic_changes(user_id, changes)
+
+    def load_profile(self, user_id):
+        self.calls['load_profile'] += 1
+        return super().load_profile(user_id)
+
+    def save_profile(self, user_id, profile):
+        self.calls['save_profile'] += 1
+        return super().save_profile(user_id, profile)
+
+    def save_assessment(self, user_id, assessment):
+        self.calls['save_assessment'] += 1
+        return super().save_assessment(user_id, assessment)
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = UserDataManager(storage=CountingStorage(str(tmp_path)))
+    manager.storage.ensure_user('u1')
+    manager.storage.apply_topic_changes('u1', [topic_added({'topic_id': 'a', 'topic_name': 'A', 'attempts': 0})])
+    manager.storage.calls.clear()
+    yield manager
+    manager.end_unit_of_work(flush=False)
+
+
+def lock_is_free(manager, user_id):
+    """Whether another thread can take the user's storage lock right now"""
+    acquired = threading.Event()
+
+    def take():
+        with manager.storage.lock_user(user_id):
+            acquired.set()
+    thread = threading.Thread(target=take, daemon=True)
+    thread.start()
+    return acquired.wait(0.5)
+
+
+def test_documents_are_loaded_once(manager):
+    unit = manager.begin_unit_of_work('u1')
+    for _ in range(3):
+        assert manager.load_user_topics('u1').get('a')['attempts'] == 0
+        manager.load_user_profile('u1')
+    assert unit.loads == 2
+    assert manager.storage.calls == Counter(load_topics=1, load_profile=1)
+
+
+def test_one_write_per_dirty_document(manager):
+    unit = manager.begin_unit_of_work('u1')
+    for attempts in range(1, 4):
+        manager.update_user_topics('u1', [topic_updated('a', {'attempts': attempts})])
+        profile = manager.load_user_profile('u1')
+        profile['total_assessments'] = attempts
+        manager.save_user_profile('u1', profile)
+        manager.save_user_current_assessment('u1', {'set_id': f's{attempts}', 'topics': []})
+    assert unit.writes == 0
+
+    manager.end_unit_of_work()
+    assert unit.writes == 3
+    calls = manager.storage.calls
+    assert (calls['apply_topic_changes'], calls['save_profile'], calls['save_assessment']) == (1, 1, 1)
+    assert manager.load_user_topics('u1').get('a')['attempts'] == 3
+    assert manager.load_user_profile('u1')['total_assessments'] == 3
+    assert manager.load_user_current_assessment('u1')['set_id'] == 's3'
+
+
+def test_commit_releases_the_lock_and_later_access_reloads(manager):
+    manager.begin_unit_of_work('u1')
+    manager.update_user_topics('u1', [topic_updated('a', {'attempts': 1})])
+    assert not lock_is_free(manager, 'u1')
+
+    manager.commit_unit_of_work()
+    assert lock_is_free(manager, 'u1')
+
+    # Another worker writes while this request does slow work
+    manager.storage.apply_topic_changes('u1', [topic_updated('a', {'attempts': 5})])
+    assert manager.load_user_topics('u1').get('a')['attempts'] == 5
+    assert manager.storage.calls['load_topics'] == 2
+    assert not lock_is_free(manager, 'u1')
+
+
+def test_units_are_confined_to_their_thread(manager):
+    manager.begin_unit_of_work('u1')
+    seen = []
+    thread = threading.Thread(target=lambda: seen.append(manager.current_unit_of_work()))
+    thread.start()
+    thread.join()
+    assert seen == [None]
+    assert manager.end_unit_of_work() is not None
+    assert manager.current_unit_of_work() is None
@@ -0,0 +1,13 @@
+from verification_cache import normalize_code
+
+
+def test_whitespace_only_edits_normalize_the_same():
+    assert normalize_code("int main() {\n    int  y = a - -b;\n\n  return 0;\n}\n") == \
+        normalize_code("int main(){\nint y=a- -b;\nreturn 0;\n}")
+
+
+def test_preprocessor_lines_keep_their_whitespace():
+    object_like = "#define SQ (x)\nint y = SQ(3);"
+    function_like = "#define SQ(x)\nint y = SQ(3);"
+    assert normalize_code(object_like) != normalize_code(function_like)
+    assert normalize_code("  #define M(x) \\\n    (x  + 1)\nint  a;") == "#define M(x) \\\n    (x  + 1)\nint a;"
@@ -0,0 +1,186 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from storage import atomic_write
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; the revocation log is then appended without a lock
+    fcntl = None
+
+# Verified tokens remembered per process (0 disables the cache)
+JWT_CACHE_SIZE = int(os.getenv('JWT_CACHE_SIZE', 1024))
+# Append-only log of revoked tokens, shared by every worker process
+REVOKED_TOKENS_PATH = os.getenv('REVOKED_TOKENS_PATH', os.path.join('data', 'revoked_tokens.log'))
+# Seconds between checks of the log for logouts recorded by other processes
+REVOCATION_SYNC_SECONDS = float(os.getenv('REVOCATION_SYNC_SECONDS', 1))
+# Once the log grows past this size it is rewritten without expired entries
+REVOCATION_LOG_MAX_BYTES = 1024 * 1024
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+class VerifiedTokenCache:
+    """Bounded LRU of verified JWTs plus the set of revoked ones.
+
+    Entries map a token's SHA-256 digest to (user_id, exp), so a token whose
+    signature was checked once is trusted until it expires without decoding
+    it again. Revoked digests are kept in memory until their token would have
+    expired and appended to a log file that other processes pick up within
+    REVOCATION_SYNC_SECONDS (only the new tail of the log is read).
+    """
+
+    def __init__(self, max_entries: int = JWT_CACHE_SIZE, revoked_path: str = REVOKED_TOKENS_PATH,
+                 sync_seconds: float = REVOCATION_SYNC_SECONDS):
+        self.max_entries = max_entries
+        self.revoked_path = revoked_path
+        self.sync_seconds = sync_seconds
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, Tuple[str, float]]' = OrderedDict()
+        self._revoked: Dict[str, float] = {}
+        self._log_inode = None
+        self._log_position = 0
+        self._next_sync = 0.0
+        self.hits = 0
+        self.misses = 0
+        self._sync()
+
+    def get(self, digest: str) -> Optional[str]:
+        """user_id of a verified, unexpired, unrevoked token, or None if it must be verified"""
+        self._maybe_sync()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    del self._entries[digest]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, digest: str, user_id: str, exp: float):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if digest in self._revoked:
+                return
+            self._entries[digest] = (user_id, exp)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def is_revoked(self, digest: str) -> bool:
+        with self._lock:
+            exp = self._revoked.get(digest)
+            return exp is not None and exp > time.time()
+
+    def revoke(self, digest: str, exp: float):
+        """Reject the token from now on, in this process immediately and in others after their next sync"""
+        with self._lock:
+            self._revoked[digest] = exp
+            self._entries.pop(digest, None)
+        try:
+            os.makedirs(os.path.dirname(self.revoked_path) or '.', exist_ok=True)
+            with self._log_lock():
+                with open(self.revoked_path, 'a') as f:
+                    f.write(f"{digest} {int(exp)}\n")
+                    size = f.tell()
+                if size > REVOCATION_LOG_MAX_BYTES:
+                    self._compact()
+        except OSError as e:
+            print(f"Error recording token revocation: {str(e)}")
+
+    # ---- revocation log ----
+
+    def _log_lock(self):
+        """Exclusive lock serializing appends and compaction across processes"""
+        return _FileLock(f"{self.revoked_path}.lock")
+
+    def _maybe_sync(self):
+        now = time.monotonic()
+        if now < self._next_sync:
+            return
+        self._next_sync = now + self.sync_seconds
+        self._sync()
+
+    def _sync(self):
+        """Read revocations appended since the last sync (all of them if the log was rewritten)"""
+        try:
+            with open(self.revoked_path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                with self._lock:
+                    # A rewrite may reuse the old inode, but then it is shorter than what was already read
+                    if stat.st_ino != self._log_inode or stat.st_size < self._log_position:
+                        self._log_inode = stat.st_ino
+                        self._log_position = 0
+                    f.seek(self._log_position)
+                    data = f.read()
+                    # Only consume complete lines; a concurrent append may be half written
+                    consumed = data.rfind(b'\n') + 1
+                    self._log_position += consumed
+                    now = time.time()
+                    for line in data[:consumed].decode('utf-8', 'replace').splitlines():
+                        parts = line.split()
+                        if len(parts) != 2 or not parts[1].isdigit():
+                            continue
+                        digest, exp = parts[0], float(parts[1])
+                        if exp > now:
+                            self._revoked[digest] = exp
+                            self._entries.pop(digest, None)
+                    for digest in [d for d, exp in self._revoked.items() if exp <= now]:
+                        del self._revoked[digest]
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            print(f"Error reading token revocations: {str(e)}")
+
+    def _compact(self):
+        """Rewrite the log with only unexpired revocations; callers hold the log lock"""
+        self._sync()
+        now = time.time()
+        with self._lock:
+            lines = ''.join(f"{digest} {int(exp)}\n" for digest, exp in self._revoked.items() if exp > now)
+        atomic_write(self.revoked_path, lines.encode('utf-8'))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'revoked': len(self._revoked),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class _FileLock:
+    """flock-based exclusive lock on a lock file (a no-op where fcntl is unavailable)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._file = open(self.path, 'a')
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+# Global verified-token cache used by AuthManager
+token_cache = VerifiedTokenCache()
@@ -0,0 +1,303 @@
+import bisect
+import random
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+
+def name_key(name: str) -> str:
+    """Normalize a topic name for duplicate detection"""
+    return name.strip().casefold()
+
+
+class DueIndex:
+    """Topic ids ordered by their stored next_due time.
+
+    Topics whose next_due is missing or None are tracked as unindexed so the
+    caller can treat them as candidates (and backfill them). Updates are
+    O(log n) searches plus a list insert, so a feedback submit only touches
+    the topics it changed.
+    """
+
+    def __init__(self, topics: Iterable[dict] = ()):
+        self._lock = threading.Lock()
+        self._due_at: Dict[str, float] = {}
+        self.unindexed = set()
+        for topic in topics:
+            next_due = topic.get('next_due')
+            if next_due is None:
+                self.unindexed.add(topic['topic_id'])
+            else:
+                self._due_at[topic['topic_id']] = next_due.timestamp()
+        self._order = sorted((due, topic_id) for topic_id, due in self._due_at.items())
+
+    def __len__(self) -> int:
+        return len(self._due_at) + len(self.unindexed)
+
+    def _discard(self, topic_id: str):
+        self.unindexed.discard(topic_id)
+        due = self._due_at.pop(topic_id, None)
+        if due is not None:
+            pos = bisect.bisect_left(self._order, (due, topic_id))
+            if pos < len(self._order) and self._order[pos] == (due, topic_id):
+                del self._order[pos]
+
+    def update(self, topic_id: str, next_due: Optional[datetime]):
+        """Insert or move a topic to its new due time"""
+        with self._lock:
+            self._discard(topic_id)
+            if next_due is None:
+                self.unindexed.add(topic_id)
+            else:
+                due = next_due.timestamp()
+                self._due_at[topic_id] = due
+                bisect.insort(self._order, (due, topic_id))
+
+    def update_topic(self, topic: dict):
+        self.update(topic['topic_id'], topic.get('next_due'))
+
+    def remove(self, topic_id: str):
+        with self._lock:
+            self._discard(topic_id)
+
+    def due_ids(self, now: datetime) -> List[str]:
+        """Return ids of indexed topics due at or before now, most overdue first"""
+        with self._lock:
+            end = bisect.bisect_right(self._order, (now.timestamp(), '\U0010ffff'))
+            return [topic_id for _, topic_id in self._order[:end]]
+
+    def sample_not_due(self, now: datetime, k: int, rng: Optional[random.Random] = None) -> List[str]:
+        """Return up to k random ids of indexed topics that are not yet due"""
+        rng = rng or random
+        with self._lock:
+            start = bisect.bisect_right(self._order, (now.timestamp(), '\U0010ffff'))
+            positions = rng.sample(range(start, len(self._order)), min(k, len(self._order) - start))
+            return [self._order[pos][1] for pos in positions]
+
+
+class FilterIndex:
+    """Category and date indexes used to answer filter dicts (see filters.py).
+
+    Categories map (casefolded) to sets of topic ids; date_added and
+    last_seen are kept as sorted (datetime, topic_id) lists so day-range
+    filters become a bisect plus a slice of the matching topics.
+    """
+
+    def __init__(self, topics: Iterable[dict] = ()):
+        self._lock = threading.Lock()
+        self.by_category: Dict[str, set] = {}
+        self.never_seen = set()
+        self._category_of: Dict[str, str] = {}
+        self._date_added: Dict[str, datetime] = {}
+        self._last_seen: Dict[str, datetime] = {}
+        for topic in topics:
+            self._add(topic)
+        self._added_order = sorted((added, topic_id) for topic_id, added in self._date_added.items())
+        self._seen_order = sorted((seen, topic_id) for topic_id, seen in self._last_seen.items())
+
+    def _add(self, topic: dict):
+        topic_id = topic['topic_id']
+        category = (topic.get('category') or '').casefold()
+        self._category_of[topic_id] = category
+        self.by_category.setdefault(category, set()).add(topic_id)
+        if topic.get('date_added'):
+            self._date_added[topic_id] = topic['date_added']
+        if topic.get('last_seen'):
+            self._last_seen[topic_id] = topic['last_seen']
+        else:
+            self.never_seen.add(topic_id)
+
+    @staticmethod
+    def _remove_sorted(order: list, entry: tuple):
+        pos = bisect.bisect_left(order, entry)
+        if pos < len(order) and order[pos] == entry:
+            del order[pos]
+
+    def _discard(self, topic_id: str):
+        category = self._category_of.pop(topic_id, None)
+        if category is not None:
+            self.by_category[category].discard(topic_id)
+        self.never_seen.discard(topic_id)
+        added = self._date_added.pop(topic_id, None)
+        if added is not None:
+            self._remove_sorted(self._added_order, (added, topic_id))
+        seen = self._last_seen.pop(topic_id, None)
+        if seen is not None:
+            self._remove_sorted(self._seen_order, (seen, topic_id))
+
+    def update_topic(self, topic: dict):
+        """Re-index one topic after its category or dates changed"""
+        topic_id = topic['topic_id']
+        with self._lock:
+            self._discard(topic_id)
+            self._add(topic)
+            if topic_id in self._date_added:
+                bisect.insort(self._added_order, (self._date_added[topic_id], topic_id))
+            if topic_id in self._last_seen:
+                bisect.insort(self._seen_order, (self._last_seen[topic_id], topic_id))
+
+    def category_ids(self, categories: Iterable[str]) -> set:
+        with self._lock:
+            ids = set()
+            for category in categories:
+                ids |= self.by_category.get(category.casefold(), set())
+            return ids
+
+    def added_after(self, cutoff: datetime) -> List[str]:
+        """Ids of topics whose date_added is strictly after cutoff"""
+        with self._lock:
+            start = bisect.bisect_right(self._added_order, (cutoff, '\U0010ffff'))
+            return [topic_id for _, topic_id in self._added_order[start:]]
+
+    def not_seen_since(self, cutoff: datetime) -> List[str]:
+        """Ids of topics last seen at or before cutoff, plus those never seen"""
+        with self._lock:
+            end = bisect.bisect_right(self._seen_order, (cutoff, '\U0010ffff'))
+            return [topic_id for _, topic_id in self._seen_order[:end]] + list(self.never_seen)
+
+
+class TopicCollection(list):
+    """List of topic dicts that keeps topic_id and casefolded-name indexes.
+
+    The indexes are built once when the collection is created and kept in
+    sync by the list mutators, so lookups are O(1) instead of linear scans.
+    Renaming a topic in place must go through rename() to keep the name index
+    current.
+
+    The due and filter indexes are built lazily on first use. A collection may
+    instead be handed shared instances (as the topic cache does); it then
+    reads them but drops its references rather than mutating them when the
+    list changes.
+    """
+
+    DERIVED_INDEXES = {'due': DueIndex, 'filter': FilterIndex}
+
+    def __init__(self, topics: Iterable[dict] = (), shared_indexes: Optional[Dict] = None):
+        super().__init__(topics)
+        self._derived = dict(shared_indexes or {})
+        self._owned = set()
+        self.reindex()
+
+    def reindex(self):
+        """Rebuild the id, name and position indexes from the current contents"""
+        self.by_id: Dict[str, dict] = {}
+        self.by_name: Dict[str, dict] = {}
+        self.position_of: Dict[str, int] = {}
+        for position, topic in enumerate(self):
+            self._index(topic, position)
+
+    def _index(self, topic: dict, position: int):
+        self.by_id[topic['topic_id']] = topic
+        self.position_of[topic['topic_id']] = position
+        if topic.get('topic_name'):
+            self.by_name.setdefault(name_key(topic['topic_name']), topic)
+
+    def _derived_index(self, name: str):
+        if name not in self._derived:
+            self._derived[name] = self.DERIVED_INDEXES[name](self)
+            self._owned.add(name)
+        return self._derived[name]
+
+    @property
+    def due_index(self) -> DueIndex:
+        return self._derived_index('due')
+
+    @property
+    def filter_index(self) -> FilterIndex:
+        return self._derived_index('filter')
+
+    def shared_indexes(self) -> Dict:
+        """Build (if needed) and return the derived indexes for sharing with copies of this collection"""
+        return {name: self._derived_index(name) for name in self.DERIVED_INDEXES}
+
+    def _derived_changed(self, topic: Optional[dict] = None):
+        """Keep owned derived indexes current for one topic; forget shared ones (or all, for bulk changes)"""
+        for name in list(self._derived):
+            if topic is not None and name in self._owned:
+                self._derived[name].update_topic(topic)
+            else:
+                del self._derived[name]
+                self._owned.discard(name)
+
+    def get(self, topic_id: str) -> Optional[dict]:
+        """Return the topic with the given id, or None"""
+        return self.by_id.get(topic_id)
+
+    def find_by_name(self, name: str) -> Optional[dict]:
+        """Return the topic whose name matches case-insensitively, or None"""
+        return self.by_name.get(name_key(name))
+
+    def rename(self, topic: dict, new_name: str):
+        topic['topic_name'] = new_name
+        self.reindex()
+
+    def apply_changes(self, changes: List[Dict]):
+        """Apply storage change records (see storage.topic_added/topic_updated), keeping every index current"""
+        for change in changes:
+            if change['op'] == 'add':
+                # An add for a topic that is already present overwrites it, as storage replay does
+                if self.get(change['topic']['topic_id']) is None:
+                    self.append(dict(change['topic']))
+                    continue
+                topic_id, fields = change['topic']['topic_id'], change['topic']
+            else:
+                topic_id, fields = change['topic_id'], change['fields']
+            topic = self.get(topic_id)
+            if topic is None:
+                continue
+            if change['op'] == 'add':
+                topic.clear()
+            topic.update(fields)
+            if 'topic_name' in fields:
+                self.reindex()
+            self._derived_changed(topic)
+
+    # ---- list mutators that keep the indexes current ----
+
+    def append(self, topic: dict):
+        super().append(topic)
+        self._index(topic, len(self) - 1)
+        self._derived_changed(topic)
+
+    def insert(self, index: int, topic: dict):
+        super().insert(index, topic)
+        self.reindex()
+        self._derived_changed(topic)
+
+    def extend(self, topics: Iterable[dict]):
+        topics = list(topics)
+        start = len(self)
+        super().extend(topics)
+        for offset, topic in enumerate(topics):
+            self._index(topic, start + offset)
+            self._derived_changed(topic)
+
+    def __iadd__(self, topics: Iterable[dict]):
+        self.extend(topics)
+        return self
+
+    def remove(self, topic: dict):
+        super().remove(topic)
+        self.reindex()
+        self._derived_changed()
+
+    def pop(self, index: int = -1) -> dict:
+        topic = super().pop(index)
+        self.reindex()
+        self._derived_changed()
+        return topic
+
+    def clear(self):
+        super().clear()
+        self.reindex()
+        self._derived_changed()
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        self.reindex()
+        self._derived_changed()
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self.reindex()
+        self._derived_changed()
@@ -1,151 +1,371 @@
-import json
 import os
+import threading
+from collections import OrderedDict
+from contextvars import ContextVar
 from datetime import datetime
 from typing import Dict, List, Optional
+from storage import StorageBackend, create_storage
+from topic_index import TopicCollection
+
+# Maximum number of users whose parsed topic lists are kept in memory (0 disables the cache)
+TOPIC_CACHE_SIZE = int(os.getenv('TOPIC_CACHE_SIZE', 256))
+
+# The unit of work of the request running in this thread or task, see UserDataManager
+_current_unit: ContextVar[Optional['UserUnitOfWork']] = ContextVar('user_unit_of_work', default=None)
+
+class TopicCache:
+    """Bounded LRU cache of parsed topic lists keyed by user_id.
+
+    Each entry is tagged with the storage version it was loaded at, so a
+    write from another process (newer mtime/version) is never served stale.
+    Callers get shallow copies of the topic dicts and may mutate them freely.
+    """
+
+    def __init__(self, max_entries: int = TOPIC_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id: str, version) -> Optional[TopicCollection]:
+        """Return a copy of the cached topics if they were loaded at `version`"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            snapshot = entry[1]
+            # Copied under the lock: apply_changes patches the snapshot's dicts in place
+            return TopicCollection([dict(topic) for topic in snapshot], shared_indexes=snapshot.shared_indexes())
+
+    def put(self, user_id: str, version, topics: List[dict]):
+        if self.max_entries <= 0:
+            return
+        snapshot = TopicCollection(dict(topic) for topic in topics)
+        with self._lock:
+            self._entries[user_id] = (version, snapshot)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def apply_changes(self, user_id: str, version_before, version_after, changes: List[Dict]):
+        """Patch a cached entry (and its due index) after a write instead of dropping it.
+
+        The entry is only patched if it was current before the write; otherwise
+        it is invalidated and the next load re-reads storage.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            if entry[0] != version_before:
+                del self._entries[user_id]
+                return
+            snapshot = entry[1]
+            snapshot.apply_changes(changes)
+            self._entries[user_id] = (version_after, snapshot)
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters for sizing the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+class UserUnitOfWork:
+    """Request-scoped view of one user's documents.
+
+    Topics, profile and current assessment are each loaded from storage at
+    most once per request. Saves only replace the in-memory copy and mark it
+    dirty, topic change records are collected into one batch, and flush()
+    writes every dirty document once. loads/writes count the storage
+    operations the request caused.
+
+    The first access takes the user's storage lock and release() drops it,
+    so the request's read-modify-write can't interleave with another worker
+    process handling the same user. Requests that go on to slow work (LLM
+    calls, code grading) commit first, so the lock only spans load-then-flush
+    and the next access reloads under a fresh lock.
+    """
+
+    def __init__(self, manager: 'UserDataManager', user_id: str):
+        self.manager = manager
+        self.user_id = user_id
+        self._documents: Dict[str, object] = {}
+        self._dirty = set()
+        self._topic_changes: List[Dict] = []
+        self._exists: Optional[bool] = None
+        self._locked = False
+        self.loads = 0
+        self.writes = 0
+
+    def _lock(self):
+        locks = self.manager.storage.user_locks
+        if not self._locked and locks is not None:
+            locks.acquire(self.user_id)
+            self._locked = True
+
+    def release(self):
+        """Drop the user's storage lock and anything loaded under it; call after flush"""
+        self._documents.clear()
+        self._dirty.clear()
+        self._topic_changes = []
+        self._exists = None
+        if self._locked:
+            self._locked = False
+            self.manager.storage.user_locks.release(self.user_id)
+
+    def _load(self, name: str, loader):
+        self._lock()
+        if name not in self._documents:
+            self._documents[name] = loader(self.user_id)
+            self.loads += 1
+        return self._documents[name]
+
+    def _save(self, name: str, value):
+        self._lock()
+        self._documents[name] = value
+        self._dirty.add(name)
+
+    def topics(self) -> TopicCollection:
+        return self._load('topics', self.manager._read_topics)
+
+    def update_topics(self, changes: List[Dict]):
+        topics = self.topics()
+        # Callers may have added the new topics to the collection they loaded already (import_topics does)
+        topics.apply_changes([
+            change for change in changes
+            if change['op'] != 'add' or topics.get(change['topic']['topic_id']) is None
+        ])
+        self._topic_changes.extend(changes)
+
+    def replace_topics(self, topics_data: List[dict]):
+        """Rewrite every topic now; pending changes are written first and the topics reload on next use"""
+        self._lock()
+        self.flush()
+        self._documents.pop('topics', None)
+        self.manager._write_topics(self.user_id, topics_data)
+        self.writes += 1
+
+    def profile(self) -> Dict:
+        return self._load('profile', self.manager._read_profile)
+
+    def save_profile(self, profile_data: Dict):
+        self._save('profile', profile_data)
+
+    def assessment(self) -> Optional[Dict]:
+        return self._load('assessment', self.manager.storage.load_assessment)
+
+    def save_assessment(self, assessment_data: Optional[Dict]):
+        """Replace the current assessment; None deletes it"""
+        self._save('assessment', assessment_data)
+
+    def exists(self) -> bool:
+        if self._dirty or self._topic_changes:
+            return True
+        if self._exists is None:
+            self._lock()
+            self._exists = self.manager.storage.user_exists(self.user_id)
+            self.loads += 1
+        return self._exists
+
+    def flush(self):
+        """Write every pending change, one storage write per document"""
+        if self._topic_changes:
+            changes, self._topic_changes = self._topic_changes, []
+            self.manager._write_topic_changes(self.user_id, changes)
+            self.writes += 1
+        for name in sorted(self._dirty):
+            value = self._documents[name]
+            if name == 'profile':
+                self.manager.storage.save_profile(self.user_id, value)
+            elif value is None:
+                self.manager.storage.delete_assessment(self.user_id)
+            else:
+                self.manager.storage.save_assessment(self.user_id, value)
+            self.writes += 1
+        self._dirty.clear()
 
 class UserDataManager:
-    """Manages user-specific data storage and retrieval"""
+    """Manages user-specific data storage and retrieval
     
-    def __init__(self, base_dir: str = "data"):
+    Inside a request that called begin_unit_of_work(user_id), that user's
+    documents go through the request's UserUnitOfWork, so repeated loads hit
+    memory and writes are deferred to its flush(). The unit is kept in a
+    context variable, so each request thread or task sees only its own, and
+    the web layer decides when a unit begins and ends.
+    """
+
+    def __init__(self, base_dir: str = "data", storage: Optional[StorageBackend] = None):
         self.base_dir = base_dir
-        self.ensure_base_dir()
-    
-    def ensure_base_dir(self):
-        """Ensure the base directory for user data exists"""
-        if not os.path.exists(self.base_dir):
-            os.makedirs(self.base_dir)
-    
-    def get_user_dir(self, user_id: str) -> str:
-        """Get the directory path for a specific user"""
-        user_dir = os.path.join(self.base_dir, user_id)
-        if not os.path.exists(user_dir):
-            os.makedirs(user_dir)
-        return user_dir
-    
-    def ensure_user_directory(self, user_id: str) -> str:
-        """Ensure user directory exists - alias for get_user_dir"""
-        return self.get_user_dir(user_id)
-    
-    def get_user_file_path(self, user_id: str, filename: str) -> str:
-        """Get the full file path for a user-specific file"""
-        return os.path.join(self.get_user_dir(user_id), filename)
-    
-    def load_user_topics(self, user_id: str) -> List[dict]:
-        """Load topics data for a specific user"""
-        file_path = self.get_user_file_path(user_id, "topics_data.json")
+        # Pluggable backend: JSON files per user (default) or SQLite, see STORAGE_BACKEND
+        self.storage = storage or create_storage(base_dir=base_dir)
+        self.topic_cache = TopicCache()
+
+    def ensure_user_directory(self, user_id: str):
+        """Ensure storage for a user exists"""
+        self.storage.ensure_user(user_id)
+
+    # ---- request-scoped unit of work ----
+
+    def begin_unit_of_work(self, user_id: str) -> UserUnitOfWork:
+        """Route this user's loads and saves through a unit of work for the rest of the request"""
+        unit = UserUnitOfWork(self, user_id)
+        _current_unit.set(unit)
+        return unit
+
+    def current_unit_of_work(self) -> Optional[UserUnitOfWork]:
+        unit = _current_unit.get()
+        return unit if unit is not None and unit.manager is self else None
+
+    def commit_unit_of_work(self):
+        """Write the request's pending changes and drop the user's lock before slow work
+
+        The unit stays attached: later loads read storage again under a new lock.
+        """
+        unit = self.current_unit_of_work()
+        if unit is None:
+            return
         try:
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-                # Convert datetime strings back to datetime objects
-                for topic in data:
-                    if topic.get('date_added'):
-                        topic['date_added'] = datetime.fromisoformat(topic['date_added'])
-                    if topic.get('last_seen'):
-                        topic['last_seen'] = datetime.fromisoformat(topic['last_seen'])
-                return data
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
-    
+            unit.flush()
+        finally:
+            unit.release()
+
+    def end_unit_of_work(self, flush: bool = True) -> Optional[UserUnitOfWork]:
+        """Detach the request's unit of work, writing its pending changes unless flush is False"""
+        unit = self.current_unit_of_work()
+        if unit is None:
+            return None
+        _current_unit.set(None)
+        try:
+            if flush:
+                unit.flush()
+        finally:
+            unit.release()
+        return unit
+
+    def _unit(self, user_id: str) -> Optional[UserUnitOfWork]:
+        unit = self.current_unit_of_work()
+        return unit if unit is not None and unit.user_id == user_id else None
+
+    # ---- documents ----
+
+    def load_user_topics(self, user_id: str) -> TopicCollection:
+        """Load topics data for a specific user, indexed by topic_id and name"""
+        unit = self._unit(user_id)
+        return unit.topics() if unit is not None else self._read_topics(user_id)
+
+    def _read_topics(self, user_id: str) -> TopicCollection:
+        version = self.storage.topics_version(user_id)
+        topics = self.topic_cache.get(user_id, version)
+        if topics is not None:
+            return topics
+
+        topics = self.storage.load_topics(user_id)
+        if topics is None:
+            return TopicCollection()
+        self.topic_cache.put(user_id, version, topics)
+        return TopicCollection(topics)
+
     def save_user_topics(self, user_id: str, topics_data: List[dict]):
         """Save topics data for a specific user"""
-        file_path = self.get_user_file_path(user_id, "topics_data.json")
-        # Convert datetime objects to strings for JSON serialization
-        serializable_data = []
-        for topic in topics_data:
-            topic_copy = topic.copy()
-            if topic_copy.get('date_added'):
-                topic_copy['date_added'] = topic_copy['date_added'].isoformat()
-            if topic_copy.get('last_seen'):
-                topic_copy['last_seen'] = topic_copy['last_seen'].isoformat()
-            serializable_data.append(topic_copy)
-        
-        with open(file_path, 'w') as f:
-            json.dump(serializable_data, f, indent=2)
-    
+        unit = self._unit(user_id)
+        if unit is not None:
+            unit.replace_topics(topics_data)
+        else:
+            self._write_topics(user_id, topics_data)
+
+    def _write_topics(self, user_id: str, topics_data: List[dict]):
+        self.topic_cache.invalidate(user_id)
+        self.storage.save_topics(user_id, topics_data)
+
+    def update_user_topics(self, user_id: str, changes: List[Dict]):
+        """Persist only the given topic change records instead of rewriting every topic"""
+        unit = self._unit(user_id)
+        if unit is not None:
+            unit.update_topics(changes)
+        else:
+            self._write_topic_changes(user_id, changes)
+
+    def _write_topic_changes(self, user_id: str, changes: List[Dict]):
+        version_before = self.storage.topics_version(user_id)
+        self.storage.apply_topic_changes(user_id, changes)
+        self.topic_cache.apply_changes(user_id, version_before, self.storage.topics_version(user_id), changes)
+
     def load_user_current_assessment(self, user_id: str) -> Optional[Dict]:
         """Load current assessment data for a specific user"""
-        file_path = self.get_user_file_path(user_id, "current_assessment.json")
-        try:
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-                # Convert datetime strings back to datetime objects
-                if data.get('timestamp'):
-                    data['timestamp'] = datetime.fromisoformat(data['timestamp'])
-                for topic in data.get('topics', []):
-                    if topic.get('date_added'):
-                        topic['date_added'] = datetime.fromisoformat(topic['date_added'])
-                    if topic.get('last_seen'):
-                        topic['last_seen'] = datetime.fromisoformat(topic['last_seen'])
-                return data
-        except (FileNotFoundError, json.JSONDecodeError):
-            return None
-    
+        unit = self._unit(user_id)
+        return unit.assessment() if unit is not None else self.storage.load_assessment(user_id)
+
     def save_user_current_assessment(self, user_id: str, assessment_data: Dict):
         """Save current assessment data for a specific user"""
-        file_path = self.get_user_file_path(user_id, "current_assessment.json")
-        # Convert datetime objects to strings for JSON serialization
-        serializable_data = assessment_data.copy()
-        if serializable_data.get('timestamp'):
-            serializable_data['timestamp'] = serializable_data['timestamp'].isoformat()
-        
-        for topic in serializable_data.get('topics', []):
-            if topic.get('date_added'):
-                topic['date_added'] = topic['date_added'].isoformat()
-            if topic.get('last_seen'):
-                topic['last_seen'] = topic['last_seen'].isoformat()
-        
-        with open(file_path, 'w') as f:
-            json.dump(serializable_data, f, indent=2)
-    
+        unit = self._unit(user_id)
+        if unit is not None:
+            unit.save_assessment(assessment_data)
+        else:
+            self.storage.save_assessment(user_id, assessment_data)
+
     def clear_user_current_assessment(self, user_id: str):
         """Clear current assessment data for a specific user"""
-        file_path = self.get_user_file_path(user_id, "current_assessment.json")
-        if os.path.exists(file_path):
-            os.remove(file_path)
-    
+        unit = self._unit(user_id)
+        if unit is not None:
+            unit.save_assessment(None)
+        else:
+            self.storage.delete_assessment(user_id)
+
     def load_user_profile(self, user_id: str) -> Dict:
         """Load user profile data"""
-        file_path = self.get_user_file_path(user_id, "profile.json")
-        try:
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-                if data.get('created_at'):
-                    data['created_at'] = datetime.fromisoformat(data['created_at'])
-                if data.get('last_login'):
-                    data['last_login'] = datetime.fromisoformat(data['last_login'])
-                return data
-        except (FileNotFoundError, json.JSONDecodeError):
-            # Return default profile for new users
-            return {
-                'user_id': user_id,
-                'created_at': datetime.now(),
-                'last_login': datetime.now(),
-                'total_assessments': 0,
-                'total_topics_added': 0
-            }
-    
+        unit = self._unit(user_id)
+        return unit.profile() if unit is not None else self._read_profile(user_id)
+
+    def _read_profile(self, user_id: str) -> Dict:
+        profile = self.storage.load_profile(user_id)
+        if profile is not None:
+            return profile
+        # Return default profile for new users
+        return {
+            'user_id': user_id,
+            'created_at': datetime.now(),
+            'last_login': datetime.now(),
+            'total_assessments': 0,
+            'total_topics_added': 0
+        }
+
     def save_user_profile(self, user_id: str, profile_data: Dict):
         """Save user profile data"""
-        file_path = self.get_user_file_path(user_id, "profile.json")
-        # Convert datetime objects to strings for JSON serialization
-        serializable_data = profile_data.copy()
-        if serializable_data.get('created_at'):
-            serializable_data['created_at'] = serializable_data['created_at'].isoformat()
-        if serializable_data.get('last_login'):
-            serializable_data['last_login'] = serializable_data['last_login'].isoformat()
-        
-        with open(file_path, 'w') as f:
-            json.dump(serializable_data, f, indent=2)
-    
+        unit = self._unit(user_id)
+        if unit is not None:
+            unit.save_profile(profile_data)
+        else:
+            self.storage.save_profile(user_id, profile_data)
+
     def user_exists(self, user_id: str) -> bool:
-        """Check if a user directory exists"""
-        return os.path.exists(self.get_user_dir(user_id))
-    
+        """Check if a user has any stored data"""
+        unit = self._unit(user_id)
+        return unit.exists() if unit is not None else self.storage.user_exists(user_id)
+
     def get_all_users(self) -> List[str]:
         """Get list of all user IDs"""
-        if not os.path.exists(self.base_dir):
-            return []
-        return [d for d in os.listdir(self.base_dir) if os.path.isdir(os.path.join(self.base_dir, d))]
+        return self.storage.list_users()
 
 # Global instance
-user_data_manager = UserDataManager()
\ No newline at end of file
+user_data_manager = UserDataManager()
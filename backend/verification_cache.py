@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from storage import atomic_write
+
+VERIFICATION_CACHE_DIR = os.getenv('VERIFICATION_CACHE_DIR', os.path.join('data', 'verification_cache'))
+VERIFICATION_CACHE_SIZE = int(os.getenv('VERIFICATION_CACHE_SIZE', 5000))
+VERIFICATION_CACHE_TTL_DAYS = float(os.getenv('VERIFICATION_CACHE_TTL_DAYS', 30))
+
+# String and character literals and preprocessor lines (with their \ continuations) keep their whitespace;
+# everything else is normalized. In a #define it is significant: SQ (x) is not the function-like macro SQ(x)
+VERBATIM_PATTERN = re.compile(r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|^[ \t]*#(?:\\\n|[^\n])*', re.MULTILINE)
+# Whitespace between two of these could change how tokens split (a - -b vs a --b)
+OPERATOR_CHARS = set('+-*/%<>=&|!^:.')
+
+
+def normalize_code(code: str) -> str:
+    """Drop indentation, blank lines and spacing that doesn't separate tokens, so whitespace-only edits hash the same
+
+    Literals and preprocessor lines are kept as written.
+    """
+    parts = []
+    position = 0
+    for match in VERBATIM_PATTERN.finditer(code):
+        parts.append(_squeeze(code[position:match.start()]))
+        # Only the indentation before a preprocessor directive is dropped
+        parts.append(match.group(0).lstrip(' \t'))
+        position = match.end()
+    parts.append(_squeeze(code[position:]))
+    return ''.join(parts).strip()
+
+
+def _squeeze(segment: str) -> str:
+    def replace(match):
+        # Line breaks end // comments and preprocessor lines, so runs containing one stay a line break
+        if '\n' in match.group(0):
+            return '\n'
+        before = segment[match.start() - 1] if match.start() > 0 else ''
+        after = segment[match.end()] if match.end() < len(segment) else ''
+        if (before.isalnum() or before == '_') and (after.isalnum() or after == '_'):
+            return ' '
+        if before in OPERATOR_CHARS and after in OPERATOR_CHARS and before and after:
+            return ' '
+        return ''
+    return re.sub(r'\s+', replace, segment)
+
+
+class VerificationCache:
+    """Content-addressed cache of /api/verify-code results.
+
+    Entries are keyed by a SHA-256 of the question text and the normalized
+    code, so resubmissions that only differ in whitespace hit the cache. Each
+    entry is one JSON file under cache_dir; an in-memory LRU order (rebuilt
+    from file mtimes at startup) bounds the count, and entries older than the
+    TTL are treated as misses and removed.
+    """
+
+    def __init__(self, cache_dir: str = VERIFICATION_CACHE_DIR, max_entries: int = VERIFICATION_CACHE_SIZE,
+                 ttl_days: float = VERIFICATION_CACHE_TTL_DAYS):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_days * 86400
+        self._lock = threading.Lock()
+        self._order: 'OrderedDict[str, None]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load_index()
+
+    @staticmethod
+    def key(question: str, code: str) -> str:
+        return hashlib.sha256(f"{question.strip()}\0{normalize_code(code)}".encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load_index(self):
+        if self.max_entries <= 0 or not os.path.isdir(self.cache_dir):
+            return
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.json'):
+                path = os.path.join(self.cache_dir, name)
+                entries.append((os.path.getmtime(path), name[:-len('.json')]))
+        for _, key in sorted(entries):
+            self._order[key] = None
+
+    def _remove(self, key: str):
+        self._order.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the cached result for key, or None"""
+        if self.max_entries <= 0:
+            return None
+        with self._lock:
+            if key not in self._order:
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(key), 'r') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                self._remove(key)
+                self.misses += 1
+                return None
+            if time.time() - entry['cached_at'] > self.ttl_seconds:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._order.move_to_end(key)
+            os.utime(self._path(key))
+            self.hits += 1
+            return entry['result']
+
+    def put(self, key: str, result: Dict):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                payload = json.dumps({'cached_at': time.time(), 'result': result})
+                atomic_write(self._path(key), payload.encode('utf-8'))
+            except OSError as e:
+                print(f"Error writing verification cache: {str(e)}")
+                return
+            self._order[key] = None
+            self._order.move_to_end(key)
+            while len(self._order) > self.max_entries:
+                oldest = next(iter(self._order))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._order),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'evictions': self.evictions
+            }
+
+
+# Global verification cache instance
+verification_cache = VerificationCache()
@@ -3,7 +3,7 @@ import { useNavigate } from 'react-router-dom';
 import { CheckCircle, XCircle, Code, Play, ArrowRight, BookOpen, Filter, X } from 'lucide-react';
 import ReactMarkdown from 'react-markdown';
 import Editor from '@monaco-editor/react';
-import { Assessment as AssessmentType, AssessmentResult, MCQOptions, AssessmentFilters } from '../types';
+import { Assessment as AssessmentType, AssessmentResult, MCQOptions, AssessmentFilters, ParsedQuestion } from '../types';
 import { apiService } from '../services/api';
 
 const Assessment: React.FC = () => {
@@ -56,16 +56,33 @@ int main() {
 
   const currentQuestion = assessment?.questions[currentQuestionIndex];
 
+  const showAssessment = (assessmentData: AssessmentType) => {
+    setAssessment(assessmentData);
+    setPhase('assessment');
+    setCurrentQuestionIndex(0);
+    setShowAnswer(false);
+    setUserAnswer('');
+    setUserCode(`// Write your C++ code here...
+#include <iostream>
+#include <vector>
+using namespace std;
+
+int main() {
+    // Your implementation
+    return 0;
+}`);
+    setCodeVerification('');
+    setResults([]);
+  };
+
   const startAssessment = async () => {
     setIsGenerating(true);
     try {
-      let assessmentData;
-      
       if (useAdvancedMode) {
         // Use advanced sorting mode
         const response = await apiService.generateAssessmentAdvanced(questionCount, sortBy, sortOrder);
-        assessmentData = response;
         setSortInfo(response.sort_info);
+        showAssessment(response);
       } else {
         // Use normal priority-based mode with filters
         const assessmentFilters: AssessmentFilters = {};
@@ -86,78 +103,57 @@ int main() {
           assessmentFilters.categories = selectedCategories;
         }
         
-        assessmentData = await apiService.generateAssessment(
+        setSortInfo(null);
+        // Stream the questions so the first one shows while the rest are still being generated
+        await apiService.generateAssessmentStream(
           questionCount, 
-          Object.keys(assessmentFilters).length > 0 ? assessmentFilters : undefined
+          Object.keys(assessmentFilters).length > 0 ? assessmentFilters : undefined,
+          (assessmentData) => {
+            showAssessment(assessmentData);
+            setIsGenerating(false);
+          },
+          (question) => {
+            setAssessment(prev => prev && {
+              ...prev,
+              questions: prev.questions.map(q => (q.rec_no === question.rec_no ? question : q)),
+            });
+          }
         );
-        setSortInfo(null);
       }
-      
-      setAssessment(assessmentData);
-      setPhase('assessment');
-      setCurrentQuestionIndex(0);
-      setShowAnswer(false);
-      setUserAnswer('');
-      setUserCode(`// Write your C++ code here...
-#include <iostream>
-#include <vector>
-using namespace std;
-
-int main() {
-    // Your implementation
-    return 0;
-}`);
-      setCodeVerification('');
-      setResults([]);
     } catch (error) {
       console.error('Error generating assessment:', error);
       alert('Failed to generate assessment. Please try again.');
     } finally {
       setIsGenerating(false);
     }
-  };  const parseMCQQuestion = (questionText: string): { question: string; options: MCQOptions; explanation: string } => {
-    const lines = questionText.split('\n').filter(line => line.trim());
-    const question = lines.find(line => line.startsWith('QUESTION:'))?.replace('QUESTION:', '').trim() || '';
-    const optionA = lines.find(line => line.trim().startsWith('A)'))?.replace(/^A\)/, '').trim() || '';
-    const optionB = lines.find(line => line.trim().startsWith('B)'))?.replace(/^B\)/, '').trim() || '';
-    const optionC = lines.find(line => line.trim().startsWith('C)'))?.replace(/^C\)/, '').trim() || '';
-    const optionD = lines.find(line => line.trim().startsWith('D)'))?.replace(/^D\)/, '').trim() || '';
-    const correct = lines.find(line => line.startsWith('ANSWER:'))?.replace('ANSWER:', '').trim() || '';
-    const explanation = lines.find(line => line.startsWith('EXPLANATION:'))?.replace('EXPLANATION:', '').trim() || '';
+  };
 
+  // Questions arrive already parsed by the backend; these only shape them for rendering
+  const mcqView = (parsed: ParsedQuestion): { question: string; options: MCQOptions; explanation: string } => {
+    const options = parsed.options || { A: '', B: '', C: '', D: '' };
     return {
-      question,
-      options: { A: optionA, B: optionB, C: optionC, D: optionD, correct },
-      explanation
+      question: parsed.question,
+      options: { ...options, correct: parsed.answer || '' },
+      explanation: parsed.explanation || ''
     };
   };
 
-  const parseBlankQuestion = (questionText: string): { question: string; answers: string[]; explanation: string } => {
-    const lines = questionText.split('\n').filter(line => line.trim());
-    const question = lines.find(line => line.startsWith('QUESTION:'))?.replace('QUESTION:', '').trim() || '';
-    const answersLine = lines.find(line => line.startsWith('ANSWERS:'))?.replace('ANSWERS:', '').trim() || '';
-    const answers = answersLine.split('|').map(ans => ans.trim().toLowerCase());
-    const explanation = lines.find(line => line.startsWith('EXPLANATION:'))?.replace('EXPLANATION:', '').trim() || '';
-
-    return { question, answers, explanation };
+  const blankView = (parsed: ParsedQuestion): { question: string; answers: string[]; explanation: string } => {
+    return { question: parsed.question, answers: parsed.answers || [], explanation: parsed.explanation || '' };
   };
 
-  const parseCodeQuestion = (questionText: string): { question: string; requirements: string; signature: string; example: string } => {
-    const lines = questionText.split('\n').filter(line => line.trim());
-    const question = lines.find(line => line.startsWith('QUESTION:'))?.replace('QUESTION:', '').trim() || '';
-    const requirements = lines.find(line => line.startsWith('REQUIREMENTS:'))?.replace('REQUIREMENTS:', '').trim() || '';
-    const signature = lines.find(line => line.startsWith('FUNCTION_SIGNATURE:'))?.replace('FUNCTION_SIGNATURE:', '').trim() || '';
-    const exampleInput = lines.find(line => line.startsWith('EXAMPLE_INPUT:'))?.replace('EXAMPLE_INPUT:', '').trim() || '';
-    const exampleOutput = lines.find(line => line.startsWith('EXAMPLE_OUTPUT:'))?.replace('EXAMPLE_OUTPUT:', '').trim() || '';
-    
+  const codeView = (parsed: ParsedQuestion): { question: string; requirements: string; signature: string; example: string } => {
     return {
-      question,
-      requirements,
-      signature,
-      example: `Input: ${exampleInput}\nOutput: ${exampleOutput}`
+      question: parsed.question,
+      requirements: parsed.requirements || '',
+      signature: parsed.signature || '',
+      example: `Input: ${parsed.example_input || ''}\nOutput: ${parsed.example_output || ''}`
     };
   };
 
+  // Same normalization the backend grades blanks with: case and extra whitespace don't matter
+  const normalizeAnswer = (answer: string): string => answer.toLowerCase().trim().split(/\s+/).join(' ');
+
   const handleMCQAnswer = (selectedOption: string) => {
     setUserAnswer(selectedOption);
     setShowAnswer(true);
@@ -172,7 +168,7 @@ int main() {
     
     setIsVerifying(true);
     try {
-      const verification = await apiService.verifyCode(currentQuestion.question_text, userCode);
+      const verification = await apiService.verifyCode(currentQuestion.set_id, currentQuestion.rec_no, userCode);
       setCodeVerification(verification);
       setShowAnswer(true);
     } catch (error) {
@@ -189,19 +185,21 @@ int main() {
     let isCorrect = false;
 
     if (currentQuestion.question_type === 'mcq') {
-      const parsed = parseMCQQuestion(currentQuestion.question_text);
+      const parsed = mcqView(currentQuestion.question!);
       isCorrect = userAnswer.toUpperCase() === parsed.options.correct.toUpperCase();
     } else if (currentQuestion.question_type === 'blank') {
-      const parsed = parseBlankQuestion(currentQuestion.question_text);
-      isCorrect = parsed.answers.some(ans => ans === userAnswer.toLowerCase().trim());
+      const parsed = blankView(currentQuestion.question!);
+      isCorrect = parsed.answers.some(ans => ans === normalizeAnswer(userAnswer));
     } else if (currentQuestion.question_type === 'code') {
       isCorrect = codeVerification.includes('RESULT: YES');
     }
 
+    // MCQ and blank answers are graded again by the backend against the stored answer key
     const result: AssessmentResult = {
       rec_no: currentQuestion.rec_no,
       is_correct: isCorrect,
       difficulty_rating: difficulty,
+      user_answer: currentQuestion.question_type !== 'code' ? userAnswer : undefined,
     };
 
     setResults([...results, result]);
@@ -233,7 +231,7 @@ int main() {
 
   const renderMCQQuestion = () => {
     if (!currentQuestion) return null;
-    const parsed = parseMCQQuestion(currentQuestion.question_text);
+    const parsed = mcqView(currentQuestion.question!);
 
     return (
       <div className="space-y-6">
@@ -298,7 +296,7 @@ int main() {
 
   const renderBlankQuestion = () => {
     if (!currentQuestion) return null;
-    const parsed = parseBlankQuestion(currentQuestion.question_text);
+    const parsed = blankView(currentQuestion.question!);
 
     return (
       <div className="space-y-6">
@@ -329,13 +327,13 @@ int main() {
             {showAnswer && (
               <div className="space-y-4">
                 <div className={`p-4 rounded-lg border ${
-                  parsed.answers.some(ans => ans === userAnswer.toLowerCase().trim())
+                  parsed.answers.some(ans => ans === normalizeAnswer(userAnswer))
                     ? 'bg-green-500/20 border-green-500/30 text-green-300'
                     : 'bg-red-500/20 border-red-500/30 text-red-300'
                 }`}>
                   <p>
                     Your answer: <strong>{userAnswer}</strong>
-                    {parsed.answers.some(ans => ans === userAnswer.toLowerCase().trim()) ? (
+                    {parsed.answers.some(ans => ans === normalizeAnswer(userAnswer)) ? (
                       <CheckCircle className="inline ml-2 w-5 h-5" />
                     ) : (
                       <XCircle className="inline ml-2 w-5 h-5" />
@@ -357,7 +355,7 @@ int main() {
 
   const renderCodeQuestion = () => {
     if (!currentQuestion) return null;
-    const parsed = parseCodeQuestion(currentQuestion.question_text);
+    const parsed = codeView(currentQuestion.question!);
 
     return (
       <div className="space-y-6">
@@ -796,12 +794,21 @@ int main() {
             </div>
           )}
         </div>        {/* Question */}
-        {currentQuestion.question_type === 'mcq' && renderMCQQuestion()}
-        {currentQuestion.question_type === 'blank' && renderBlankQuestion()}
-        {currentQuestion.question_type === 'code' && renderCodeQuestion()}
-
-        {/* Difficulty Rating */}
-        {renderDifficultyRating()}
+        {!currentQuestion.question ? (
+          <div className="glass-card p-8 text-center">
+            <div className="animate-spin rounded-full h-8 w-8 border-b-2 border-white mx-auto mb-4"></div>
+            <p className="text-gray-300">Generating question...</p>
+          </div>
+        ) : (
+          <>
+            {currentQuestion.question_type === 'mcq' && renderMCQQuestion()}
+            {currentQuestion.question_type === 'blank' && renderBlankQuestion()}
+            {currentQuestion.question_type === 'code' && renderCodeQuestion()}
+
+            {/* Difficulty Rating */}
+            {renderDifficultyRating()}
+          </>
+        )}
       </div>
     );
   }
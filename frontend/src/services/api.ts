@@ -1,5 +1,5 @@
 import axios from 'axios';
-import { Topic, Assessment, AssessmentResult, Stats, AssessmentFilters } from '../types';
+import { Topic, Assessment, AssessmentResult, Stats, AssessmentFilters, Question } from '../types';
 import { authService } from './auth';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:5000/api';
@@ -64,6 +64,57 @@ export const apiService = {
     return response.data;
   },
 
+  // Streams an assessment: onSet receives every question (question null until generated),
+  // then onQuestion is called with each question as soon as its generation finishes
+  generateAssessmentStream: async (
+    count: number,
+    filters: AssessmentFilters | undefined,
+    onSet: (assessment: Assessment) => void,
+    onQuestion: (question: Question) => void
+  ): Promise<void> => {
+    const response = await fetch(`${API_BASE_URL}/generate-assessment/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        Accept: 'application/x-ndjson',
+        ...authService.getAuthHeaders(),
+      },
+      body: JSON.stringify({ count, ...filters }),
+    });
+    if (response.status === 401) {
+      await authService.logout();
+      window.location.href = '/login';
+    }
+    if (!response.ok || !response.body) {
+      const error = await response.json().catch(() => ({}));
+      throw new Error(error.error || `Failed to generate assessment (${response.status})`);
+    }
+
+    const toQuestion = (question: any): Question => ({ ...question, question: question.question || null });
+    const handleEvent = (line: string) => {
+      if (!line.trim()) return;
+      const event = JSON.parse(line);
+      if (event.type === 'set') {
+        onSet({ set_id: event.set_id, questions: event.questions.map(toQuestion) });
+      } else if (event.type === 'question') {
+        onQuestion(toQuestion(event));
+      }
+    };
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split('\n');
+      buffer = lines.pop() || '';
+      lines.forEach(handleEvent);
+    }
+    handleEvent(buffer);
+  },
+
   generateAssessmentAdvanced: async (
     count: number, 
     sortBy: string, 
@@ -77,8 +128,8 @@ export const apiService = {
     return response.data;
   },
 
-  verifyCode: async (question: string, code: string): Promise<string> => {
-    const response = await api.post('/verify-code', { question, code });
+  verifyCode: async (setId: string, recNo: number, code: string): Promise<string> => {
+    const response = await api.post('/verify-code', { set_id: setId, rec_no: recNo, code });
     return response.data.verification;
   },
 
@@ -22,7 +22,7 @@ export interface Question {
   topic_name: string;
   category: string;
   question_type: 'mcq' | 'code' | 'blank';
-  question_text: string;
+  question: ParsedQuestion | null;
   user_answer: string | null;
   is_correct: boolean | null;
   difficulty_rating: 'easy' | 'medium' | 'hard' | null;
@@ -33,9 +33,24 @@ export interface Assessment {
   questions: Question[];
 }
 
+// Structured question parsed by the backend; the fields present depend on question_type
+export interface ParsedQuestion {
+  question: string;
+  options?: { A: string; B: string; C: string; D: string };
+  answer?: string;
+  answers?: string[];
+  explanation?: string;
+  requirements?: string;
+  signature?: string;
+  example_input?: string;
+  example_output?: string;
+  unparsed?: boolean;
+}
+
 export interface AssessmentResult {
   rec_no: number;
   is_correct: boolean;
+  user_answer?: string;
   difficulty_rating: 'easy' | 'medium' | 'hard';
 }
 